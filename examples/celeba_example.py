@@ -29,17 +29,20 @@ import random
 from typing import Any, Iterator, List, Tuple
 
 import flsim.configs
-from flsim.mysql_database_helper import get_table_size  # noqa
+from flsim.provenance.benchmark_stats import insert_benchmark_stats
 import hydra  # @manual
 import torch
 import torch.nn as nn
 from flsim.interfaces.metrics_reporter import Channel
 from flsim.utils.config_utils import maybe_parse_json_config
 from flsim.utils.example_utils import (
+    build_shard_cache,
     DataProvider,
     FLModel,
+    LazyDataProvider,
     LEAFDataLoader,
     MetricsReporter,
+    MmapDataProvider,
 )
 from hydra.utils import instantiate
 from omegaconf import DictConfig, OmegaConf
@@ -104,6 +107,12 @@ class CelebaDataset(Dataset):
     def __len__(self) -> int:
         return len(self.data)
 
+    def user_ids(self) -> List[str]:
+        return list(self.data.keys())
+
+    def num_user_examples(self, user_id: str) -> int:
+        return len(self.targets[user_id])
+
 
 def build_data_provider(data_config):
     IMAGE_SIZE: int = 32
@@ -145,7 +154,22 @@ def build_data_provider(data_config):
         batch_size=data_config.local_batch_size,
         drop_last=data_config.drop_last,
     )
-    data_provider = DataProvider(dataloader)
+    cache_dir = data_config.get("shard_cache_dir", None)
+    if cache_dir is not None:
+        # images are transformed once, and mapped from the cache in later runs
+        # the datasets keep a sample of the users, which is part of the key
+        fingerprint = (
+            f"celeba|{train_dataset.user_ids()}|{test_dataset.user_ids()}"
+            f"|{transform}|{data_config.local_batch_size}|{data_config.drop_last}"
+        )
+        data_provider = MmapDataProvider(
+            build_shard_cache(dataloader, cache_dir, fingerprint)
+        )
+    elif data_config.get("max_resident_users", None) is not None:
+        # images of a user are only loaded once the user is selected
+        data_provider = LazyDataProvider(dataloader, data_config.max_resident_users)
+    else:
+        data_provider = DataProvider(dataloader)
     print(f"Training clients in total: {data_provider.num_train_users()}")
     return data_provider
 
@@ -235,6 +259,8 @@ def main_worker(
 
     # Add an argument for the config file
     parser.add_argument('--config-file', type=str, required=True)
+    # optional JSON file the training time and provenance stats are written to
+    parser.add_argument('--benchmark-output', type=str, default=None)
 
     # Parse the arguments
     args = parser.parse_args()
@@ -284,15 +310,22 @@ def main_worker(
     client_num_epochs = data['config']['trainer']['client']['epochs']
     users_per_round = data['config']['trainer']['users_per_round']
 
+    if args.benchmark_output:
+        # read by runs/provenance_benchmark.py
+        stats = {"training_time": totalTime}
+        if store_intermediate_models:
+            stats.update(trainer.provenance_store.stats.as_dict())
+            stats.update({"capture_" + k: v for k, v in trainer.provenance_capture.stats.as_dict().items()})
+            stats["model_storage_size"] = trainer.provenance_store.get_size()
+        with open(args.benchmark_output, 'w') as f:
+            json.dump(stats, f)
+
     print("inserting benchmarks")
     # save stats to benchmarkdb
     if store_intermediate_models:
-        # flsim.database_helper.insert_benchmark_stats('benchmark_databases/cifar10_benchmarks.db', 'benchmarks_yes_tracking', global_num_epochs, client_num_epochs, data_provider.num_train_users(), users_per_round, store_intermediate_models, totalTime, flsim.database_helper.get_db_size('model_databases/flsim_single_node_models.db'))
-        flsim.mysql_database_helper.insert_benchmark_stats('localhost', 'michgu', 'test', 'benchmarks', 'celeba_yes_tracking', global_num_epochs, client_num_epochs, data_provider.num_train_users(), users_per_round, store_intermediate_models, totalTime, 0)
-        # flsim.mysql_database_helper.insert_benchmark_stats('localhost', 'michgu', 'test', 'benchmarks', 'celeba_yes_tracking', global_num_epochs, client_num_epochs, data_provider.num_train_users(), users_per_round, store_intermediate_models, totalTime, get_table_size('localhost', 'michgu', 'test', 'benchmarks', 'models'))
+        insert_benchmark_stats(trainer.provenance_store, 'celeba_yes_tracking', global_num_epochs, client_num_epochs, data_provider.num_train_users(), users_per_round, store_intermediate_models, totalTime, trainer.provenance_store.get_size())
     else:
-        # flsim.database_helper.insert_benchmark_stats('benchmark_databases/cifar10_benchmarks.db', 'benchmarks_no_tracking', global_num_epochs, client_num_epochs, data_provider.num_train_users(), users_per_round, store_intermediate_models, totalTime, 0)
-        flsim.mysql_database_helper.insert_benchmark_stats('localhost', 'michgu', 'test', 'benchmarks', 'celeba_no_tracking', global_num_epochs, client_num_epochs, data_provider.num_train_users(), users_per_round, store_intermediate_models, totalTime, 0)
+        insert_benchmark_stats(trainer.provenance_store, 'celeba_no_tracking', global_num_epochs, client_num_epochs, data_provider.num_train_users(), users_per_round, store_intermediate_models, totalTime, 0)
 
 @hydra.main(config_path=None, config_name="celeba_config")
 def run(cfg: DictConfig) -> None:
@@ -1,5 +1,23 @@
-import flsim.database_helper as database_helper
+import argparse
+import json
 
-database_helper.clear_model_db('model_databases/flsim_single_node_models.db')
+import flsim.configs  # noqa
+from flsim.provenance.sqlite_provenance_store import SQLiteProvenanceStoreConfig
+from flsim.utils.config_utils import fl_config_from_json
+from hydra.utils import instantiate
+from omegaconf import OmegaConf
 
-database_helper.clear_model_db('benchmark_databases/cifar10_benchmarks.db')
+# Drops the models stored by the provenance store of the given example config.
+
+parser = argparse.ArgumentParser()
+parser.add_argument('--config-file', type=str, required=True)
+args = parser.parse_args()
+
+with open(args.config_file, 'r') as f:
+    trainer_config = fl_config_from_json(json.load(f)["config"]).trainer
+store_config = trainer_config.get("provenance_store")
+if store_config is None or OmegaConf.is_missing(store_config, "_target_"):
+    store_config = SQLiteProvenanceStoreConfig()
+store = instantiate(store_config)
+store.clear()
+store.close()
@@ -1,3 +0,0 @@
-import flsim.mysql_database_helper as database_helper
-
-database_helper.clear_model_db('localhost', 'michgu', 'Dolphin#1', 'benchmarks')
\ No newline at end of file
@@ -23,7 +23,7 @@ sys.path.insert(0, '../examples')
 from celeba_example import Resnet18
 sys.path.insert(0, '../flsim')
 import json
-from flsim.mysql_database_helper import get_table_size
+from flsim.provenance.benchmark_stats import insert_benchmark_stats
 
 import flsim.configs  # noqa
 import hydra
@@ -32,10 +32,12 @@ from flsim.data.data_sharder import SequentialSharder
 from flsim.interfaces.metrics_reporter import Channel
 from flsim.utils.config_utils import maybe_parse_json_config
 from flsim.utils.example_utils import (
+    build_shard_cache,
     DataLoader,
     DataProvider,
     FLModel,
     MetricsReporter,
+    MmapDataProvider,
     SimpleConvNet,
 )
 from hydra.utils import instantiate
@@ -47,7 +49,9 @@ import torchvision.models as models
 IMAGE_SIZE = 32
 
 # builds data provider using local_batch_size and examples_per_user params
-def build_data_provider(local_batch_size, examples_per_user, drop_last: bool = False):
+def build_data_provider(
+    local_batch_size, examples_per_user, drop_last: bool = False, cache_dir=None
+):
 
     # defines a transform object to be applied to each image
     # resizes image, center crops, converts to pytorch tensor, and normalizes
@@ -86,7 +90,14 @@ def build_data_provider(local_batch_size, examples_per_user, drop_last: bool = F
     fl_data_loader = DataLoader(
         train_dataset, test_dataset, test_dataset, sharder, local_batch_size, drop_last
     )
-    data_provider = DataProvider(fl_data_loader)
+    if cache_dir is not None:
+        # images are transformed once, and mapped from the cache in later runs
+        fingerprint = f"mnist|{transform}|{sharder.cfg}|{local_batch_size}|{drop_last}"
+        data_provider = MmapDataProvider(
+            build_shard_cache(fl_data_loader, cache_dir, fingerprint)
+        )
+    else:
+        data_provider = DataProvider(fl_data_loader)
     print(f"Clients in total: {data_provider.num_train_users()}")
     return data_provider
 
@@ -105,6 +116,8 @@ def main(trainer_config, data_config, use_cuda_if_available: bool = True,) -> No
 
     # Add an argument for the config file
     parser.add_argument('--config-file', type=str, required=True)
+    # optional JSON file the training time and provenance stats are written to
+    parser.add_argument('--benchmark-output', type=str, default=None)
 
     # Parse the arguments
     args = parser.parse_args()
@@ -132,6 +145,7 @@ def main(trainer_config, data_config, use_cuda_if_available: bool = True,) -> No
         local_batch_size=data_config.local_batch_size,
         examples_per_user=data_config.examples_per_user,
         drop_last=False,
+        cache_dir=data_config.get("shard_cache_dir", None),
     )
 
     # created metric reporter
@@ -182,15 +196,22 @@ def main(trainer_config, data_config, use_cuda_if_available: bool = True,) -> No
     client_num_epochs = data['config']['trainer']['client']['epochs']
     users_per_round = data['config']['trainer']['users_per_round']
 
+    if args.benchmark_output:
+        # read by runs/provenance_benchmark.py
+        stats = {"training_time": totalTime}
+        if store_intermediate_models:
+            stats.update(trainer.provenance_store.stats.as_dict())
+            stats.update({"capture_" + k: v for k, v in trainer.provenance_capture.stats.as_dict().items()})
+            stats["model_storage_size"] = trainer.provenance_store.get_size()
+        with open(args.benchmark_output, 'w') as f:
+            json.dump(stats, f)
+
     print("inserting benchmarks")
     # save stats to benchmarkdb
     if store_intermediate_models:
-        # flsim.database_helper.insert_benchmark_stats('benchmark_databases/cifar10_benchmarks.db', 'benchmarks_yes_tracking', global_num_epochs, client_num_epochs, data_provider.num_train_users(), users_per_round, store_intermediate_models, totalTime, flsim.database_helper.get_db_size('model_databases/flsim_single_node_models.db'))
-        # flsim.mysql_database_helper.insert_benchmark_stats('localhost', 'michgu', 'test', 'benchmarks', 'mnist_yes_tracking', global_num_epochs, client_num_epochs, data_provider.num_train_users(), users_per_round, store_intermediate_models, totalTime, get_table_size('localhost', 'michgu', 'test', 'benchmarks', 'models'))
-        flsim.mysql_database_helper.insert_benchmark_stats('localhost', 'michgu', 'test', 'benchmarks', 'mnist_yes_tracking', global_num_epochs, client_num_epochs, data_provider.num_train_users(), users_per_round, store_intermediate_models, totalTime, 0)
+        insert_benchmark_stats(trainer.provenance_store, 'mnist_yes_tracking', global_num_epochs, client_num_epochs, data_provider.num_train_users(), users_per_round, store_intermediate_models, totalTime, trainer.provenance_store.get_size())
     else:
-        # flsim.database_helper.insert_benchmark_stats('benchmark_databases/cifar10_benchmarks.db', 'benchmarks_no_tracking', global_num_epochs, client_num_epochs, data_provider.num_train_users(), users_per_round, store_intermediate_models, totalTime, 0)
-        flsim.mysql_database_helper.insert_benchmark_stats('localhost', 'michgu', 'test', 'benchmarks', 'mnist_no_tracking', global_num_epochs, client_num_epochs, data_provider.num_train_users(), users_per_round, store_intermediate_models, totalTime, 0)
+        insert_benchmark_stats(trainer.provenance_store, 'mnist_no_tracking', global_num_epochs, client_num_epochs, data_provider.num_train_users(), users_per_round, store_intermediate_models, totalTime, 0)
         
 # entry point to script when run from console
 @hydra.main(config_path=None, config_name="mnist_tutorial")
@@ -28,7 +28,7 @@ from typing import List
 
 import flsim.configs  # noqa
 import os
-from flsim.mysql_database_helper import get_table_size
+from flsim.provenance.benchmark_stats import insert_benchmark_stats
 import hydra  # @manual
 import torch
 import torch.nn as nn
@@ -212,6 +212,8 @@ def main_worker(
 
     # Add an argument for the config file
     parser.add_argument('--config-file', type=str, required=True)
+    # optional JSON file the training time and provenance stats are written to
+    parser.add_argument('--benchmark-output', type=str, default=None)
 
     # Parse the arguments
     args = parser.parse_args()
@@ -257,14 +259,22 @@ def main_worker(
     client_num_epochs = data['config']['trainer']['client']['epochs']
     users_per_round = data['config']['trainer']['users_per_round']
 
+    if args.benchmark_output:
+        # read by runs/provenance_benchmark.py
+        stats = {"training_time": totalTime}
+        if store_intermediate_models:
+            stats.update(trainer.provenance_store.stats.as_dict())
+            stats.update({"capture_" + k: v for k, v in trainer.provenance_capture.stats.as_dict().items()})
+            stats["model_storage_size"] = trainer.provenance_store.get_size()
+        with open(args.benchmark_output, 'w') as f:
+            json.dump(stats, f)
+
     print("inserting benchmarks")
     # save stats to benchmarkdb
     if store_intermediate_models:
-        # flsim.database_helper.insert_benchmark_stats('benchmark_databases/cifar10_benchmarks.db', 'benchmarks_yes_tracking', global_num_epochs, client_num_epochs, data_provider.num_train_users(), users_per_round, store_intermediate_models, totalTime, flsim.database_helper.get_db_size('model_databases/flsim_single_node_models.db'))
-        flsim.mysql_database_helper.insert_benchmark_stats('localhost', 'michgu', 'test', 'benchmarks', 'sent_yes_tracking', global_num_epochs, client_num_epochs, data_provider.num_train_users(), users_per_round, store_intermediate_models, totalTime, get_table_size('localhost', 'michgu', 'test', 'benchmarks', 'models'))
+        insert_benchmark_stats(trainer.provenance_store, 'sent_yes_tracking', global_num_epochs, client_num_epochs, data_provider.num_train_users(), users_per_round, store_intermediate_models, totalTime, trainer.provenance_store.get_size())
     else:
-        # flsim.database_helper.insert_benchmark_stats('benchmark_databases/cifar10_benchmarks.db', 'benchmarks_no_tracking', global_num_epochs, client_num_epochs, data_provider.num_train_users(), users_per_round, store_intermediate_models, totalTime, 0)
-        flsim.mysql_database_helper.insert_benchmark_stats('localhost', 'michgu', 'test', 'benchmarks', 'sent_no_tracking', global_num_epochs, client_num_epochs, data_provider.num_train_users(), users_per_round, store_intermediate_models, totalTime, 0)
+        insert_benchmark_stats(trainer.provenance_store, 'sent_no_tracking', global_num_epochs, client_num_epochs, data_provider.num_train_users(), users_per_round, store_intermediate_models, totalTime, 0)
         
 
 @hydra.main(config_path=None, config_name="sent140_config")
@@ -1,43 +1,41 @@
-from flsim.database_helper import get_benchmark_stats
-import sqlite3
-
-# Connect to the database
-conn = sqlite3.connect('benchmark_databases/cifar10_benchmarks.db')
-
-# Create a cursor object
-cursor = conn.cursor()
-
-# Execute the query to check if the table exists
-cursor.execute("SELECT name FROM sqlite_master WHERE type='table' AND name='benchmarks_yes_tracking'")
-
-# Fetch the result
-result = cursor.fetchone()
-
-# Check if the table exists
-if result:
-    print("benchmarks_yes_tracking exists")
-    csv_path = "../benchmark_stats/single-node-with-feature.csv"
-    get_benchmark_stats('benchmark_databases/cifar10_benchmarks.db', 'benchmarks_yes_tracking', csv_path)
-else:
-    print("benchmarks_yes_tracking does not exist")
-
-
-# Execute the query to check if the table exists
-cursor.execute("SELECT name FROM sqlite_master WHERE type='table' AND name='benchmarks_no_tracking'")
-
-# Fetch the result
-result = cursor.fetchone()
-
-# Check if the table exists
-if result:
-    print("benchmarks_no_tracking exists")
-    csv_path = "../benchmark_stats/single-node-without-feature.csv"
-    get_benchmark_stats('benchmark_databases/cifar10_benchmarks.db', 'benchmarks_no_tracking', csv_path)
-else:
-    print("benchmarks_no_tracking does not exist")
-# Close the cursor and connection
-cursor.close()
-conn.close()
-
-
-
+import argparse
+import json
+
+import flsim.configs  # noqa
+from flsim.provenance.benchmark_stats import write_benchmark_stats_csv
+from flsim.provenance.sqlite_provenance_store import SQLiteProvenanceStoreConfig
+from flsim.utils.config_utils import fl_config_from_json
+from hydra.utils import instantiate
+from omegaconf import OmegaConf
+
+# Writes the benchmark stats recorded by the examples to CSV files. The stats
+# are read from the provenance store of the given example config, so the
+# connection settings come from the config (or the environment variables it
+# refers to, e.g. FLSIM_MYSQL_USER and FLSIM_MYSQL_PASSWORD).
+
+TABLES = [
+    f"{dataset}_{tracking}_tracking"
+    for dataset in ["cifar", "mnist", "celeba", "sent"]
+    for tracking in ["yes", "no"]
+]
+
+parser = argparse.ArgumentParser()
+parser.add_argument('--config-file', type=str, required=True)
+parser.add_argument('--tables', nargs='+', default=TABLES)
+parser.add_argument('--output-dir', type=str, default="../benchmark_stats")
+args = parser.parse_args()
+
+with open(args.config_file, 'r') as f:
+    trainer_config = fl_config_from_json(json.load(f)["config"]).trainer
+store_config = trainer_config.get("provenance_store")
+if store_config is None or OmegaConf.is_missing(store_config, "_target_"):
+    store_config = SQLiteProvenanceStoreConfig()
+store = instantiate(store_config)
+
+for table in args.tables:
+    try:
+        write_benchmark_stats_csv(store, table, f"{args.output_dir}/{table}.csv")
+        print(f"{table} exists")
+    except Exception:
+        print(f"{table} does not exist")
+store.close()
@@ -11,7 +11,7 @@ import abc
 import copy
 import math
 from dataclasses import dataclass, field
-from typing import Any, Dict, List, Optional
+from typing import Any, Dict, List, Optional, Sequence, Tuple
 
 import torch
 from flsim.common.pytest_helper import assertNotEmpty
@@ -57,12 +57,7 @@ class ActiveUserSelectorUtils:
 
     @staticmethod
     def samples_per_user(data_provider: IFLDataProvider) -> torch.Tensor:
-        samples_per_user = [
-            data_provider.get_train_user(u).num_train_examples()
-            for u in data_provider.train_user_ids()
-        ]
-        samples_per_user = torch.tensor(samples_per_user, dtype=torch.float)
-        return samples_per_user
+        return data_provider.train_user_sample_counts()
 
     @staticmethod
     def select_users(
@@ -84,20 +79,12 @@ class ActiveUserSelectorUtils:
         else:
             actively_selected_indices = []
 
-        if num_randomly_selected > 0:
-            tmp_probs = torch.tensor(
-                [
-                    0 if x in actively_selected_indices else 1
-                    for x in range(num_total_users)
-                ],
-                dtype=torch.float,
-            )
-
-            randomly_selected_indices = torch.multinomial(
-                tmp_probs, num_randomly_selected, replacement=False, generator=rng
-            ).tolist()
-        else:
-            randomly_selected_indices = []
+        randomly_selected_indices = ActiveUserSelectorUtils.sample_uniformly(
+            num_total_users,
+            num_randomly_selected,
+            rng,
+            excluded=actively_selected_indices,
+        )
 
         selected_indices = actively_selected_indices + randomly_selected_indices
         return selected_indices
@@ -109,15 +96,52 @@ class ActiveUserSelectorUtils:
         if users_per_round >= len(available_users):
             return copy.copy(available_users)
 
-        selected_indices = torch.multinomial(
-            torch.ones(len(available_users), dtype=torch.float),
-            users_per_round,
-            replacement=False,
-            generator=rng,
-        ).tolist()
+        selected_indices = ActiveUserSelectorUtils.sample_uniformly(
+            len(available_users), users_per_round, rng
+        )
 
         return [available_users[idx] for idx in selected_indices]
 
+    @staticmethod
+    def sample_uniformly(
+        num_total_users: int,
+        num_users: int,
+        rng: torch.Generator,
+        excluded: Sequence[int] = (),
+    ) -> List[int]:
+        """Draws `num_users` distinct users uniformly at random, in random order,
+        among the users in `range(num_total_users)` that are not `excluded`.
+
+        When few users are drawn or excluded, users are drawn with replacement
+        and repeats are rejected, which costs O(num_users + len(excluded))
+        instead of the O(num_total_users) of a multinomial over all users.
+        """
+        excluded = set(excluded)
+        assert (
+            num_users <= num_total_users - len(excluded)
+        ), "Cannot draw more users than there are available"
+        if num_users == 0:
+            return []
+        if 4 * (num_users + len(excluded)) > num_total_users:
+            mask = torch.ones(num_total_users, dtype=torch.float)
+            mask[list(excluded)] = 0
+            return torch.multinomial(
+                mask, num_users, replacement=False, generator=rng
+            ).tolist()
+        # each draw is accepted with probability at least 3/4
+        selected = {}
+        while len(selected) < num_users:
+            num_draws = 2 * (num_users - len(selected))
+            for user in torch.randint(
+                num_total_users, (num_draws,), generator=rng
+            ).tolist():
+                if user not in excluded and user not in selected:
+                    # dicts keep the order of the draws
+                    selected[user] = None
+                    if len(selected) == num_users:
+                        break
+        return list(selected)
+
 
 class ActiveUserSelector(abc.ABC):
     def __init__(self, **kwargs):
@@ -143,16 +167,15 @@ class ActiveUserSelector(abc.ABC):
         pass
 
     def get_users_unif_rand(
-        self, num_total_users: int, users_per_round: int
+        self, num_total_users: int, users_per_round: int, replacement: bool = False
     ) -> List[int]:
-        selected_indices = torch.multinomial(
-            torch.ones(num_total_users, dtype=torch.float),
-            users_per_round,
-            replacement=False,
-            generator=self.rng,
-        ).tolist()
-
-        return selected_indices
+        if replacement:
+            return torch.randint(
+                num_total_users, (users_per_round,), generator=self.rng
+            ).tolist()
+        return ActiveUserSelectorUtils.sample_uniformly(
+            num_total_users, users_per_round, self.rng
+        )
 
     def unpack_required_inputs(
         self, required_inputs: List[str], kwargs: Dict[str, Any]
@@ -192,16 +215,13 @@ class UniformlyRandomActiveUserSelector(ActiveUserSelector):
             required_inputs, kwargs
         )
 
-        selected_indices = torch.multinomial(
-            torch.ones(num_total_users, dtype=torch.float),
+        return self.get_users_unif_rand(
+            num_total_users,
             users_per_round,
             # pyre-fixme[16]: `UniformlyRandomActiveUserSelector` has no attribute
             #  `cfg`.
             replacement=self.cfg.random_with_replacement,
-            generator=self.rng,
-        ).tolist()
-
-        return selected_indices
+        )
 
 
 class SequentialActiveUserSelector(ActiveUserSelector):
@@ -260,7 +280,10 @@ class RandomRoundRobinActiveUserSelector(ActiveUserSelector):
         )
 
         super().__init__(**kwargs)
-        self.available_users = []
+        # users of the current epoch in a random order, and the position of
+        # the first user not selected yet
+        self.user_permutation: List[int] = []
+        self.cursor = 0
 
     @classmethod
     def _set_defaults_in_cfg(cls, cfg):
@@ -271,19 +294,17 @@ class RandomRoundRobinActiveUserSelector(ActiveUserSelector):
         num_total_users, users_per_round = self.unpack_required_inputs(
             required_inputs, kwargs
         )
-        # when having covered all the users, reset the list of available users
-        if len(self.available_users) == 0:
-            self.available_users = list(range(num_total_users))
-
-        user_indices = ActiveUserSelectorUtils.sample_available_users(
-            users_per_round, self.available_users, self.rng
-        )
+        # when having covered all the users, start a new epoch
+        if self.cursor >= len(self.user_permutation):
+            self.user_permutation = torch.randperm(
+                num_total_users, generator=self.rng
+            ).tolist()
+            self.cursor = 0
 
-        # Update the list of available users
-        # TODO(dlazar): ensure this is the fastest method. If not, write a util
-        self.available_users = [
-            idx for idx in self.available_users if idx not in user_indices
+        user_indices = self.user_permutation[
+            self.cursor : self.cursor + users_per_round
         ]
+        self.cursor += len(user_indices)
 
         return user_indices
 
@@ -304,28 +325,32 @@ class ImportanceSamplingActiveUserSelector(ActiveUserSelector):
         )
 
         super().__init__(**kwargs)
+        # selection probabilities are kept across rounds, and only recomputed
+        # when the sample counts or users_per_round change
+        self._prob_inputs: Optional[Tuple[Any, int]] = None
+        self._prob: Optional[torch.Tensor] = None
 
     @classmethod
     def _set_defaults_in_cfg(cls, cfg):
         pass
 
     def get_user_indices(self, **kwargs) -> List[int]:
-        required_inputs = ["num_total_users", "users_per_round", "num_samples_per_user"]
-        (
-            num_total_users,
-            users_per_round,
-            num_samples_per_user,
-        ) = self.unpack_required_inputs(required_inputs, kwargs)
+        required_inputs = ["num_total_users", "users_per_round"]
+        num_total_users, users_per_round = self.unpack_required_inputs(
+            required_inputs, kwargs
+        )
+        # sample counts default to the ones cached by the data provider
+        num_samples_per_user = kwargs.get("num_samples_per_user", None)
+        if num_samples_per_user is None:
+            (data_provider,) = self.unpack_required_inputs(["data_provider"], kwargs)
+            num_samples_per_user = data_provider.train_user_sample_counts()
 
         assert (
             len(num_samples_per_user) == num_total_users
         ), "Mismatch between num_total_users and num_samples_per_user length"
         assert users_per_round > 0, "users_per_round must be greater than 0"
 
-        prob = torch.tensor(num_samples_per_user).float()
-        total_samples = torch.sum(prob)
-        assert total_samples > 0, "All clients have empty data"
-        prob = prob * users_per_round / total_samples
+        prob = self._get_prob(num_samples_per_user, users_per_round)
 
         # Iterate num_tries times to ensure that selected indices is non-empty
         selected_indices = []
@@ -346,6 +371,19 @@ class ImportanceSamplingActiveUserSelector(ActiveUserSelector):
 
         return selected_indices
 
+    def _get_prob(self, num_samples_per_user, users_per_round: int) -> torch.Tensor:
+        if (
+            self._prob_inputs is None
+            or self._prob_inputs[0] is not num_samples_per_user
+            or self._prob_inputs[1] != users_per_round
+        ):
+            prob = torch.as_tensor(num_samples_per_user).float()
+            total_samples = torch.sum(prob)
+            assert total_samples > 0, "All clients have empty data"
+            self._prob = prob * users_per_round / total_samples
+            self._prob_inputs = (num_samples_per_user, users_per_round)
+        return self._prob
+
 
 class RandomMultiStepActiveUserSelector(ActiveUserSelector):
     """Simple User Selector which does random sampling of users"""
@@ -380,15 +418,12 @@ class RandomMultiStepActiveUserSelector(ActiveUserSelector):
         elif self.users_per_round == 0:
             self.users_per_round = users_per_round
 
-        selected_indices = torch.multinomial(
-            torch.ones(num_total_users, dtype=torch.float),
+        return self.get_users_unif_rand(
+            num_total_users,
             self.users_per_round,
             # pyre-ignore[16]
             replacement=self.cfg.random_with_replacement,
-            generator=self.rng,
-        ).tolist()
-
-        return selected_indices
+        )
 
 
 @dataclass
@@ -360,6 +360,27 @@ class TestActiveUserSelectorUtils:
                 samples_per_user, torch.tensor([4, 4, 4, 4, 4, 4, 2], dtype=torch.float)
             )
         )
+        # the counts are cached by the data provider
+        assertTrue(
+            ActiveUserSelectorUtils.samples_per_user(data_provider) is samples_per_user
+        )
+
+        # importance sampling falls back to the provider's counts
+        selector = instantiate(
+            ImportanceSamplingActiveUserSelectorConfig(user_selector_seed=1234)
+        )
+        selected_from_provider = selector.get_user_indices(
+            num_total_users=7, users_per_round=3, data_provider=data_provider
+        )
+        selector = instantiate(
+            ImportanceSamplingActiveUserSelectorConfig(user_selector_seed=1234)
+        )
+        selected_from_counts = selector.get_user_indices(
+            num_total_users=7,
+            users_per_round=3,
+            num_samples_per_user=[4, 4, 4, 4, 4, 4, 2],
+        )
+        assertEqual(selected_from_provider, selected_from_counts)
 
     def test_select_users(self) -> None:
         """select_users has two mechanisms for selecting users: p proportion are
@@ -391,6 +412,24 @@ class TestActiveUserSelectorUtils:
             [0, 1],
         )
 
+    def test_sample_uniformly(self) -> None:
+        rng = torch.Generator().manual_seed(0)
+        # few users among many are drawn without touching every user
+        users = ActiveUserSelectorUtils.sample_uniformly(
+            10**9, 100, rng, excluded=range(50)
+        )
+        assertEqual(len(set(users)), 100)
+        assertTrue(all(50 <= u < 10**9 for u in users))
+        # many users among few are drawn from a mask
+        users = ActiveUserSelectorUtils.sample_uniformly(10, 6, rng, excluded=[3, 5])
+        assertEqual(len(set(users)), 6)
+        assertTrue(set(users).isdisjoint({3, 5}))
+        counts = Counter(
+            ActiveUserSelectorUtils.sample_uniformly(1000, 1, rng)[0] % 10
+            for _ in range(10000)
+        )
+        assertTrue(min(counts.values()) > 800 and max(counts.values()) < 1200)
+
     def test_sample_available_users(self) -> None:
         num_total_users, users_per_round = 95, 10
         available_users = range(num_total_users)
@@ -8,11 +8,13 @@
 from __future__ import annotations
 
 import abc
+import collections
 from dataclasses import dataclass
-from typing import OrderedDict
+from typing import Any, OrderedDict
 
 from flsim.channels.communication_stats import ChannelStatsCollector
 from flsim.channels.message import Message
+from flsim.channels.wire_format import PayloadReader, PayloadWriter
 from flsim.utils.config_utils import fullclassname, init_self_cfg
 
 
@@ -74,6 +76,13 @@ class IdentityChannel(IFLChannel):
           only the necessary methods.
         - Each new channel is responsible for the measurement of its message size,
           i.e. it is the user's responsibility to override the right methods.
+        - With ``wire_encoding``, the state dict a client sends is encoded into
+          ``message.payload`` bytes after ``_on_client_before_transmission``
+          (see ``_encode_param``) and decoded back on the server before
+          ``_on_server_after_reception``. The size reported is then the size of
+          the payload rather than an estimate. The server model is loaded from
+          the decoded state dict, so channels overriding
+          ``_on_server_after_reception`` must call ``message.update_model_()``.
     """
 
     # defining useful general constants for channel size measurements
@@ -122,7 +131,11 @@ class IdentityChannel(IFLChannel):
         """
 
         if self.stats_collector:
-            message_size_bytes = self._calc_message_size_client_to_server(message)
+            message_size_bytes = (
+                len(message.payload)
+                if message.payload is not None
+                else self._calc_message_size_client_to_server(message)
+            )
             self.stats_collector.collect_channel_stats(
                 message_size_bytes, client_to_server=True
             )
@@ -131,7 +144,10 @@ class IdentityChannel(IFLChannel):
     def _on_server_after_reception(self, message: Message) -> Message:
         """Implements message manipulation that would be done on the server in the real
         world just after receiving a message from a client (e.g. decompression).
+        With ``wire_encoding``, the model is loaded from the decoded payload.
         """
+        if self.cfg.wire_encoding:
+            message.update_model_()
         return message
 
     def _on_server_before_transmission(self, message: Message) -> Message:
@@ -157,6 +173,42 @@ class IdentityChannel(IFLChannel):
         """
         return message
 
+    def _encode_state_dict(
+        self, state_dict: OrderedDict, message: Message, writer: PayloadWriter
+    ) -> None:
+        """Writes the state dict a client sends to the payload, one parameter
+        at a time with ``_encode_param``.
+        """
+        writer.write_int(len(state_dict))
+        for name, param in state_dict.items():
+            writer.write_str(name)
+            self._encode_param(name, param, message, writer)
+
+    def _decode_state_dict(
+        self, reader: PayloadReader, message: Message
+    ) -> OrderedDict:
+        """Reads the state dict written by ``_encode_state_dict``."""
+        state_dict = collections.OrderedDict()
+        for _ in range(reader.read_int()):
+            name = reader.read_str()
+            state_dict[name] = self._decode_param(name, reader, message)
+        return state_dict
+
+    def _encode_param(
+        self, name: str, param: Any, message: Message, writer: PayloadWriter
+    ) -> None:
+        """Writes one entry of the state dict sent by a client. Channels that
+        change the format of the state dict override this method and
+        ``_decode_param``; the identity channel sends tensors as is.
+        """
+        writer.write_tensor(param)
+
+    def _decode_param(self, name: str, reader: PayloadReader, message: Message) -> Any:
+        """Reads the entry written by ``_encode_param``, in the format
+        ``_on_server_after_reception`` expects.
+        """
+        return reader.read_tensor()
+
     def client_to_server(self, message: Message) -> Message:
         """Performs three successive steps to send a message from a client to the server:
         1. Manipulation on the client before transmission
@@ -164,7 +216,21 @@ class IdentityChannel(IFLChannel):
         3. Manipulation by the server after transmission
         """
         message = self._on_client_before_transmission(message)
+        if self.cfg.wire_encoding:
+            # the client sends bytes, and the server model is rebuilt from them
+            # in `_on_server_after_reception`
+            if not message.model_state_dict:
+                # channels that send the model as is do not populate its state dict
+                message.populate_state_dict()
+            writer = PayloadWriter()
+            self._encode_state_dict(message.model_state_dict, message, writer)
+            message.payload = writer.getvalue()
+            message.model_state_dict = collections.OrderedDict()
         message = self._during_transmission_client_to_server(message)
+        if self.cfg.wire_encoding:
+            message.model_state_dict = self._decode_state_dict(
+                PayloadReader(message.payload), message
+            )
         message = self._on_server_after_reception(message)
 
         return message
@@ -189,3 +255,6 @@ class FLChannelConfig:
     _recursive_: bool = False
     # Whether communication metrics (between server and clients) should be reported
     report_communication_metrics: bool = False
+    # Whether messages from clients are encoded into byte payloads, whose size is
+    # reported instead of an estimate of the compressed size
+    wire_encoding: bool = False
@@ -5,12 +5,12 @@
 # This source code is licensed under the BSD-style license found in the
 # LICENSE file in the root directory of this source tree.
 
-from copy import deepcopy
 from dataclasses import dataclass, field
 from typing import Any, Dict, Optional, OrderedDict, Tuple
 
 import torch.nn as nn
 from flsim.interfaces.model import IFLModel
+from flsim.utils.fl.common import FLModelParamUtils
 from torch import Tensor
 
 
@@ -58,29 +58,46 @@ class Message:
 
     # meta data for sparsity masks
     sparsity_mask_params: Optional[Dict[str, Tensor]] = field(default=None)
+    # flat indices and values of the entries of each tensor kept by a sparse
+    # channel, which reducers can aggregate without densifying them
+    sparse_state_dict: Optional[Dict[str, Tuple[Tensor, Tensor]]] = field(
+        default=None
+    )
 
     global_round_num: int = field(default_factory=int)
 
+    # bytes sent by a client when its channel encodes messages (wire_encoding)
+    payload: Optional[bytes] = field(default=None)
+
+    # whether `model` is shared with others (e.g. the global model broadcast by
+    # the server to every client), in which case it is copied on write
+    shared_model: bool = field(default=False)
+
     def populate_state_dict(self, **kwargs):
         """
-        We copy the model's state dict and add it as an attribute to the message.
+        We add the model's state dict as an attribute to the message.
 
         Notes:
-          - We deepcopy the state dict to avoid side effects in case we manipulate
-            the state dict in place.
+          - The state dict shares the tensors of the model, nothing is copied.
+            Channels must not modify these tensors in place, but build new
+            ones (e.g. quantized or masked) in their stead.
           - We rely on a model's state dict as it will be easier to change the
             type of the underlying tensors (say int8) versus replacing every
             nn.Module with its corresponding counterpart.
         """
 
-        self.model_state_dict = deepcopy(self.model.fl_get_module().state_dict())
+        self.model_state_dict = self.model.fl_get_module().state_dict()
 
     def update_model_(self):
         """
         Updates model with the state dict stored in the message. May be useful
         when receiving a `Message` and wanting to update the local model.
+        A shared model is cloned first, and is no longer shared.
         """
         assert (
             self.model_state_dict
         ), "Message state dict is empty. Please check if message.state_dict is populated."
+        if self.shared_model:
+            self.model = FLModelParamUtils.clone(self.model)
+            self.shared_model = False
         self.model.fl_get_module().load_state_dict(self.model_state_dict)
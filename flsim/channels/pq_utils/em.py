@@ -7,11 +7,15 @@
 
 import random
 from collections import Counter
-from typing import Tuple
+from typing import Optional, Tuple
 
 import torch
 
 
+# number of samples whose distances to the centroids are computed at once
+_ASSIGNMENT_CHUNK_SIZE = 2**16
+
+
 class EM:
     """
     EM algorithm used to quantize the columns of W to minimize
@@ -93,9 +97,11 @@ class EM:
         n_empty_resolved_clusters = self._resolve_empty_clusters()
 
         # centroids (M-step)
-        for k in range(self.n_centroids):
-            W_q = self.W[:, self.assignments == k]  # (n_features, size_of_cluster_k)
-            self.centroids[k] = W_q.mean(dim=1)  # (n_features)
+        counts = torch.bincount(self.assignments, minlength=self.n_centroids)
+        sums = torch.zeros_like(self.centroids).index_add_(
+            0, self.assignments, self.W.t()
+        )  # (n_centroids, n_features)
+        self.centroids = sums / counts[:, None]
 
         # book-keeping
         obj = (self.centroids[self.assignments].t() - self.W).norm(p=2).item()
@@ -173,3 +179,103 @@ class EmptyClusterResolveError(Exception):
     """
 
     pass
+
+
+def batched_k_means(
+    samples: torch.Tensor,
+    lengths: torch.Tensor,
+    n_centroids: int,
+    n_iter: int = 20,
+    init_centroids: Optional[torch.Tensor] = None,
+    generator: Optional[torch.Generator] = None,
+) -> Tuple[torch.Tensor, torch.Tensor]:
+    """
+    Runs k-means on a batch of sets of samples at once.
+
+    Args:
+        - samples: sets of size (batch_size x n_samples x n_features), padded
+          with any value to the same number of samples
+        - lengths: number of actual samples in each set, of size (batch_size)
+        - n_centroids: number of centroids per set
+        - n_iter: maximum number of E/M steps to perform
+        - init_centroids: centroids to start from (warm start), of size
+          (batch_size x n_centroids x n_features). Random samples otherwise
+        - generator: random generator used to pick the initial centroids
+
+    Returns:
+        - centroids of size (batch_size x n_centroids x n_features)
+        - assignments of size (batch_size x n_samples), arbitrary for padding
+
+    Notes:
+        - The E-step is a batched matrix product, and the M-step a single
+          bincount and index_add_ over all the sets.
+        - An empty cluster is moved to the sample farthest from its centroid.
+        - We stop early once the assignments do not change.
+    """
+    batch_size, n_samples, n_features = samples.size()
+    device = samples.device
+    valid = torch.arange(n_samples, device=device)[None, :] < lengths[:, None]
+    valid_samples = samples[valid]
+    # clusters are numbered across sets
+    offsets = torch.arange(batch_size, device=device)[:, None] * n_centroids
+
+    if init_centroids is None:
+        picks = torch.rand(batch_size, n_centroids, generator=generator).to(device)
+        picks = (picks * lengths[:, None]).long()
+        centroids = samples.gather(1, picks[:, :, None].expand(-1, -1, n_features))
+    else:
+        centroids = init_centroids.to(samples).clone()
+
+    assignments = _assign(samples, centroids)
+    for _ in range(n_iter):
+        ids = (assignments + offsets)[valid]
+        counts = torch.bincount(ids, minlength=batch_size * n_centroids)
+        sums = samples.new_zeros(batch_size * n_centroids, n_features)
+        sums.index_add_(0, ids, valid_samples)
+        counts = counts.reshape(batch_size, n_centroids, 1)
+        empty = counts == 0
+        if empty.any():
+            _move_empty_clusters(samples, valid, centroids, assignments, empty[:, :, 0])
+        means = sums.reshape(centroids.size()) / counts.clamp(min=1).to(samples)
+        centroids = torch.where(empty, centroids, means)
+
+        new_assignments = _assign(samples, centroids)
+        if torch.equal(new_assignments, assignments):
+            break
+        assignments = new_assignments
+    return centroids, assignments
+
+
+def _assign(samples: torch.Tensor, centroids: torch.Tensor) -> torch.Tensor:
+    """
+    Assigns each sample to its closest centroid, using that
+    ||x - c||^2 = ||x||^2 + ||c||^2 - 2 * <x, c> where ||x||^2 does not
+    depend on the centroid.
+    """
+    centroids_sqr = (centroids**2).sum(2)[:, None, :]
+    assignments = []
+    for chunk in samples.split(_ASSIGNMENT_CHUNK_SIZE, dim=1):
+        distances = torch.baddbmm(
+            centroids_sqr, chunk, centroids.transpose(1, 2), alpha=-2
+        )
+        assignments.append(distances.argmin(dim=2))
+    return torch.cat(assignments, dim=1)
+
+
+def _move_empty_clusters(
+    samples: torch.Tensor,
+    valid: torch.Tensor,
+    centroids: torch.Tensor,
+    assignments: torch.Tensor,
+    empty: torch.Tensor,
+) -> None:
+    """
+    Moves the empty clusters of each set onto the samples that are the
+    farthest from their centroids, in place.
+    """
+    errors = samples - centroids.gather(1, assignments[:, :, None].expand_as(samples))
+    errors = (errors**2).sum(2).masked_fill(~valid, -1)
+    for b in empty.any(dim=1).nonzero().flatten().tolist():
+        clusters = empty[b].nonzero().flatten()
+        farthest = errors[b].topk(len(clusters)).indices
+        centroids[b, clusters] = samples[b, farthest]
@@ -6,9 +6,11 @@
 # LICENSE file in the root directory of this source tree.
 
 import math
+import threading
+from typing import List
 
 import torch
-from sklearn.cluster import KMeans
+from flsim.channels.pq_utils.em import batched_k_means
 
 
 class PQ:
@@ -44,6 +46,10 @@ class PQ:
         - max_num_centroids: max allowed number of centroids
         - num_k_means_iter: number of k-means iterations
         - verbose: print information after each iteration
+        - set_random_state: pick the same initial centroids at every call
+        - num_threads: number of threads used by k-means, 0 for PyTorch's default.
+          PyTorch's number of threads is process-wide, so it is only changed
+          when encoding from the main thread.
 
     Notes:
         - PQ works for tensors that are on the CPU or on the GPU.
@@ -65,6 +71,7 @@ class PQ:
         num_k_means_iter: int = 20,
         verbose: bool = False,
         set_random_state: bool = False,
+        num_threads: int = 0,
     ):
         self.sizes = sizes
         self.ndim = len(sizes)
@@ -72,6 +79,7 @@ class PQ:
         self.num_k_means_iter = num_k_means_iter
         self.verbose = verbose
         self.set_random_state = set_random_state
+        self.num_threads = num_threads
         self.block_size = self._determine_block_size(max_block_size)
         self.n_centroids = self._determine_num_centroids(max_num_centroids)
 
@@ -186,82 +194,100 @@ class PQ:
             raise NotImplementedError(self.sizes)
 
         # split into self.num_codebooks blocks (last block may be larger)
-        split = W_unsplit.size(1) // self.num_codebooks
-        last_split = W_unsplit.size(1) - split * (self.num_codebooks - 1)
-        splits = [split] * (self.num_codebooks - 1) + [last_split]
+        splits = self._split_sizes(W_unsplit.size(1))
         # pyre-fixme[7]: Expected `Tensor` but got `List[Tensor]`.
         return torch.split(W_unsplit, splits, dim=1)
 
+    def _split_sizes(self, n_subvectors: int) -> List[int]:
+        """
+        Number of subvectors of each dict (the last one may be larger).
+        """
+        split = n_subvectors // self.num_codebooks
+        last_split = n_subvectors - split * (self.num_codebooks - 1)
+        return [split] * (self.num_codebooks - 1) + [last_split]
+
     def _offset_assignments(self, assignments: torch.Tensor) -> torch.Tensor:
         """
         See ``decode`` for an explanation and illustration.
         """
 
-        n_assignments = len(assignments)
-        subvectors_per_dict = int(math.ceil(n_assignments / self.num_codebooks))
         offset = torch.arange(
             0, self.num_codebooks * self.n_centroids, self.n_centroids
-        )
-        offset = offset.type_as(assignments)
-        offset = offset.repeat_interleave(subvectors_per_dict)[:n_assignments]
+        ).to(assignments)
+        split_sizes = torch.tensor(self._split_sizes(len(assignments)))
+        offset = offset.repeat_interleave(split_sizes.to(assignments.device))
         return assignments + offset
 
-    def encode(self, W, seed_centroids=None):
+    def encode(self, W, seed_centroids=None, init_centroids=None):
         """
-        Performs num_k_means_iter EM steps as explained in step (2).
+        Performs num_k_means_iter EM steps as explained in step (2), for all
+        the dicts at once (see ``batched_k_means``).
+
+        Args:
+            - seed_centroids: centroids used as is, only the assignments are
+              computed
+            - init_centroids: centroids k-means starts from (warm start),
+              instead of random subvectors of W
+            Both have size (num_codebooks x n_centroids, block_size).
         """
 
         # reshape and split W as expained in step (1).
         W_reshaped = self._reshape_and_split(W)
-        # compute centroids for all dicts
-        all_centroids = []
-        all_assignments = []
-        for d in range(self.num_codebooks):
-            if self.verbose:
-                print(
-                    f"Building dict {d+1}/{self.num_codebooks} with {self.n_centroids} "
-                    f"centroids for {W_reshaped[d].size(1)} vectors "
-                    f"{'without' if seed_centroids is None else 'with'} seed centroids"
-                )
-
-            # current weight
-            W_curr = W_reshaped[d]
-
-            # run k-means
-            random_state = 0 if self.set_random_state else None
-            kmeans = KMeans(
-                n_clusters=self.n_centroids,
-                init="random",
-                n_init=1,
-                max_iter=self.num_k_means_iter,
-                tol=0.0001,
-                verbose=self.verbose,
-                random_state=random_state,
+        if self.verbose:
+            print(
+                f"Building {self.num_codebooks} dicts with {self.n_centroids} "
+                f"centroids for {W_reshaped[-1].size(1)} vectors at most "
+                f"{'without' if seed_centroids is None else 'with'} seed centroids"
             )
 
-            # generic case
-            if seed_centroids is None:
-                assignments = kmeans.fit_predict(W_curr.t())
-                centroids = kmeans.cluster_centers_
-            # seed centroids case
-            else:
-                nc = self.n_centroids
-                centroids = seed_centroids[nc * d : nc * (d + 1)].cpu()
-                kmeans._n_threads = 16
-                kmeans.cluster_centers_ = centroids.double().numpy()
-                assignments = kmeans.predict(W_curr.t())
-
-            assignments = torch.LongTensor(assignments)
-            centroids = torch.Tensor(centroids)
-
-            # remember centroids and assignments
-            all_centroids.append(centroids)
-            all_assignments.append(assignments)
+        # subvectors of all dicts, of size (num_codebooks x n_samples x block_size)
+        samples = torch.nn.utils.rnn.pad_sequence(
+            [W_curr.t() for W_curr in W_reshaped], batch_first=True
+        )
+        lengths = torch.tensor([W_curr.size(1) for W_curr in W_reshaped])
+        start_centroids = (
+            seed_centroids if seed_centroids is not None else init_centroids
+        )
+        if start_centroids is not None:
+            start_centroids = start_centroids.reshape(
+                self.num_codebooks, self.n_centroids, self.block_size
+            )
+        generator = (
+            torch.Generator().manual_seed(0) if self.set_random_state else None
+        )
+
+        # encodes in worker threads (e.g. of the thread client executor) run
+        # concurrently, and would race to set and restore the process-wide
+        # number of threads
+        num_threads = torch.get_num_threads()
+        set_num_threads = (
+            self.num_threads > 0
+            and threading.current_thread() is threading.main_thread()
+        )
+        if set_num_threads:
+            torch.set_num_threads(self.num_threads)
+        try:
+            centroids, assignments = batched_k_means(
+                samples,
+                lengths.to(samples.device),
+                self.n_centroids,
+                n_iter=0 if seed_centroids is not None else self.num_k_means_iter,
+                init_centroids=start_centroids,
+                generator=generator,
+            )
+        finally:
+            if set_num_threads:
+                torch.set_num_threads(num_threads)
 
         # cat centroids and assignments
-        assignments = torch.cat(all_assignments)
+        assignments = torch.cat(
+            [
+                dict_assignments[:length]
+                for dict_assignments, length in zip(assignments, lengths.tolist())
+            ]
+        )
         assignments = self._offset_assignments(assignments)
-        centroids = torch.cat(all_centroids)
+        centroids = centroids.flatten(0, 1)
         return centroids, assignments
 
     def decode(
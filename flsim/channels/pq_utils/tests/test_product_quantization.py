@@ -5,8 +5,11 @@
 # This source code is licensed under the BSD-style license found in the
 # LICENSE file in the root directory of this source tree.
 
+from concurrent.futures import ThreadPoolExecutor
+from unittest.mock import patch
+
 import torch
-from flsim.channels.pq_utils.em import EM, EmptyClusterResolveError
+from flsim.channels.pq_utils.em import batched_k_means, EM, EmptyClusterResolveError
 from flsim.channels.pq_utils.pq import PQ
 from flsim.common.pytest_helper import assertEqual, assertRaises
 
@@ -50,6 +53,37 @@ def test_em_error() -> None:
         em.learn()
 
 
+def test_batched_k_means() -> None:
+    """
+    We cluster two sets of vectors of different sizes at once, each
+    made of 3 groups of identical vectors, and check that the learnt
+    centroids represent the groups of each set.
+    """
+
+    seed = torch.ones(50, 2)
+    sets = [
+        torch.cat([seed, 2 * seed, 3 * seed]),
+        torch.cat([-seed, -2 * seed, -3 * seed[:20]]),
+    ]
+    samples = torch.nn.utils.rnn.pad_sequence(sets, batch_first=True)
+    lengths = torch.tensor([len(vectors) for vectors in sets])
+    centroids, assignments = batched_k_means(
+        samples, lengths, 3, generator=torch.Generator().manual_seed(0)
+    )
+
+    for sign, vectors, set_centroids, set_assignments in zip(
+        (1, -1), sets, centroids, assignments
+    ):
+        # we know the centroids, up to a permutation
+        true_centroids = sign * torch.stack([seed[0], 2 * seed[0], 3 * seed[0]])
+        norm = (
+            set_centroids.sort(dim=0).values - true_centroids.sort(dim=0).values
+        ).norm()
+        assertEqual(norm, 0)
+        quantized = set_centroids[set_assignments[: len(vectors)]]
+        assertEqual((quantized - vectors).norm(), 0)
+
+
 def test_pq_linear_constant() -> None:
     """
     We check that PQ on dummy vectors of dimension 2 with a block size 2
@@ -250,3 +284,68 @@ def test_pq_linear_n_centroids() -> None:
     # we now the centroids, up to a permutation
     n_centroids = centroids.size(0)
     assertEqual(n_centroids, 16)
+
+
+def test_pq_seed_centroids() -> None:
+    """
+    We check that seed centroids are used as is, and that k-means
+    started from shuffled centroids (warm start) recovers them.
+    """
+
+    seed = torch.ones(100, 2)
+    W = torch.cat([seed, 2 * seed, 3 * seed])
+    pq = PQ(W.size(), max_block_size=2, num_codebooks=1, max_num_centroids=3)
+    true_centroids = torch.stack([seed[0], 2 * seed[0], 3 * seed[0]])
+
+    centroids, assignments = pq.encode(W, seed_centroids=true_centroids)
+    assertEqual((centroids - true_centroids).norm(), 0)
+    assertEqual((pq.decode(centroids, assignments) - W).norm(), 0)
+
+    init_centroids = true_centroids[[2, 0, 1]] + 0.1
+    centroids, assignments = pq.encode(W, init_centroids=init_centroids)
+    assertEqual((centroids - true_centroids[[2, 0, 1]]).norm(), 0)
+    assertEqual((pq.decode(centroids, assignments) - W).norm(), 0)
+
+
+def test_pq_uneven_dicts() -> None:
+    """
+    We check that successively quantizing and dequantizing amounts to the
+    identity operation when the subvectors are not evenly split among dicts.
+    """
+
+    seed = torch.ones(34, 2)
+    W = torch.cat([seed, 2 * seed, 3 * seed[:33]])
+    pq = PQ(
+        W.size(),
+        max_block_size=2,
+        num_codebooks=2,
+        max_num_centroids=4,
+        set_random_state=True,
+        num_threads=1,
+    )
+    centroids, assignments = pq.encode(W)
+    assertEqual((pq.decode(centroids, assignments) - W).norm(), 0)
+
+
+def test_pq_num_threads_in_worker_thread() -> None:
+    """
+    We check that the process-wide number of threads is only changed when
+    encoding from the main thread.
+    """
+
+    seed = torch.ones(34, 2)
+    W = torch.cat([seed, 2 * seed, 3 * seed[:33]])
+    pq = PQ(
+        W.size(),
+        max_block_size=2,
+        num_codebooks=2,
+        max_num_centroids=4,
+        set_random_state=True,
+        num_threads=1,
+    )
+    with patch("torch.set_num_threads") as set_num_threads:
+        with ThreadPoolExecutor(max_workers=1) as executor:
+            executor.submit(pq.encode, W).result()
+        assertEqual(set_num_threads.call_count, 0)
+        pq.encode(W)
+        assertEqual(set_num_threads.call_count, 2)
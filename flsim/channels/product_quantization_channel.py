@@ -7,13 +7,15 @@
 
 from __future__ import annotations
 
-import math
 from collections import OrderedDict
 from dataclasses import dataclass
+from typing import Any, Dict
 
+import torch
 from flsim.channels.base_channel import FLChannelConfig, IdentityChannel
 from flsim.channels.message import Message
 from flsim.channels.pq_utils.pq import PQ
+from flsim.channels.wire_format import PayloadReader, PayloadWriter
 from flsim.utils.config_utils import fullclassname, init_self_cfg
 
 
@@ -33,6 +35,11 @@ class ProductQuantizationChannel(IdentityChannel):
           `min_numel_to_quantize` elements.
         - There is the possibility to learn multiple codebooks
           per matrix by setting num_codebooks.
+        - With `warm_start_centroids`, k-means starts from the centroids
+          of the previous update of each layer, which takes fewer iterations
+          to converge than starting from random subvectors. The channel is
+          shared by all clients, so the previous update is usually another
+          client's: the one encoded last, in any round.
     """
 
     def __init__(self, **kwargs):
@@ -44,6 +51,9 @@ class ProductQuantizationChannel(IdentityChannel):
         )
         super().__init__(**kwargs)
         self.num_updates = 0
+        # centroids of the last update of each layer, whichever client sent it,
+        # see `warm_start_centroids`
+        self._last_centroids: Dict[str, torch.Tensor] = {}
 
     @classmethod
     def _set_defaults_in_cfg(cls, cfg):
@@ -57,7 +67,7 @@ class ProductQuantizationChannel(IdentityChannel):
         """
         We compute the size of the compressed message as follows:
             - for the weights (compressed):
-                * log(n_centroids) / 8 bytes per element (for the assignment)
+                * ceil(log2(n_centroids)) / 8 bytes per element (for the assignment)
                 * num_codebooks * block_size * n_centroids fp32 elements for the centroids
             - for the biases (not compressed): 4 bytes per element
 
@@ -73,7 +83,9 @@ class ProductQuantizationChannel(IdentityChannel):
                 n_subvectors = param["assignments"].size(0)
                 n_centroids = param["centroids"].size(0) // self.cfg.num_codebooks
 
-                assignments_bytes = math.log2(n_centroids) / 8.0 * n_subvectors
+                assignments_bytes = (
+                    self._assignment_bits(n_centroids) / 8.0 * n_subvectors
+                )
                 centroids_bytes = (
                     self.cfg.num_codebooks
                     * n_centroids
@@ -108,18 +120,22 @@ class ProductQuantizationChannel(IdentityChannel):
             for name, param in message.model_state_dict.items():
                 # compress only large weight matrices
                 if param.ndim > 1 and param.numel() >= self.cfg.min_numel_to_quantize:
-                    pq = PQ(
-                        param.data.size(),
-                        self.cfg.max_block_size,
-                        self.cfg.num_codebooks,
-                        self.cfg.max_num_centroids,
-                        self.cfg.num_k_means_iter,
-                        self.cfg.verbose,
-                    )
+                    pq = self._make_pq(param.data.size())
                     layer_seed_centroids = seed_centroids.get(name)
-                    centroids, assignments = pq.encode(
-                        param.data.cpu(), seed_centroids=layer_seed_centroids
-                    )
+                    if self.cfg.warm_start_centroids:
+                        centroids, assignments = pq.encode(
+                            param.data.cpu(),
+                            init_centroids=(
+                                layer_seed_centroids
+                                if layer_seed_centroids is not None
+                                else self._last_centroids.get(name)
+                            ),
+                        )
+                        self._last_centroids[name] = centroids
+                    else:
+                        centroids, assignments = pq.encode(
+                            param.data.cpu(), seed_centroids=layer_seed_centroids
+                        )
                     compressed_param = {
                         "sizes": pq.sizes,
                         "centroids": centroids.data,
@@ -133,6 +149,51 @@ class ProductQuantizationChannel(IdentityChannel):
             message.model_state_dict = new_state_dict
         return message
 
+    @staticmethod
+    def _assignment_bits(n_centroids: int) -> int:
+        """Bits needed to send an assignment, i.e. ceil(log2(n_centroids))."""
+        return max(1, (n_centroids - 1).bit_length())
+
+    def _make_pq(self, sizes) -> PQ:
+        return PQ(
+            sizes,
+            self.cfg.max_block_size,
+            self.cfg.num_codebooks,
+            self.cfg.max_num_centroids,
+            self.cfg.num_k_means_iter,
+            self.cfg.verbose,
+            num_threads=self.cfg.num_threads,
+        )
+
+    def _encode_param(
+        self, name: str, param: Any, message: Message, writer: PayloadWriter
+    ) -> None:
+        """
+        Compressed weights are sent as their centroids and ceil(log2(n_centroids))
+        bits per assignment, without the offset of their codebook.
+        """
+        if type(param) is not dict:
+            writer.write_int(0)
+            writer.write_tensor(param)
+            return
+        writer.write_int(1)
+        writer.write_int(len(param["sizes"]))
+        for size in param["sizes"]:
+            writer.write_int(size)
+        writer.write_tensor(param["centroids"])
+        n_centroids = param["centroids"].size(0) // self.cfg.num_codebooks
+        writer.write_bits(
+            param["assignments"] % n_centroids, self._assignment_bits(n_centroids)
+        )
+
+    def _decode_param(self, name: str, reader: PayloadReader, message: Message) -> Any:
+        if reader.read_int() == 0:
+            return reader.read_tensor()
+        sizes = torch.Size([reader.read_int() for _ in range(reader.read_int())])
+        centroids = reader.read_tensor()
+        assignments = self._make_pq(sizes)._offset_assignments(reader.read_bits())
+        return {"sizes": sizes, "centroids": centroids, "assignments": assignments}
+
     def _on_server_after_reception(self, message: Message) -> Message:
         """
         We reconstruct the weights from the centroids
@@ -143,14 +204,7 @@ class ProductQuantizationChannel(IdentityChannel):
         for name, param in message.model_state_dict.items():
             # param was compressed with PQ. TODO: more robust check than `type(param)`
             if type(param) is dict:
-                pq = PQ(
-                    param["sizes"],
-                    self.cfg.max_block_size,
-                    self.cfg.num_codebooks,
-                    self.cfg.max_num_centroids,
-                    self.cfg.num_k_means_iter,
-                    self.cfg.verbose,
-                )
+                pq = self._make_pq(param["sizes"])
                 decompressed_param = pq.decode(
                     param["centroids"].data, param["assignments"].data
                 )
@@ -175,3 +229,9 @@ class ProductQuantizationChannelConfig(FLChannelConfig):
     num_warmup_updates: int = 0
     use_seed_centroids: bool = False
     seed_centroids_refresh_freq: int = 1
+    # Whether k-means starts from the seed centroids, or from the centroids of the
+    # previous update of the layer, instead of using seed centroids as they are
+    warm_start_centroids: bool = False
+    # Number of threads used by k-means, 0 for PyTorch's default. Only applied
+    # when encoding from the main thread, as PyTorch's setting is process-wide
+    num_threads: int = 0
@@ -11,9 +11,11 @@ from __future__ import annotations
 
 from collections import OrderedDict
 from dataclasses import dataclass
+from typing import Any
 
 import torch
 from flsim.channels.base_channel import FLChannelConfig, IdentityChannel, Message
+from flsim.channels.wire_format import PayloadReader, PayloadWriter
 from flsim.utils.config_utils import fullclassname, init_self_cfg
 from torch.quantization.observer import MinMaxObserver, PerChannelMinMaxObserver
 
@@ -248,6 +250,52 @@ class ScalarQuantizationChannel(IdentityChannel):
         message.populate_state_dict()
         return message
 
+    def _encode_param(
+        self, name: str, param: Any, message: Message, writer: PayloadWriter
+    ) -> None:
+        """
+        Quantized weights are sent as ``n_bits`` codes per element, followed
+        by their scale(s) and zero_point(s) unless these are shared by the
+        server. Biases are sent as is.
+        """
+        if not param.is_quantized:
+            writer.write_int(0)
+            writer.write_tensor(param)
+            return
+        writer.write_int(1)
+        writer.write_int(param.ndim)
+        for size in param.shape:
+            writer.write_int(size)
+        codes = param.int_repr().flatten().int() - self.quant_min
+        writer.write_bits(codes, self.cfg.n_bits)
+        if self.use_shared_qparams:
+            return
+        if self.cfg.quantize_per_tensor:
+            writer.write_float(param.q_scale())
+            writer.write_int(param.q_zero_point())
+        else:
+            writer.write_tensor(param.q_per_channel_scales())
+            writer.write_tensor(param.q_per_channel_zero_points())
+
+    def _decode_param(self, name: str, reader: PayloadReader, message: Message) -> Any:
+        if reader.read_int() == 0:
+            return reader.read_tensor()
+        shape = [reader.read_int() for _ in range(reader.read_int())]
+        int_repr = (reader.read_bits() + self.quant_min).to(torch.int8).reshape(shape)
+        if self.use_shared_qparams:
+            scale, zero_point = message.qparams[name]
+        elif self.cfg.quantize_per_tensor:
+            scale, zero_point = reader.read_float(), reader.read_int()
+        else:
+            scale, zero_point = reader.read_tensor(), reader.read_tensor()
+        if self.cfg.quantize_per_tensor:
+            return torch._make_per_tensor_quantized_tensor(
+                int_repr, float(scale), int(zero_point)
+            )
+        return torch._make_per_channel_quantized_tensor(
+            int_repr, scale.cpu(), zero_point.cpu(), 0
+        )
+
 
 @dataclass
 class ScalarQuantizationChannelConfig(FLChannelConfig):
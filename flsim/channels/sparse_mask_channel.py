@@ -9,10 +9,11 @@ from __future__ import annotations
 
 from collections import OrderedDict
 from dataclasses import dataclass
-from typing import Dict
+from typing import Any, Dict
 
 import torch
 from flsim.channels.base_channel import FLChannelConfig, IdentityChannel, Message
+from flsim.channels.wire_format import PayloadReader, PayloadWriter
 from flsim.utils.config_utils import fullclassname, init_self_cfg
 
 
@@ -93,16 +94,69 @@ class SparseMaskChannel(IdentityChannel):
         Notes:
             - The message is pruned so that the number of non-sparse entries is
               deterministic and constant across runs for a given weight matrix.
+            - With ``sparse_updates``, the kept entries are also sent as
+              (flat indices, values) pairs in ``message.sparse_state_dict``.
         """
         message.populate_state_dict()
-        mask_params = (
-            message.sparsity_mask_params
-            if self.use_shared_masks
-            else self.compute_mask(message.model_state_dict, self.sparsity_method)
-        )
-        self.apply_mask(mask_params, message.model_state_dict)
+        if self.use_shared_masks:
+            self.apply_mask(message.sparsity_mask_params, message.model_state_dict)
+            kept_indices = (
+                {
+                    name: mask.reshape(-1).nonzero().flatten()
+                    for name, mask in message.sparsity_mask_params.items()
+                }
+                if self.cfg.sparse_updates
+                else {}
+            )
+        else:
+            kept_indices = self.compute_kept_indices(
+                message.model_state_dict, self.sparsity_method
+            )
+            for name, param in message.model_state_dict.items():
+                indices = kept_indices[name]
+                masked = param.data.new_zeros(param.shape)
+                masked.view(-1)[indices] = param.data.reshape(-1)[indices]
+                message.model_state_dict[name] = masked
+        if self.cfg.sparse_updates:
+            message.sparse_state_dict = OrderedDict(
+                (name, (kept_indices[name], param.data.view(-1)[kept_indices[name]]))
+                for name, param in message.model_state_dict.items()
+            )
         return message
 
+    def _encode_param(
+        self, name: str, param: Any, message: Message, writer: PayloadWriter
+    ) -> None:
+        """
+        The non-zero entries are sent with their positions, as a bitmask or as
+        flat indices (int32 when they fit) depending on
+        ``compressed_size_measurement``.
+        """
+        writer.write_int(param.ndim)
+        for size in param.shape:
+            writer.write_int(size)
+        flat = param.data.flatten()
+        mask = flat != 0
+        if self.compressed_size_measurement == "bitmask":
+            writer.write_bits(mask, 1)
+        else:
+            index_dtype = torch.int32 if flat.numel() < 2**31 else torch.int64
+            writer.write_tensor(mask.nonzero().flatten().to(index_dtype))
+        writer.write_tensor(flat[mask])
+
+    def _decode_param(self, name: str, reader: PayloadReader, message: Message) -> Any:
+        shape = [reader.read_int() for _ in range(reader.read_int())]
+        if self.compressed_size_measurement == "bitmask":
+            indices = reader.read_bits().nonzero().flatten()
+        else:
+            indices = reader.read_tensor().long()
+        values = reader.read_tensor()
+        if self.cfg.sparse_updates:
+            message.sparse_state_dict[name] = (indices, values)
+        param = values.new_zeros(shape)
+        param.view(-1)[indices] = values
+        return param
+
     def apply_mask(
         self,
         mask_params: Dict[str, torch.Tensor],
@@ -112,9 +166,55 @@ class SparseMaskChannel(IdentityChannel):
         Applies the mask on the state dict based on an input mask.
         The mask is computed from the state dict itself (as in TopK), or is provided
         by the server (for example, during global shared sparse masking).
+        The masked tensors replace those of the state dict, which are left as is.
         """
         for name, param in model_state_dict.items():
-            param.data.mul_(mask_params[name])
+            model_state_dict[name] = param.data * mask_params[name]
+
+    def compute_kept_indices(
+        self, model_state_dict: Dict[str, torch.Tensor], sparsity_method: str = "random"
+    ) -> Dict[str, torch.Tensor]:
+        """
+        Flat indices of the entries of each parameter that are not pruned, see
+        ``compute_mask``.
+        """
+        kept_indices = OrderedDict()
+        if not model_state_dict:
+            return kept_indices
+        params = list(model_state_dict.values())
+        flat = torch.cat([param.data.reshape(-1) for param in params])
+        numels = [param.numel() for param in params]
+        # exact number of elements to keep in each parameter
+        num_kept = [
+            numel - int(self.proportion_of_zero_weights * numel) for numel in numels
+        ]
+        scores = (
+            torch.rand(flat.shape, device=flat.device)
+            if sparsity_method == "random"
+            else flat.abs()
+        )
+
+        # a single selection over all the parameters: entries are ordered by
+        # parameter, then by decreasing score, and the first ones of each
+        # parameter are kept
+        numels_t = torch.tensor(numels, device=flat.device)
+        param_of = torch.repeat_interleave(
+            torch.arange(len(numels), device=flat.device), numels_t
+        )
+        order = torch.argsort(scores, descending=True, stable=True)
+        order = order[torch.argsort(param_of[order], stable=True)]
+        # the i-th sorted entry belongs to parameter param_of[i] again
+        starts = torch.cumsum(numels_t, dim=0) - numels_t
+        rank = torch.arange(flat.numel(), device=flat.device) - starts[param_of]
+        kept = order[rank < torch.tensor(num_kept, device=flat.device)[param_of]]
+
+        start = 0
+        for name, numel, indices in zip(
+            model_state_dict, numels, torch.split(kept, num_kept)
+        ):
+            kept_indices[name] = indices - start
+            start += numel
+        return kept_indices
 
     def compute_mask(
         self, model_state_dict: Dict[str, torch.Tensor], sparsity_method: str = "random"
@@ -129,26 +229,20 @@ class SparseMaskChannel(IdentityChannel):
             - In TopK sparsity, sparsity is applied on each parameter's weight update
               separately depending on the magnitude of the values; the smallest values
               get pruned.
+            - The masks are views of a single flat buffer.
         """
         new_state_dict = OrderedDict()
+        if not model_state_dict:
+            return new_state_dict
+        kept_indices = self.compute_kept_indices(model_state_dict, sparsity_method)
+        params = list(model_state_dict.values())
+        masks = params[0].data.new_zeros(sum(p.numel() for p in params))
+        offset = 0
         for name, param in model_state_dict.items():
-            # exact number of elements to prune
-            num_params_to_prune = int(self.proportion_of_zero_weights * param.numel())
-
-            # select flat indices to prune
-            top_k = torch.topk(
-                (
-                    torch.rand(param.data.shape)
-                    if sparsity_method == "random"
-                    else torch.abs(param.data)
-                ).view(-1),
-                k=num_params_to_prune,
-                largest=False,
-            )
-
-            # prune top-K
-            new_state_dict[name] = torch.ones_like(param.data)
-            new_state_dict[name].view(-1)[top_k.indices] = 0
+            mask = masks[offset : offset + param.numel()]
+            mask[kept_indices[name]] = 1
+            new_state_dict[name] = mask.view(param.shape)
+            offset += param.numel()
 
         return new_state_dict
 
@@ -161,3 +255,9 @@ class SparseMaskChannelConfig(FLChannelConfig):
     compressed_size_measurement: str = "bitmask"
     use_shared_masks: bool = False
     mask_params_refresh_freq: int = 1
+    # Whether the kept entries are also sent as (indices, values) pairs, which
+    # round reducers and SyncServer aggregate in time proportional to the number
+    # of non-zeros. Servers that clip or mask the whole delta (DP, FTRL, secure
+    # aggregation) still aggregate the dense delta, and the client still builds
+    # the dense masked delta.
+    sparse_updates: bool = False
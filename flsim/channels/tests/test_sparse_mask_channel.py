@@ -309,3 +309,28 @@ class TestSparseMaskChannel:
         # Test that message model has sparsity approximately 0.6
         state_dict = message.model.fl_get_module().state_dict()
         assertAlmostEqual(utils.calc_model_sparsity(state_dict), 0.6, delta=0.05)
+
+    @pytest.mark.parametrize("sparsity_method", ["topk", "random"])
+    def test_kept_indices_per_parameter(self, sparsity_method: str) -> None:
+        """
+        Tests that the single selection over all the parameters keeps the
+        same number of entries of each parameter, and for TopK the same
+        entries, as selecting each parameter separately
+        """
+        channel = instantiate(
+            SparseMaskChannelConfig(
+                proportion_of_zero_weights=0.6, sparsity_method=sparsity_method
+            )
+        )
+        state_dict = utils.SampleNet(utils.TwoFC()).fl_get_module().state_dict()
+        kept_indices = channel.compute_kept_indices(state_dict, sparsity_method)
+        assertEqual(list(kept_indices), list(state_dict))
+        for name, param in state_dict.items():
+            flat = param.reshape(-1)
+            num_kept = flat.numel() - int(0.6 * flat.numel())
+            indices = kept_indices[name]
+            assertEqual(len(indices), num_kept)
+            assertEqual(len(set(indices.tolist())), num_kept)
+            if sparsity_method == "topk":
+                expected = torch.topk(flat.abs(), k=num_kept).indices
+                assertEqual(sorted(indices.tolist()), sorted(expected.tolist()))
@@ -0,0 +1,174 @@
+#!/usr/bin/env python3
+# Copyright (c) Meta Platforms, Inc. and affiliates.
+# All rights reserved.
+#
+# This source code is licensed under the BSD-style license found in the
+# LICENSE file in the root directory of this source tree.
+
+from dataclasses import replace
+from typing import Any
+
+import pytest
+import torch
+from flsim.channels.base_channel import FLChannelConfig
+from flsim.channels.communication_stats import ChannelDirection
+from flsim.channels.half_precision_channel import HalfPrecisionChannelConfig
+from flsim.channels.message import Message
+from flsim.channels.product_quantization_channel import (
+    ProductQuantizationChannelConfig,
+)
+from flsim.channels.scalar_quantization_channel import ScalarQuantizationChannelConfig
+from flsim.channels.sparse_mask_channel import SparseMaskChannelConfig
+from flsim.channels.wire_format import (
+    pack_bits,
+    PayloadReader,
+    PayloadWriter,
+    unpack_bits,
+)
+from flsim.common.pytest_helper import assertEqual, assertTrue
+from flsim.utils import test_utils as utils
+from flsim.utils.fl.common import FLModelParamUtils
+from hydra.utils import instantiate
+
+
+def _assert_same_param(expected: Any, actual: Any) -> None:
+    if type(expected) is dict:
+        assertEqual(expected["sizes"], actual["sizes"])
+        for key in ("centroids", "assignments"):
+            assertTrue(torch.equal(expected[key], actual[key]))
+    elif expected.is_quantized:
+        assertTrue(torch.equal(expected.dequantize(), actual.dequantize()))
+    else:
+        assertTrue(torch.equal(expected, actual))
+
+
+CHANNEL_CONFIGS = [
+    FLChannelConfig(),
+    HalfPrecisionChannelConfig(),
+    ScalarQuantizationChannelConfig(n_bits=3),
+    ScalarQuantizationChannelConfig(n_bits=8, quantize_per_tensor=False),
+    SparseMaskChannelConfig(compressed_size_measurement="bitmask"),
+    SparseMaskChannelConfig(compressed_size_measurement="coo"),
+    ProductQuantizationChannelConfig(max_num_centroids=2, max_block_size=1),
+]
+
+
+class TestWireFormat:
+    @pytest.mark.parametrize("n_bits", [1, 3, 8, 13])
+    def test_pack_bits(self, n_bits: int) -> None:
+        codes = torch.randint(2**n_bits, (37,))
+        packed = pack_bits(codes, n_bits)
+        assertEqual(packed.numel(), -(-37 * n_bits // 8))
+        assertTrue(torch.equal(unpack_bits(packed, n_bits, 37), codes))
+
+    def test_payload_round_trip(self) -> None:
+        tensors = [
+            torch.rand(3, 5),
+            torch.rand(7).half(),
+            torch.arange(6, dtype=torch.int64).reshape(2, 3),
+            torch.tensor([True, False, True]),
+            torch.zeros(0),
+        ]
+        writer = PayloadWriter()
+        writer.write_str("name")
+        for tensor in tensors:
+            writer.write_int(-3)
+            writer.write_tensor(tensor)
+        writer.write_float(0.25)
+        writer.write_bits(torch.tensor([1, 0, 3, 2]), 2)
+
+        reader = PayloadReader(writer.getvalue())
+        assertEqual(reader.read_str(), "name")
+        for tensor in tensors:
+            assertEqual(reader.read_int(), -3)
+            read = reader.read_tensor()
+            assertEqual(read.dtype, tensor.dtype)
+            assertTrue(torch.equal(read, tensor))
+        assertEqual(reader.read_float(), 0.25)
+        assertTrue(torch.equal(reader.read_bits(), torch.tensor([1, 0, 3, 2])))
+        assertTrue(reader.at_end())
+
+    @pytest.mark.parametrize("config", CHANNEL_CONFIGS)
+    def test_state_dict_round_trip(self, config: Any) -> None:
+        """
+        Decoding a payload gives back the state dict the client encoded,
+        in the compressed format of the channel.
+        """
+        channel = instantiate(replace(config, wire_encoding=True))
+        encoded = {}
+        encode_state_dict = channel._encode_state_dict
+
+        def record_state_dict(state_dict, message, writer):
+            encoded.update(state_dict)
+            encode_state_dict(state_dict, message, writer)
+
+        channel._encode_state_dict = record_state_dict
+        message = channel.client_to_server(Message(utils.SampleNet(utils.TwoFC())))
+        reader = PayloadReader(message.payload)
+        decoded = channel._decode_state_dict(reader, message)
+        assertTrue(reader.at_end())
+        assertEqual(list(decoded.keys()), list(encoded.keys()))
+        for name, param in encoded.items():
+            _assert_same_param(param, decoded[name])
+
+    @pytest.mark.parametrize("max_num_centroids", [3, 5])
+    def test_pq_assignments_round_trip(self, max_num_centroids: int) -> None:
+        """
+        Assignments keep their high bit when the number of centroids is not a
+        power of two.
+        """
+        channel = instantiate(
+            ProductQuantizationChannelConfig(
+                max_num_centroids=max_num_centroids,
+                max_block_size=1,
+                wire_encoding=True,
+            )
+        )
+        W = torch.rand(64, 1)
+        pq = channel._make_pq(W.size())
+        assertEqual(pq.n_centroids, max_num_centroids)
+        centroids, assignments = pq.encode(W)
+        assertTrue(assignments.max().item() >= 2)
+        param = {"sizes": pq.sizes, "centroids": centroids, "assignments": assignments}
+        writer = PayloadWriter()
+        channel._encode_param("weight", param, Message(), writer)
+        reader = PayloadReader(writer.getvalue())
+        decoded = channel._decode_param("weight", reader, Message())
+        assertTrue(reader.at_end())
+        _assert_same_param(param, decoded)
+
+    @pytest.mark.parametrize("config", CHANNEL_CONFIGS)
+    def test_payload_size_is_reported(self, config: Any) -> None:
+        channel = instantiate(
+            replace(config, wire_encoding=True, report_communication_metrics=True)
+        )
+        two_fc = utils.TwoFC()
+        message = Message(utils.SampleNet(FLModelParamUtils.clone(two_fc)))
+        message = channel.client_to_server(message)
+
+        stats = channel.stats_collector.get_channel_stats()
+        assertEqual(
+            stats[ChannelDirection.CLIENT_TO_SERVER].mean(), len(message.payload)
+        )
+        # the payload holds at least one byte per parameter
+        assertTrue(len(message.payload) >= sum(p.numel() for p in two_fc.parameters()))
+        # the server model is rebuilt from the payload
+        assertEqual(
+            [p.shape for p in message.model.fl_get_module().parameters()],
+            [p.shape for p in two_fc.parameters()],
+        )
+
+    @pytest.mark.parametrize("config", CHANNEL_CONFIGS)
+    def test_server_model_is_built_from_payload(self, config: Any) -> None:
+        channel = instantiate(replace(config, wire_encoding=True))
+        # the client model is corrupted once its payload is encoded
+        during_transmission = channel._during_transmission_client_to_server
+
+        def corrupt_client_model(message):
+            message.model.fl_get_module().fill_all(float("nan"))
+            return during_transmission(message)
+
+        channel._during_transmission_client_to_server = corrupt_client_model
+        message = channel.client_to_server(Message(utils.SampleNet(utils.TwoFC())))
+        for param in message.model.fl_get_module().parameters():
+            assertTrue(torch.isfinite(param).all())
@@ -0,0 +1,156 @@
+#!/usr/bin/env python3
+# Copyright (c) Meta Platforms, Inc. and affiliates.
+# All rights reserved.
+#
+# This source code is licensed under the BSD-style license found in the
+# LICENSE file in the root directory of this source tree.
+
+"""
+Byte payloads of messages sent through a channel.
+
+A payload is a sequence of fields written by ``PayloadWriter`` and read back
+in the same order by ``PayloadReader``: integers, floats, strings, tensors
+(dtype, shape and raw little-endian bytes) and bit-packed codes. Payloads
+carry no schema, each channel writes and reads its own fields, see
+``IdentityChannel._encode_state_dict``.
+"""
+
+from __future__ import annotations
+
+import struct
+from typing import List
+
+import torch
+
+
+# dtype of a tensor field, by id; the id is part of the payload
+_DTYPES: List[torch.dtype] = [
+    torch.float32,
+    torch.float16,
+    torch.float64,
+    torch.uint8,
+    torch.int8,
+    torch.int16,
+    torch.int32,
+    torch.int64,
+    torch.bool,
+]
+_DTYPE_IDS = {dtype: i for i, dtype in enumerate(_DTYPES)}
+_ALIGNMENT = 8
+
+
+def pack_bits(codes: torch.Tensor, n_bits: int) -> torch.Tensor:
+    """Packs integer codes in ``[0, 2 ** n_bits)`` into ``n_bits`` bits each,
+    least significant bit first. Returns ``ceil(codes.numel() * n_bits / 8)``
+    bytes as a uint8 tensor.
+    """
+    assert 1 <= n_bits <= 32, "codes are packed with 1 to 32 bits"
+    shifts = torch.arange(n_bits, device=codes.device)
+    bits = ((codes.reshape(-1, 1).long() >> shifts) & 1).flatten()
+    padding = -bits.numel() % 8
+    if padding:
+        bits = torch.cat([bits, bits.new_zeros(padding)])
+    weights = 1 << torch.arange(8, device=codes.device)
+    return (bits.reshape(-1, 8) * weights).sum(dim=1).to(torch.uint8)
+
+
+def unpack_bits(packed: torch.Tensor, n_bits: int, numel: int) -> torch.Tensor:
+    """Inverse of ``pack_bits``: the first ``numel`` codes, as int64."""
+    shifts = torch.arange(8, device=packed.device)
+    bits = ((packed.reshape(-1, 1).long() >> shifts) & 1).flatten()
+    weights = 1 << torch.arange(n_bits, device=packed.device)
+    return (bits[: numel * n_bits].reshape(numel, n_bits) * weights).sum(dim=1)
+
+
+class PayloadWriter:
+    def __init__(self):
+        self._chunks: List[bytes] = []
+        self._size = 0
+
+    def _write(self, data: bytes) -> None:
+        self._chunks.append(data)
+        self._size += len(data)
+
+    def _align(self) -> None:
+        # tensor data starts at a multiple of 8 bytes, so that it can be read
+        # in place
+        self._write(bytes(-self._size % _ALIGNMENT))
+
+    def write_int(self, value: int) -> None:
+        self._write(struct.pack("<q", value))
+
+    def write_float(self, value: float) -> None:
+        self._write(struct.pack("<d", value))
+
+    def write_str(self, value: str) -> None:
+        data = value.encode()
+        self.write_int(len(data))
+        self._write(data)
+
+    def write_tensor(self, tensor: torch.Tensor) -> None:
+        tensor = tensor.detach().cpu().contiguous()
+        self.write_int(_DTYPE_IDS[tensor.dtype])
+        self.write_int(tensor.ndim)
+        for size in tensor.shape:
+            self.write_int(size)
+        self._align()
+        self._write(tensor.numpy().tobytes())
+
+    def write_bits(self, codes: torch.Tensor, n_bits: int) -> None:
+        """Writes ``codes`` with ``n_bits`` bits each, see ``pack_bits``."""
+        self.write_int(codes.numel())
+        self.write_int(n_bits)
+        self._write(pack_bits(codes.cpu(), n_bits).numpy().tobytes())
+
+    def getvalue(self) -> bytes:
+        return b"".join(self._chunks)
+
+
+class PayloadReader:
+    """Reads the fields of a payload. Tensors are views of one copy of the
+    payload, not copies of their own.
+    """
+
+    def __init__(self, payload: bytes):
+        self._buffer = bytearray(payload)
+        self._offset = 0
+
+    def _read(self, num_bytes: int) -> memoryview:
+        assert self._offset + num_bytes <= len(self._buffer), "truncated payload"
+        view = memoryview(self._buffer)[self._offset : self._offset + num_bytes]
+        self._offset += num_bytes
+        return view
+
+    def read_int(self) -> int:
+        return struct.unpack("<q", self._read(8))[0]
+
+    def read_float(self) -> float:
+        return struct.unpack("<d", self._read(8))[0]
+
+    def read_str(self) -> str:
+        return bytes(self._read(self.read_int())).decode()
+
+    def read_tensor(self) -> torch.Tensor:
+        dtype = _DTYPES[self.read_int()]
+        shape = [self.read_int() for _ in range(self.read_int())]
+        self._read(-self._offset % _ALIGNMENT)
+        numel = 1
+        for size in shape:
+            numel *= size
+        return self._frombuffer(numel, dtype).reshape(shape)
+
+    def read_bits(self) -> torch.Tensor:
+        numel = self.read_int()
+        n_bits = self.read_int()
+        packed = self._frombuffer(-(-numel * n_bits // 8), torch.uint8)
+        return unpack_bits(packed, n_bits, numel)
+
+    def _frombuffer(self, count: int, dtype: torch.dtype) -> torch.Tensor:
+        offset = self._offset
+        self._read(count * torch.empty(0, dtype=dtype).element_size())
+        if count == 0:
+            return torch.empty(0, dtype=dtype)
+        return torch.frombuffer(self._buffer, dtype=dtype, count=count, offset=offset)
+
+    def at_end(self) -> bool:
+        return self._offset == len(self._buffer)
@@ -19,8 +19,9 @@ from __future__ import annotations
 import logging
 import uuid
 import random
+from concurrent.futures import Future
 from dataclasses import dataclass
-from typing import Any, List, Optional, Tuple
+from typing import Any, Dict, List, Optional, Tuple, Union
 
 import torch
 from flsim.channels.base_channel import IdentityChannel
@@ -43,9 +44,12 @@ from flsim.optimizers.optimizer_scheduler import (
     OptimizerScheduler,
     OptimizerSchedulerConfig,
 )
+from flsim.provenance.async_writer import snapshot_state_dict
+from flsim.provenance.fingerprint import fingerprint_state_dict, FingerprintHasher
 from flsim.utils.config_utils import fullclassname, init_self_cfg
 from flsim.utils.cuda import DEFAULT_CUDA_MANAGER, ICudaStateManager
 from flsim.utils.fl.common import FLModelParamUtils
+from flsim.utils.fl.model_pool import ModelPool
 from hydra.utils import instantiate
 from omegaconf import OmegaConf
 
@@ -76,7 +80,18 @@ class Client:
         self.timeout_simulator = timeout_simulator or NeverTimeOutSimulator(
             **OmegaConf.structured(NeverTimeOutSimulatorConfig())
         )
-        self.store_last_updated_model = True
+        self.store_last_updated_model = store_last_updated_model
+        # set by the trainer in rounds whose client models provenance captures,
+        # in full or only as fingerprints
+        self.snapshot_updated_model = False
+        self.fingerprint_updated_model = False
+        # set by the trainer to hash fingerprints off the training thread, else
+        # they are hashed on it
+        self.fingerprint_hasher: Optional[FingerprintHasher] = None
+        # set by the trainer to take client-side models from a pool of scratch
+        # models rather than cloning the global model; the trainer releases
+        # them once the server has consumed the update
+        self.model_pool: Optional[ModelPool] = None
         self._name = name or "unnamed_client"
 
         # base lr needs to match LR in optimizer config, overwrite it
@@ -93,6 +108,14 @@ class Client:
         # Value: client state (i.e. model delta, client weight, optimizer used)
         self._tracked = {}
         self.last_updated_model = None
+        # CPU state_dict of the last updated model, only kept until the trainer
+        # takes it with `pop_updated_snapshot`
+        self._updated_snapshot = None
+        # fingerprint of the last updated model, or its future if it is hashed
+        # by `fingerprint_hasher`, same lifetime as the snapshot
+        self._updated_fingerprint: Optional[Union[str, Future]] = None
+        # weight of the last update sent to the server
+        self.last_update_weight = None
         self.logger.setLevel(logging.INFO)
 
         self.global_round_num = 0
@@ -149,8 +172,7 @@ class Client:
             model, metrics_reporter=metrics_reporter
         )
         # 4. Store updated model if being tracked
-        if self.store_last_updated_model:
-            self.last_updated_model = FLModelParamUtils.clone(updated_model)
+        self.store_updated_model(updated_model, weight)
 
         # 5. Compute model delta
         delta = self.compute_delta(
@@ -162,6 +184,52 @@ class Client:
 
         return delta, weight
 
+    def store_updated_model(self, updated_model: IFLModel, weight: float) -> None:
+        """Keeps what consumers of the updated model asked for: a clone for client
+        metrics if ``store_last_updated_model``, a CPU snapshot for provenance if
+        ``snapshot_updated_model``. With ``fingerprint_updated_model``, the model
+        is hashed in place, or a copy of it is hashed by ``fingerprint_hasher``
+        if it is set: copying takes a fraction of the time of hashing, which then
+        runs in parallel with training.
+        """
+        if self.store_last_updated_model:
+            if self.last_updated_model is None:
+                self.last_updated_model = FLModelParamUtils.clone(updated_model)
+            else:
+                FLModelParamUtils.copy_models(
+                    updated_model.fl_get_module(),
+                    [self.last_updated_model.fl_get_module()],
+                )
+        if self.snapshot_updated_model:
+            self._updated_snapshot = snapshot_state_dict(updated_model)
+        if self.fingerprint_updated_model:
+            state_dict = updated_model.fl_get_module().state_dict()
+            if self.fingerprint_hasher is None:
+                # hashed now, before the model is reused for the delta
+                self._updated_fingerprint = fingerprint_state_dict(state_dict)
+            else:
+                # the copy is owned by the hasher, the model is reused for the delta
+                self._updated_fingerprint = self.fingerprint_hasher.submit(
+                    {name: t.detach().clone() for name, t in state_dict.items()}
+                )
+        self.last_update_weight = weight
+
+    def pop_updated_snapshot(self) -> Optional[Dict[str, torch.Tensor]]:
+        """Hands over the snapshot taken by ``store_updated_model``, if any, so
+        that the client does not keep it alive after the round.
+        """
+        snapshot, self._updated_snapshot = self._updated_snapshot, None
+        return snapshot
+
+    def pop_updated_fingerprint(self) -> Optional[str]:
+        """Hands over the fingerprint taken by ``store_updated_model``, if any,
+        waiting for it if it is still being hashed.
+        """
+        fingerprint, self._updated_fingerprint = self._updated_fingerprint, None
+        if isinstance(fingerprint, Future):
+            fingerprint = fingerprint.result()
+        return fingerprint
+
     def copy_and_train_model(
         self,
         model: IFLModel,
@@ -217,14 +285,20 @@ class Client:
         # Keep a reference to global model
         self.ref_model = model
 
+        # The channel reads the global model without copying it, and clones it
+        # only if it changes it, see `Message.update_model_`.
+        message = self.channel.server_to_client(Message(model=model, shared_model=True))
+        if not message.shared_model:
+            return message.model
+
         # Need to clone the model because it's a reference to the global model; else
         # modifying model will modify the global model.
-        message = self.channel.server_to_client(
-            Message(model=FLModelParamUtils.clone(model))
+        return (
+            self.model_pool.acquire(message.model)
+            if self.model_pool is not None
+            else FLModelParamUtils.clone(message.model)
         )
 
-        return message.model
-
     def prepare_for_training(
         self, model: IFLModel
     ) -> Tuple[IFLModel, torch.optim.Optimizer, OptimizerScheduler]:
@@ -350,6 +424,25 @@ class Client:
             }
         self.times_selected += 1
 
+    def spill_state(self) -> Dict[str, Any]:
+        """Returns the state that must survive this client object being evicted
+        from the trainer's client cache, see ``ClientCache``.
+        """
+        state = {
+            "times_selected": self.times_selected,
+            "per_example_training_time": self.per_example_training_time,
+        }
+        # opt-in history of every selection, see `store_models_and_optimizers`
+        if self._tracked:
+            state["tracked"] = self._tracked
+        return state
+
+    def restore_state(self, state: Dict[str, Any]) -> None:
+        """Rehydrates a new client object with the state of an evicted one."""
+        self.times_selected = state["times_selected"]
+        self.per_example_training_time = state["per_example_training_time"]
+        self._tracked = state.get("tracked", {})
+
     def eval(
         self,
         model: IFLModel,
@@ -0,0 +1,83 @@
+#!/usr/bin/env python3
+# Copyright (c) Meta Platforms, Inc. and affiliates.
+# All rights reserved.
+#
+# This source code is licensed under the BSD-style license found in the
+# LICENSE file in the root directory of this source tree.
+
+from __future__ import annotations
+
+from collections import OrderedDict
+from typing import Any, Dict, Iterator, Optional, Tuple
+
+from flsim.clients.base_client import Client
+
+
+class ClientCache:
+    """LRU cache of the client objects of a trainer, keyed by dataset id.
+
+    At most ``capacity`` clients are kept (all of them if None). When a client
+    is evicted, only what ``Client.spill_state`` returns is kept (times
+    selected, per-example training time, DP budget), and a client created for
+    the same dataset id later is rehydrated with it. Memory therefore grows with
+    ``capacity`` rather than with the number of users ever selected.
+    """
+
+    def __init__(self, capacity: Optional[int] = None):
+        assert capacity is None or capacity > 0, "capacity must be positive"
+        self.capacity = capacity
+        self._clients: OrderedDict[int, Client] = OrderedDict()
+        # Key: dataset_id, Value: spilled state of an evicted client
+        self._spilled: Dict[int, Dict[str, Any]] = {}
+        self.evictions = 0
+
+    def get(self, dataset_id: int) -> Optional[Client]:
+        """Returns the cached client for ``dataset_id``, marking it as the most
+        recently used, or None if it is not resident.
+        """
+        client = self._clients.get(dataset_id)
+        if client is not None:
+            self._clients.move_to_end(dataset_id)
+        return client
+
+    def put(self, dataset_id: int, client: Client) -> None:
+        """Caches a newly created client, restoring the state spilled when the
+        previous client for ``dataset_id`` was evicted.
+        """
+        state = self._spilled.pop(dataset_id, None)
+        if state is not None:
+            client.restore_state(state)
+        self._clients[dataset_id] = client
+        self._clients.move_to_end(dataset_id)
+        while self.capacity is not None and len(self._clients) > self.capacity:
+            evicted_id, evicted = self._clients.popitem(last=False)
+            self._spilled[evicted_id] = evicted.spill_state()
+            self.evictions += 1
+
+    def is_spilled(self, dataset_id: int) -> bool:
+        return dataset_id in self._spilled
+
+    def __getitem__(self, dataset_id: int) -> Client:
+        client = self.get(dataset_id)
+        if client is None:
+            raise KeyError(dataset_id)
+        return client
+
+    def __setitem__(self, dataset_id: int, client: Client) -> None:
+        self.put(dataset_id, client)
+
+    def __contains__(self, dataset_id: int) -> bool:
+        return dataset_id in self._clients
+
+    def __len__(self) -> int:
+        return len(self._clients)
+
+    def __iter__(self) -> Iterator[int]:
+        return iter(self._clients)
+
+    def values(self) -> Iterator[Client]:
+        """Resident clients, least recently used first."""
+        return iter(self._clients.values())
+
+    def items(self) -> Iterator[Tuple[int, Client]]:
+        return iter(self._clients.items())
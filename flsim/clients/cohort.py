@@ -0,0 +1,240 @@
+#!/usr/bin/env python3
+# Copyright (c) Meta Platforms, Inc. and affiliates.
+# All rights reserved.
+#
+# This source code is licensed under the BSD-style license found in the
+# LICENSE file in the root directory of this source tree.
+
+"""
+Cohort training: the local updates of K clients computed together.
+
+The parameters of the K client models are stacked along a new leading
+dimension, and each local step takes the gradients of all clients with one
+``vmap`` over ``torch.func.functional_call``, followed by one SGD update of the
+stacked parameters with each client's learning rate. For small models, this
+replaces K optimizers, K backward passes and K sets of small kernels with one
+of each per step.
+
+Clients may have different numbers of batches and different batch sizes. At
+each step, clients that ran out of batches are masked out, and the remaining
+ones are grouped by the shapes of their batch so that each group is one
+``vmap`` call (typically everyone, plus the clients whose last batch is short).
+
+Only clients whose local update is plain SGD can be trained in a cohort, see
+``can_train_in_cohort``. Other clients go through ``Client.generate_local_update``.
+Results match the per-client loop up to floating point reassociation, except
+that clients draw from the trainer's random generators rather than reseeding
+them with their ``random_seed``.
+"""
+
+from __future__ import annotations
+
+import random
+from collections import defaultdict
+from typing import Any, Dict, List, Optional, Tuple
+
+import torch
+import torch.nn as nn
+from flsim.channels.message import Message
+from flsim.clients.base_client import Client
+from flsim.common.timeout_simulator import NeverTimeOutSimulator
+from flsim.interfaces.metrics_reporter import IFLBatchMetrics, IFLMetricsReporter
+from flsim.interfaces.model import IFLModel
+from flsim.optimizers.local_optimizers import LocalOptimizerSGD
+from flsim.optimizers.optimizer_scheduler import ConstantLRScheduler
+from flsim.utils.config_utils import fullclassname
+from flsim.utils.simple_batch_metrics import FLBatchMetrics
+
+
+class _FLForward(nn.Module):
+    """Exposes ``fl_forward`` as the forward of a module that owns the model's
+    module, so that ``functional_call`` can substitute its parameters.
+    """
+
+    def __init__(self, model: IFLModel):
+        super().__init__()
+        self.module = model.fl_get_module()
+        # not an attribute of the module tree: IFLModel is not an nn.Module
+        self.__dict__["fl_model"] = model
+
+    def forward(self, batch) -> Dict[str, torch.Tensor]:
+        metrics = self.fl_model.fl_forward(batch)
+        out = {"loss": metrics.loss}
+        for name in ("predictions", "targets"):
+            value = getattr(metrics, name)
+            if isinstance(value, torch.Tensor):
+                out[name] = value.detach()
+        return out
+
+
+def can_train_in_cohort(client: Client, model: IFLModel) -> bool:
+    """Whether the local update of ``client`` on ``model`` is plain SGD that
+    ``train_cohort`` reproduces: a base ``Client`` (subclasses customize
+    training) with SGD without momentum or weight decay, a constant learning
+    rate, no gradient clipping, no timeouts and nothing tracked per selection,
+    on a model without buffers (running statistics are not stacked).
+    """
+    # pyre-fixme[16]: `Client` has no attribute `cfg`.
+    cfg = client.cfg
+    return (
+        type(client) is Client
+        and cfg.optimizer._target_ == fullclassname(LocalOptimizerSGD)
+        and cfg.optimizer.momentum == 0
+        and cfg.optimizer.weight_decay == 0
+        and cfg.lr_scheduler._target_ == fullclassname(ConstantLRScheduler)
+        and cfg.max_clip_norm_normalized is None
+        and not cfg.store_models_and_optimizers
+        and isinstance(client.timeout_simulator, NeverTimeOutSimulator)
+        and next(model.fl_get_module().buffers(), None) is None
+    )
+
+
+def _stack(batches: List[Any]) -> Any:
+    first = batches[0]
+    if isinstance(first, torch.Tensor):
+        return torch.stack(batches)
+    if isinstance(first, dict):
+        return {k: _stack([b[k] for b in batches]) for k in first}
+    if isinstance(first, (list, tuple)):
+        return type(first)(_stack(list(items)) for items in zip(*batches))
+    raise TypeError(f"Cannot stack batches of type {type(first)}")
+
+
+def _signature(batch: Any) -> Any:
+    """Structure and shapes of a batch: batches with the same signature stack."""
+    if isinstance(batch, torch.Tensor):
+        return (tuple(batch.shape), batch.dtype)
+    if isinstance(batch, dict):
+        return tuple((k, _signature(v)) for k, v in batch.items())
+    if isinstance(batch, (list, tuple)):
+        return tuple(_signature(b) for b in batch)
+    return None
+
+
+def _local_batches(client: Client) -> Tuple[List[Any], int]:
+    """All batches of a local update in training order, and the number of
+    batches per epoch.
+    """
+    assert client.dataset.num_train_batches() > 0, "Client has no training data"
+    batches = []
+    # pyre-fixme[16]: `Client` has no attribute `cfg`.
+    for _ in range(client.cfg.epochs):
+        epoch = list(client.dataset.train_data())
+        if client.cfg.shuffle_batch_order:
+            random.shuffle(epoch)
+        batches.extend(epoch)
+    return batches, len(epoch)
+
+
+def train_cohort(
+    clients: List[Client],
+    message: Message,
+    metrics_reporter: Optional[IFLMetricsReporter] = None,
+) -> List[Tuple[IFLModel, float]]:
+    """Computes the local updates of ``clients`` together and returns their
+    (delta, weight), in client order. Each client ends up in the same state as
+    after ``Client.generate_local_update``.
+
+    All clients must satisfy ``can_train_in_cohort``. Batch metrics are added
+    to ``metrics_reporter`` in client order, as ``FLBatchMetrics``.
+    """
+    from torch.func import functional_call, grad, vmap
+
+    models = []
+    for client in clients:
+        client.global_round_num = message.global_round_num
+        model = client.receive_through_channel(message.model)
+        client.cuda_state_manager.before_train_or_eval(model)
+        model.fl_get_module().train()
+        models.append(model)
+
+    template = _FLForward(models[0])
+    # frozen parameters are not optimized and stay those of the template
+    names = [
+        name
+        for name, p in models[0].fl_get_module().named_parameters()
+        if p.requires_grad
+    ]
+    model_params = [dict(m.fl_get_module().named_parameters()) for m in models]
+    # Key: parameter name, Value: parameters of all clients, [K, *shape]
+    params = {
+        name: torch.stack([p[name].detach() for p in model_params]) for name in names
+    }
+    # pyre-fixme[16]: `Client` has no attribute `cfg`.
+    lrs = torch.tensor([c.cfg.optimizer.lr for c in clients])
+    lrs = lrs.to(device=params[names[0]].device, dtype=params[names[0]].dtype)
+
+    def compute_loss(client_params, batch):
+        client_params = {f"module.{n}": p for n, p in client_params.items()}
+        out = functional_call(template, client_params, (batch,))
+        return out["loss"], out
+
+    step_fn = vmap(grad(compute_loss, has_aux=True), randomness="different")
+
+    batches, batches_per_epoch = zip(*[_local_batches(c) for c in clients])
+    batch_metrics: List[List[IFLBatchMetrics]] = [[] for _ in clients]
+    # same bookkeeping as `Client.train`: the weight is the number of examples
+    # of the first epoch
+    total_samples = [0] * len(clients)
+    num_examples_processed = [0] * len(clients)
+    for step in range(max(len(b) for b in batches)):
+        # clients that still have a batch, grouped by the shapes of their batch
+        groups = defaultdict(list)
+        for i, client_batches in enumerate(batches):
+            if step < len(client_batches):
+                groups[_signature(client_batches[step])].append(i)
+        for group in groups.values():
+            everyone = len(group) == len(clients)
+            index = None if everyone else torch.tensor(group)
+            group_params = (
+                params if everyone else {n: p[index] for n, p in params.items()}
+            )
+            grads, out = step_fn(
+                group_params, _stack([batches[i][step] for i in group])
+            )
+            group_lrs = lrs if everyone else lrs[index]
+            with torch.no_grad():
+                for name, g in grads.items():
+                    update = g * group_lrs.view(-1, *([1] * (g.dim() - 1)))
+                    if everyone:
+                        params[name].sub_(update)
+                    else:
+                        params[name].index_add_(0, index, update, alpha=-1)
+            for j, i in enumerate(group):
+                batch = batches[i][step]
+                num_examples = models[i].get_num_examples(batch)
+                num_examples_processed[i] += num_examples
+                if step < batches_per_epoch[i]:
+                    total_samples[i] += num_examples
+                if metrics_reporter is not None:
+                    predictions, targets = (
+                        out[k][j] if k in out else None
+                        for k in ("predictions", "targets")
+                    )
+                    batch_metrics[i].append(
+                        FLBatchMetrics(
+                            loss=out["loss"][j],
+                            num_examples=num_examples,
+                            predictions=predictions,
+                            targets=targets,
+                            model_inputs=[],
+                        )
+                    )
+
+    updates = []
+    for i, (client, model) in enumerate(zip(clients, models)):
+        with torch.no_grad():
+            for name in names:
+                model_params[i][name].copy_(params[name][i])
+        client.cuda_state_manager.after_train_or_eval(model)
+        for metrics in batch_metrics[i]:
+            # pyre-ignore[16]: metrics are only recorded with a reporter
+            metrics_reporter.add_batch_metrics(metrics)
+        weight = float(min(num_examples_processed[i], total_samples[i]))
+        client.store_updated_model(model, weight)
+        delta = client.compute_delta(
+            before=message.model, after=model, model_to_save=model
+        )
+        client.track(delta=delta, weight=weight, optimizer=None)
+        updates.append((delta, weight))
+    return updates
@@ -12,7 +12,7 @@ client where a sample level dp is enforced during training.
 from __future__ import annotations
 
 from dataclasses import dataclass
-from typing import Any, Optional
+from typing import Any, Dict, Optional
 
 import torch
 from flsim.channels.base_channel import IdentityChannel
@@ -72,6 +72,22 @@ class DPClient(Client):
     def _set_defaults_in_cfg(cls, cfg):
         pass
 
+    def spill_state(self) -> Dict[str, Any]:
+        state = super().spill_state()
+        # the budget spent in earlier selections keeps counting
+        state["privacy_budget"] = self._privacy_budget
+        state["dataset_length"] = self.dataset_length
+        if self.privacy_on:
+            state["accountant_steps"] = list(self.accountant.steps)
+        return state
+
+    def restore_state(self, state: Dict[str, Any]) -> None:
+        super().restore_state(state)
+        self._privacy_budget = state["privacy_budget"]
+        self.dataset_length = state["dataset_length"]
+        if self.privacy_on:
+            self.accountant.steps = list(state["accountant_steps"])
+
     def _get_dataset_stats(self, model: IFLModel):
         batch_size = 0
         for batch in self.dataset.train_data():
@@ -72,8 +72,7 @@ class MimeClient(Client):
             model, metrics_reporter=metrics_reporter
         )
         # 4. Store updated model if being tracked
-        if self.store_last_updated_model:
-            self.last_updated_model = FLModelParamUtils.clone(updated_model)
+        self.store_updated_model(updated_model, weight)
         # 5. compute delta
         delta = self.compute_delta(
             before=model, after=updated_model, model_to_save=updated_model
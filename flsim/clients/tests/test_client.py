@@ -5,11 +5,13 @@
 # This source code is licensed under the BSD-style license found in the
 # LICENSE file in the root directory of this source tree.
 
+from collections import OrderedDict
 from unittest.mock import MagicMock
 
 import pytest
 import torch
 import torch.nn as nn
+from flsim.channels.base_channel import IdentityChannel
 from flsim.channels.message import Message
 from flsim.clients.base_client import Client, ClientConfig
 from flsim.clients.dp_client import DPClient, DPClientConfig
@@ -45,6 +47,7 @@ from flsim.optimizers.optimizer_scheduler import (
     ConstantLRSchedulerConfig,
 )
 from flsim.privacy.common import ClippingSetting, PrivacySetting
+from flsim.provenance.fingerprint import fingerprint_state_dict, FingerprintHasher
 from flsim.utils import test_utils as utils
 from flsim.utils.fl.common import FLModelParamUtils
 from flsim.utils.timing.training_duration_distribution import (
@@ -86,6 +89,7 @@ class ClientTestBase:
         data=None,
         store_models_and_optimizers: bool = False,
         timeout_simulator=None,
+        store_last_updated_model: bool = True,
     ):
         data = data or self._fake_data()
         config = ClientConfig(
@@ -96,6 +100,7 @@ class ClientTestBase:
             **OmegaConf.structured(config),
             dataset=data,
             timeout_simulator=timeout_simulator,
+            store_last_updated_model=store_last_updated_model,
         )
 
     def _get_dp_client(
@@ -241,6 +246,29 @@ class TestBaseClient(ClientTestBase):
         mismatched = utils.verify_models_equivalent_after_training(model2, model)
         assertEqual(mismatched, "", mismatched)
 
+    def test_receive_through_channel_copies_on_write(self) -> None:
+        class HalvingChannel(IdentityChannel):
+            def _on_client_after_reception(self, message: Message) -> Message:
+                message.populate_state_dict()
+                message.model_state_dict = OrderedDict(
+                    (name, param / 2)
+                    for name, param in message.model_state_dict.items()
+                )
+                message.update_model_()
+                return message
+
+        model = utils.SampleNet(utils.TwoFC())
+        model.fl_get_module().fill_all(1.0)
+        clnt = self._get_client()
+        clnt.channel = HalvingChannel()
+        received = clnt.receive_through_channel(model)
+        assertTrue(received is not model)
+        # the channel changed its own copy, not the global model
+        mismatched = utils.model_parameters_equal_to_value(model, 1.0)
+        assertEqual(mismatched, "", mismatched)
+        mismatched = utils.model_parameters_equal_to_value(received, 0.5)
+        assertEqual(mismatched, "", mismatched)
+
     def test_prepare_for_training(self) -> None:
         clnt = self._get_client()
         model = utils.SampleNet(utils.TwoFC())
@@ -296,6 +324,51 @@ class TestBaseClient(ClientTestBase):
         mismatched = utils.verify_models_equivalent_after_training(delta, model)
         assertEqual(mismatched, "", mismatched)
 
+    def test_updated_model_consumers(self) -> None:
+        model = utils.SampleNet(utils.TwoFC())
+        # nothing consumes the updated model: no copy is kept
+        clnt = self._get_client(store_last_updated_model=False)
+        clnt.generate_local_update(Message(model))
+        assertTrue(clnt.last_updated_model is None)
+        assertTrue(clnt.pop_updated_snapshot() is None)
+
+        # provenance takes a CPU snapshot, which the client does not keep
+        clnt.snapshot_updated_model = True
+        clnt.generate_local_update(Message(model))
+        assertTrue(clnt.last_updated_model is None)
+        snapshot = clnt.pop_updated_snapshot()
+        assertEqual(list(snapshot), list(model.fl_get_module().state_dict()))
+        assertTrue(all(t.device.type == "cpu" for t in snapshot.values()))
+        assertTrue(clnt.pop_updated_snapshot() is None)
+
+        # fingerprints are hashed from the updated model itself
+        clnt.fingerprint_updated_model = True
+        clnt.generate_local_update(Message(model))
+        snapshot = clnt.pop_updated_snapshot()
+        assertEqual(clnt.pop_updated_fingerprint(), fingerprint_state_dict(snapshot))
+        assertTrue(clnt.pop_updated_fingerprint() is None)
+        clnt.snapshot_updated_model = False
+        clnt.generate_local_update(Message(model))
+        assertTrue(clnt.pop_updated_snapshot() is None)
+        assertTrue(clnt.pop_updated_fingerprint() is not None)
+
+        # or a copy of it is hashed off the training thread, as the model itself
+        # is reused for the delta
+        clnt.snapshot_updated_model = True
+        clnt.fingerprint_hasher = FingerprintHasher(num_threads=1)
+        clnt.generate_local_update(Message(model))
+        snapshot = clnt.pop_updated_snapshot()
+        assertEqual(clnt.pop_updated_fingerprint(), fingerprint_state_dict(snapshot))
+        clnt.fingerprint_hasher.close()
+        clnt.fingerprint_hasher = None
+        clnt.fingerprint_updated_model = False
+        clnt.snapshot_updated_model = False
+
+        # client metrics need the updated model itself
+        clnt = self._get_client(store_last_updated_model=True)
+        clnt.generate_local_update(Message(model))
+        assertTrue(clnt.last_updated_model is not None)
+
     def test_fed_prox_sgd_equivalent(self) -> None:
         """
         Test FedProx under the following scenarios:
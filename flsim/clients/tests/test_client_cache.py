@@ -0,0 +1,60 @@
+#!/usr/bin/env python3
+# Copyright (c) Meta Platforms, Inc. and affiliates.
+# All rights reserved.
+#
+# This source code is licensed under the BSD-style license found in the
+# LICENSE file in the root directory of this source tree.
+
+import torch
+from flsim.channels.message import Message
+from flsim.clients.base_client import Client, ClientConfig
+from flsim.clients.client_cache import ClientCache
+from flsim.common.pytest_helper import assertEqual, assertTrue
+from flsim.utils import test_utils as utils
+from omegaconf import OmegaConf
+
+
+def _client(name: str) -> Client:
+    dataset = utils.DatasetFromList([torch.rand(10, 2) for _ in range(2)])
+    return Client(
+        **OmegaConf.structured(ClientConfig()),
+        dataset=utils.DummyUserData(dataset, utils.SampleNet(utils.TwoFC())),
+        name=name,
+        store_last_updated_model=False,
+    )
+
+
+class TestClientCache:
+    def test_lru_eviction(self) -> None:
+        cache = ClientCache(capacity=2)
+        for i in range(3):
+            cache[i] = _client(f"client_{i}")
+            # client 0 is used again before client 2 is added
+            if i == 1:
+                cache.get(0)
+        assertEqual(list(cache), [0, 2])
+        assertTrue(cache.is_spilled(1))
+        assertEqual(cache.evictions, 1)
+        assertTrue(cache.get(1) is None)
+
+    def test_spilled_state_is_restored(self) -> None:
+        cache = ClientCache(capacity=1)
+        client = _client("client_0")
+        cache[0] = client
+        client.generate_local_update(Message(utils.SampleNet(utils.TwoFC())))
+        client.per_example_training_time = 0.5
+        cache[1] = _client("client_1")
+        assertTrue(0 not in cache)
+
+        rehydrated = _client("client_0")
+        cache[0] = rehydrated
+        assertEqual(rehydrated.times_selected, 1)
+        assertEqual(rehydrated.per_example_training_time, 0.5)
+        assertTrue(not cache.is_spilled(0))
+
+    def test_unbounded(self) -> None:
+        cache = ClientCache()
+        for i in range(5):
+            cache[i] = _client(f"client_{i}")
+        assertEqual(len(cache), 5)
+        assertEqual(cache.evictions, 0)
@@ -0,0 +1,90 @@
+#!/usr/bin/env python3
+# Copyright (c) Meta Platforms, Inc. and affiliates.
+# All rights reserved.
+#
+# This source code is licensed under the BSD-style license found in the
+# LICENSE file in the root directory of this source tree.
+
+import torch
+from flsim.channels.message import Message
+from flsim.clients.base_client import Client, ClientConfig
+from flsim.clients.cohort import can_train_in_cohort, train_cohort
+from flsim.common.pytest_helper import assertEqual, assertFalse, assertTrue
+from flsim.optimizers.local_optimizers import LocalOptimizerSGDConfig
+from flsim.trainers.client_update_executor import ClientUpdateExecutor
+from flsim.utils import test_utils as utils
+from omegaconf import OmegaConf
+
+
+def _clients(num_clients: int, **kwargs):
+    torch.manual_seed(0)
+    clients = []
+    for i in range(num_clients):
+        # uneven number of batches, and a short last batch for some clients
+        dataset = [torch.rand(4, 2) for _ in range(i % 3 + 1)]
+        if i % 2:
+            dataset.append(torch.rand(3, 2))
+        config = ClientConfig(
+            epochs=2, optimizer=LocalOptimizerSGDConfig(lr=0.1 * (i + 1)), **kwargs
+        )
+        clients.append(
+            Client(
+                **OmegaConf.structured(config),
+                dataset=utils.DummyUserData(
+                    utils.DatasetFromList(dataset), utils.SampleNet(utils.TwoFC())
+                ),
+                name=f"client_{i}",
+                store_last_updated_model=False,
+            )
+        )
+    return clients
+
+
+def _assert_updates_close(expected, actual) -> None:
+    assertEqual([w for _, w in actual], [w for _, w in expected])
+    for (expected_delta, _), (actual_delta, _) in zip(expected, actual):
+        for e, a in zip(
+            expected_delta.fl_get_module().parameters(),
+            actual_delta.fl_get_module().parameters(),
+        ):
+            assertTrue(torch.allclose(e, a, atol=1e-6))
+
+
+class TestCohort:
+    def test_cohort_matches_serial(self) -> None:
+        global_model = utils.SampleNet(utils.TwoFC())
+        message = Message(global_model)
+        expected = [c.generate_local_update(message) for c in _clients(5)]
+        clients = _clients(5)
+        assertTrue(all(can_train_in_cohort(c, global_model) for c in clients))
+        reporter = utils.SimpleMetricReporter()
+        _assert_updates_close(expected, train_cohort(clients, message, reporter))
+        # one batch metrics per local step, in client order
+        assertEqual(
+            [m.num_examples for m in reporter.batch_metrics],
+            [
+                n
+                for c in clients
+                for _ in range(2)
+                for n in [len(b) for b in c.dataset.train_data()]
+            ],
+        )
+        assertEqual([c.times_selected for c in clients], [1] * 5)
+
+    def test_ineligible_clients_train_on_their_own(self) -> None:
+        global_model = utils.SampleNet(utils.TwoFC())
+        message = Message(global_model)
+        clients = _clients(3) + _clients(2, max_clip_norm_normalized=1.0)
+        assertFalse(can_train_in_cohort(clients[-1], global_model))
+        expected = [c.generate_local_update(message) for c in _clients(3)]
+        expected += [
+            c.generate_local_update(message)
+            for c in _clients(2, max_clip_norm_normalized=1.0)
+        ]
+        updates = list(
+            ClientUpdateExecutor(cohort_size=2).generate_local_updates(
+                clients, message
+            )
+        )
+        assertEqual([c.name for c, _, _ in updates], [c.name for c in clients])
+        _assert_updates_close(expected, [(d, w) for _, d, w in updates])
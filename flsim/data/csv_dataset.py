@@ -6,11 +6,13 @@
 # LICENSE file in the root directory of this source tree.
 
 import abc
-from typing import Any, Dict
+import os
+from typing import Any, Callable, Dict, Iterator, Optional, Tuple
 
 # see https://fb.workplace.com/groups/fbcode/permalink/2440457449324413/
 # @manual=fbsource//third-party/pypi/pandas:pandas
 import pandas as pd
+import torch
 from flsim.interfaces.dataset import FLDataset
 
 
@@ -51,3 +53,214 @@ class FLCSVDataset(FLDataset):
         model expects such as tensor for features and integer for labels).
         """
         pass
+
+
+class GrowingColumns:
+    """One tensor per key that chunks of rows are appended to. The tensors grow
+    geometrically, so every row is copied a constant number of times.
+    """
+
+    def __init__(self):
+        self.num_rows = 0
+        self._buffers: Dict[str, torch.Tensor] = {}
+
+    def append(self, chunk: Dict[str, torch.Tensor]) -> None:
+        end = self.num_rows + FLCSVChunkedDataset.num_rows_of(chunk)
+        for key, column in chunk.items():
+            buffer = self._buffers.get(key)
+            if buffer is None or len(buffer) < end:
+                capacity = max(end, 2 * len(buffer) if buffer is not None else 0)
+                grown = column.new_empty((capacity, *column.shape[1:]))
+                if buffer is not None:
+                    grown[: self.num_rows] = buffer[: self.num_rows]
+                self._buffers[key] = buffer = grown
+            buffer[self.num_rows : end] = column
+        self.num_rows = end
+
+    def append_row(self, row: Dict[str, Any]) -> bool:
+        """Appends a row of tensors, unless its keys, shapes or dtypes differ
+        from the rows before, in which case nothing is appended and False is
+        returned.
+        """
+        if not all(torch.is_tensor(value) for value in row.values()):
+            return False
+        if self._buffers and (
+            row.keys() != self._buffers.keys()
+            or any(
+                value.shape != self._buffers[key].shape[1:]
+                or value.dtype != self._buffers[key].dtype
+                for key, value in row.items()
+            )
+        ):
+            return False
+        self.append({key: value.unsqueeze(0) for key, value in row.items()})
+        return True
+
+    def columns(self) -> Dict[str, torch.Tensor]:
+        """The rows appended so far, one tensor per key."""
+        columns = {}
+        for key, buffer in self._buffers.items():
+            if len(buffer) > self.num_rows:
+                # a trimmed copy, since torch.save writes the whole storage of
+                # a view
+                buffer = buffer[: self.num_rows].clone()
+            columns[key] = buffer
+        return columns
+
+
+class FLCSVChunkedDataset(FLDataset):
+    """Streaming counterpart of FLCSVDataset for CSV files too large to load
+    at once. The file is read `chunk_size` rows at a time, and each chunk is
+    processed into one tensor per key by `process_chunk`, which subclasses
+    override with vectorized code, e.g.
+    ```
+    class AdsCVRDataset(FLCSVChunkedDataset):
+        def process_chunk(self, raw_chunk: pd.DataFrame):
+            return {
+                "float_features": torch.from_numpy(raw_chunk[FEATS].to_numpy()),
+                "label": torch.from_numpy(raw_chunk["label"].to_numpy()),
+            }
+    ```
+    By default, chunks are processed row by row with
+    `_get_processed_row_from_single_raw_row`, like FLCSVDataset. Unlike there,
+    it is an optional hook rather than an abstract method: subclasses override
+    either it or `process_chunk`.
+
+    Iterating over the dataset yields processed rows and only holds one chunk
+    in memory, so a sharder can consume it as it is read. `columns` returns
+    all the processed rows, copied chunk by chunk into tensors that grow as
+    they are read, and stores them in `cache_path` when it is set: later runs
+    then load the processed columns instead of parsing the CSV, until the CSV
+    file or the dataset class changes. Bump `cache_version` when the
+    processing of a class changes, so that its stale caches are not loaded.
+    """
+
+    def __init__(
+        self,
+        path: str,
+        chunk_size: int = 100000,
+        cache_path: Optional[str] = None,
+        cache_version: str = "",
+    ):
+        assert chunk_size > 0, "chunk_size must be positive"
+        self.path = path
+        self.chunk_size = chunk_size
+        self.cache_path = cache_path
+        self.cache_version = cache_version
+
+    def __iter__(self) -> Iterator[Dict[str, torch.Tensor]]:
+        for chunk in self.chunks():
+            yield from self.rows_of(chunk)
+
+    def chunks(self) -> Iterator[Dict[str, torch.Tensor]]:
+        """Processed chunks of rows, one tensor per key."""
+        columns = self._load_cache()
+        if columns is not None:
+            yield from self._slice_chunks(columns)
+            return
+        yield from self._read_chunks()
+
+    def columns(
+        self,
+        consume_rows: Optional[
+            Callable[[Iterator[Tuple[int, Dict[str, torch.Tensor]]]], None]
+        ] = None,
+    ) -> Dict[str, torch.Tensor]:
+        """All the processed rows, one tensor per key. ``consume_rows`` is
+        called once with an iterator of ``(position, row)`` over all the rows,
+        which reads the chunks as it is consumed, e.g. to shard the rows
+        without holding them.
+        """
+        columns = self._load_cache()
+        if columns is not None:
+            if consume_rows is not None:
+                consume_rows(self._positioned_rows(self._slice_chunks(columns)))
+            return columns
+        growing = GrowingColumns()
+
+        def append(chunk: Dict[str, torch.Tensor]) -> Dict[str, torch.Tensor]:
+            growing.append(chunk)
+            return chunk
+
+        chunks = (append(chunk) for chunk in self._read_chunks())
+        if consume_rows is not None:
+            consume_rows(self._positioned_rows(chunks))
+        # read whatever consume_rows left
+        for _ in chunks:
+            pass
+        columns = growing.columns()
+        if self.cache_path is not None:
+            torch.save(
+                {"source": self._source_signature(), "columns": columns},
+                self.cache_path,
+            )
+        return columns
+
+    def process_chunk(self, raw_chunk: pd.DataFrame) -> Dict[str, torch.Tensor]:
+        """Converts a chunk of raw rows into one tensor per key, with as many
+        rows as the chunk.
+        """
+        rows = [
+            self._get_processed_row_from_single_raw_row(raw_row)
+            for _, raw_row in raw_chunk.iterrows()
+        ]
+        return {key: torch.stack([row[key] for row in rows]) for key in rows[0]}
+
+    def _get_processed_row_from_single_raw_row(self, raw_row: Any) -> Dict[str, Any]:
+        """Optional hook that converts a raw row into a processed row, see
+        FLCSVDataset. Only used if `process_chunk` is not overridden.
+        """
+        raise NotImplementedError(
+            f"{type(self).__name__} must override process_chunk or "
+            "_get_processed_row_from_single_raw_row"
+        )
+
+    def _read_chunks(self) -> Iterator[Dict[str, torch.Tensor]]:
+        for raw_chunk in pd.read_csv(self.path, chunksize=self.chunk_size):
+            yield self.process_chunk(raw_chunk)
+
+    def _slice_chunks(
+        self, columns: Dict[str, torch.Tensor]
+    ) -> Iterator[Dict[str, torch.Tensor]]:
+        for start in range(0, self.num_rows_of(columns), self.chunk_size):
+            yield {
+                key: column[start : start + self.chunk_size]
+                for key, column in columns.items()
+            }
+
+    def _positioned_rows(
+        self, chunks: Iterator[Dict[str, torch.Tensor]]
+    ) -> Iterator[Tuple[int, Dict[str, torch.Tensor]]]:
+        position = 0
+        for chunk in chunks:
+            for row in self.rows_of(chunk):
+                yield position, row
+                position += 1
+
+    @staticmethod
+    def num_rows_of(columns: Dict[str, torch.Tensor]) -> int:
+        return len(next(iter(columns.values()), ()))
+
+    @staticmethod
+    def rows_of(columns: Dict[str, torch.Tensor]) -> Iterator[Dict[str, torch.Tensor]]:
+        """The rows of `columns`, as views."""
+        for i in range(FLCSVChunkedDataset.num_rows_of(columns)):
+            yield {key: column[i] for key, column in columns.items()}
+
+    def _source_signature(self):
+        stat = os.stat(self.path)
+        return [
+            os.path.abspath(self.path),
+            stat.st_size,
+            stat.st_mtime_ns,
+            f"{type(self).__module__}.{type(self).__qualname__}",
+            self.cache_version,
+        ]
+
+    def _load_cache(self) -> Optional[Dict[str, torch.Tensor]]:
+        if self.cache_path is None or not os.path.exists(self.cache_path):
+            return None
+        cache = torch.load(self.cache_path, weights_only=True)
+        if cache["source"] != self._source_signature():
+            return None
+        return cache["columns"]
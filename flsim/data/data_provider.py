@@ -10,6 +10,7 @@ from __future__ import annotations
 from abc import ABC, abstractmethod
 from typing import Any, Iterable, Iterator, List, Optional
 
+import torch
 from flsim.interfaces.model import IFLModel
 
 
@@ -106,6 +107,24 @@ class IFLDataProvider(ABC):
         Returns training users iterable
         """
 
+    def train_user_sample_counts(self) -> torch.Tensor:
+        """
+        Returns the number of train examples of every train user, in the order
+        of train_user_ids(). Counted once and cached, as train users are
+        fixed once the provider is built.
+        """
+        counts = getattr(self, "_train_user_sample_counts", None)
+        if counts is None:
+            counts = torch.tensor(
+                [
+                    self.get_train_user(u).num_train_examples()
+                    for u in self.train_user_ids()
+                ],
+                dtype=torch.float,
+            )
+            self._train_user_sample_counts = counts
+        return counts
+
     @abstractmethod
     def eval_users(self) -> Iterable[IFLUserData]:
         """
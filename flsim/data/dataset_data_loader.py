@@ -5,15 +5,40 @@
 # This source code is licensed under the BSD-style license found in the
 # LICENSE file in the root directory of this source tree.
 
-from typing import Any, Iterable, Optional, Type
+import itertools
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Tuple, Type
 
 import torch
+from flsim.data.csv_dataset import FLCSVChunkedDataset, GrowingColumns
 from flsim.data.data_sharder import FLDataSharder
 from flsim.interfaces.data_loader import IFLDataLoader
 from flsim.interfaces.dataset import FLDataset
 from torch.utils.data import Dataset
 
 
+class _PositionedRow(dict):
+    """A row handed to a sharder that remembers its position in the columns."""
+
+    __slots__ = ("position",)
+
+
+def _positioned_rows(
+    rows: Iterator[Tuple[int, Dict[str, Any]]],
+    keep: Callable[[], bool] = lambda: False,
+) -> Iterator[_PositionedRow]:
+    # a row is emptied once the sharder asks for the next one, unless `keep()`,
+    # so the shards keep its position but not its values
+    row = None
+    for position, values in rows:
+        if row is not None and not keep():
+            row.clear()
+        row = _PositionedRow(values)
+        row.position = position
+        yield row
+    if row is not None and not keep():
+        row.clear()
+
+
 class FLDatasetDataLoader(IFLDataLoader):
     def __init__(
         self,
@@ -105,35 +130,112 @@ class FLDatasetDataLoaderWithBatch(IFLDataLoader):
     def _create_batches_from_dataset(
         self, dataset: Dataset, rank: int, world_size: int
     ):
-        train_batches = [user_data for _, user_data in self.sharder.shard_rows(dataset)]
-        # batch train_batches collected above
-        final_train_batches = []
-        num_total_users = 0
-        # fetch attributes for each row
-        keys = list(train_batches[0][0].keys())
-        for one_user_data in train_batches:
-            batched_user_data = []
-            for i, single_data in enumerate(one_user_data):
-                if i % self.train_batch_size == 0:
-                    batched_user_data.append([])
-                batched_user_data[-1].append(single_data)
-
-            new_batched_user_data = []
-            for a_batched_user_data in batched_user_data:
-                batched_data_rows = {}
-                for key in keys:
-                    batched_data_rows[key] = []
-                for single_user_data in a_batched_user_data:
-                    for key in keys:
-                        batched_data_rows[key].append(single_user_data[key])
-
-                for key in keys:
-                    batched_data_rows[key] = torch.stack(batched_data_rows[key])
-
-                new_batched_user_data.append(batched_data_rows)
+        if isinstance(dataset, FLCSVChunkedDataset):
+            return self._create_batches_from_chunked_dataset(dataset, rank, world_size)
+        rows = iter(dataset)
+        first = next(rows, None)
+        if first is None:
+            return [], 0
+        # rows are copied into the columns as the sharder reads them, and only
+        # their positions are kept, unless the rows cannot be stacked
+        growing = GrowingColumns()
+        stackable = True
+
+        def stacked_rows() -> Iterator[Tuple[int, Dict[str, Any]]]:
+            nonlocal stackable
+            for position, row in enumerate(itertools.chain([first], rows)):
+                stackable = stackable and growing.append_row(row)
+                yield position, row
+
+        shards = [
+            user_rows
+            for _, user_rows in self.sharder.shard_rows(
+                _positioned_rows(stacked_rows(), keep=lambda: not stackable)
+            )
+        ]
+        columns = growing.columns()
+        if not stackable:
+            # rows emptied before one could not be stacked are read back from
+            # the columns, then users are batched from their rows
+            for user_rows in shards:
+                for row in user_rows:
+                    if not row:
+                        for key, column in columns.items():
+                            row[key] = column[row.position]
+            columns = None
+        final_train_batches = [
+            self._batch_user(columns, user_rows, [row.position for row in user_rows])
             # divide the total number of users evenly into world_size # of workers
-            if num_total_users % world_size == rank:
-                final_train_batches.append(new_batched_user_data)
-            # count the total number of users
-            num_total_users += 1
-        return final_train_batches, num_total_users
+            for user_index, user_rows in enumerate(shards)
+            if user_index % world_size == rank
+        ]
+        return final_train_batches, len(shards)
+
+    def _create_batches_from_chunked_dataset(
+        self, dataset: FLCSVChunkedDataset, rank: int, world_size: int
+    ):
+        # rows are sharded as the columns are read, and only their positions
+        # are kept until each user is gathered from the columns
+        shards: List[List[_PositionedRow]] = []
+
+        def shard_rows(rows: Iterator[Tuple[int, Dict[str, torch.Tensor]]]) -> None:
+            shards.extend(
+                user_rows
+                for _, user_rows in self.sharder.shard_rows(_positioned_rows(rows))
+            )
+
+        columns = dataset.columns(shard_rows)
+        final_train_batches = [
+            self._batch_columns(columns, positions)
+            # divide the total number of users evenly into world_size # of workers
+            for user_index, positions in enumerate(
+                [row.position for row in user_rows] for user_rows in shards
+            )
+            if user_index % world_size == rank
+        ]
+        return final_train_batches, len(shards)
+
+    def _batch_user(
+        self,
+        columns: Optional[Dict[str, Any]],
+        user_rows: List[Dict[str, Any]],
+        positions: List[int],
+    ) -> List[Dict[str, Any]]:
+        batch_size = self.train_batch_size
+        if columns is None:
+            # rows of different shapes can only be stacked batch by batch
+            return [
+                {
+                    key: torch.stack([row[key] for row in batch_rows])
+                    for key in user_rows[0]
+                }
+                for batch_rows in (
+                    user_rows[start : start + batch_size]
+                    for start in range(0, len(user_rows), batch_size)
+                )
+            ]
+        return self._batch_columns(columns, positions)
+
+    def _batch_columns(
+        self, columns: Dict[str, Any], positions: List[int]
+    ) -> List[Dict[str, Any]]:
+        batch_size = self.train_batch_size
+        first = positions[0]
+        if positions == list(range(first, first + len(positions))):
+            # consecutive rows are a view of the columns
+            user_columns = {
+                key: column[first : first + len(positions)]
+                for key, column in columns.items()
+            }
+        else:
+            index = torch.tensor(positions, dtype=torch.long)
+            user_columns = {
+                key: column.index_select(0, index) for key, column in columns.items()
+            }
+        split_columns = {
+            key: column.split(batch_size) for key, column in user_columns.items()
+        }
+        return [
+            dict(zip(split_columns.keys(), batch))
+            for batch in zip(*split_columns.values())
+        ]
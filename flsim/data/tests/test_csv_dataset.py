@@ -0,0 +1,146 @@
+#!/usr/bin/env python3
+# Copyright (c) Meta Platforms, Inc. and affiliates.
+# All rights reserved.
+#
+# This source code is licensed under the BSD-style license found in the
+# LICENSE file in the root directory of this source tree.
+
+import random
+from typing import Any, Dict
+
+import numpy as np
+import pandas as pd
+import pkg_resources
+import torch
+from flsim.common.pytest_helper import assertEqual, assertRaises, assertTrue
+from flsim.data.csv_dataset import FLCSVChunkedDataset
+from flsim.data.data_sharder import (
+    ColumnSharderConfig,
+    PowerLawSharderConfig,
+    RandomSharderConfig,
+    RoundRobinSharderConfig,
+)
+from flsim.data.dataset_data_loader import FLDatasetDataLoaderWithBatch
+from hydra.utils import instantiate
+
+
+class RowDataset(FLCSVChunkedDataset):
+    def _get_processed_row_from_single_raw_row(self, raw_row: Any) -> Dict[str, Any]:
+        return {
+            "userid": torch.tensor(raw_row["userid"]),
+            "label": torch.tensor(raw_row["label"], dtype=torch.float),
+        }
+
+
+class ChunkDataset(FLCSVChunkedDataset):
+    def process_chunk(self, raw_chunk: pd.DataFrame) -> Dict[str, torch.Tensor]:
+        return {
+            "userid": torch.from_numpy(raw_chunk["userid"].to_numpy()),
+            "label": torch.from_numpy(raw_chunk["label"].to_numpy()).float(),
+        }
+
+
+def _csv_path() -> str:
+    return pkg_resources.resource_filename(__name__, "test_resources/data.csv")
+
+
+class TestFLCSVChunkedDataset:
+    def test_chunks_match_rows(self) -> None:
+        num_rows = len(pd.read_csv(_csv_path()))
+        rows = RowDataset(_csv_path(), chunk_size=4)
+        chunks = ChunkDataset(_csv_path(), chunk_size=4)
+        assertEqual(
+            [len(chunk["label"]) for chunk in chunks.chunks()],
+            [min(4, num_rows - start) for start in range(0, num_rows, 4)],
+        )
+        expected = list(rows)
+        actual = list(chunks)
+        assertEqual(len(actual), num_rows)
+        for expected_row, actual_row in zip(expected, actual):
+            for key in ("userid", "label"):
+                assertTrue(torch.equal(expected_row[key], actual_row[key]))
+
+    def test_columns_are_cached(self, tmp_path) -> None:
+        cache_path = str(tmp_path / "data.pt")
+        dataset = ChunkDataset(_csv_path(), chunk_size=4, cache_path=cache_path)
+        columns = dataset.columns()
+        assertTrue(dataset._load_cache() is not None)
+
+        # processing is skipped when the cache is valid
+        def fail(raw_chunk: pd.DataFrame):
+            raise AssertionError("processed despite the cache")
+
+        cached = ChunkDataset(_csv_path(), chunk_size=4, cache_path=cache_path)
+        cached.process_chunk = fail
+        for key, column in cached.columns().items():
+            assertTrue(torch.equal(column, columns[key]))
+        assertEqual(len(list(cached)), len(columns["label"]))
+
+        # another class or cache version does not load the cache
+        for stale in (
+            RowDataset(_csv_path(), chunk_size=4, cache_path=cache_path),
+            ChunkDataset(
+                _csv_path(), chunk_size=4, cache_path=cache_path, cache_version="2"
+            ),
+        ):
+            assertTrue(stale._load_cache() is None)
+
+    def test_data_loader(self) -> None:
+        dataset = ChunkDataset(_csv_path(), chunk_size=4)
+        sharder = instantiate(ColumnSharderConfig(sharding_col="userid"))
+        data_loader = FLDatasetDataLoaderWithBatch(
+            dataset, dataset, dataset, sharder, 2
+        )
+        users = data_loader.fl_train_set()
+        assertEqual(len(users), len(set(dataset.columns()["userid"].tolist())))
+        for batches in users:
+            for batch in batches:
+                # a user's rows share its userid
+                assertEqual(len(set(batch["userid"].tolist())), 1)
+
+    def test_data_loader_matches_rows(self, tmp_path) -> None:
+        rows = list(RowDataset(_csv_path(), chunk_size=4))
+        dataset = ChunkDataset(
+            _csv_path(), chunk_size=4, cache_path=str(tmp_path / "data.pt")
+        )
+        for sharder_config in (
+            ColumnSharderConfig(sharding_col="userid"),
+            RandomSharderConfig(num_shards=3),
+            RoundRobinSharderConfig(num_shards=3),
+            PowerLawSharderConfig(num_shards=3, alpha=0.5),
+        ):
+            _seed()
+            expected = FLDatasetDataLoaderWithBatch(
+                rows, rows, rows, instantiate(sharder_config), 2
+            ).fl_train_set()
+            # the second pass shards the cached columns
+            for _ in range(2):
+                _seed()
+                actual = FLDatasetDataLoaderWithBatch(
+                    dataset, dataset, dataset, instantiate(sharder_config), 2
+                ).fl_train_set()
+                _assert_same_users(actual, expected)
+
+    def test_data_loader_checks_num_shards(self) -> None:
+        dataset = ChunkDataset(_csv_path(), chunk_size=4)
+        num_rows = len(pd.read_csv(_csv_path()))
+        sharder = instantiate(RoundRobinSharderConfig(num_shards=num_rows + 1))
+        data_loader = FLDatasetDataLoaderWithBatch(
+            dataset, dataset, dataset, sharder, 2
+        )
+        with assertRaises(AssertionError):
+            data_loader.fl_train_set()
+
+
+def _seed() -> None:
+    random.seed(0)
+    np.random.seed(0)
+
+
+def _assert_same_users(actual, expected) -> None:
+    assertEqual(len(actual), len(expected))
+    for expected_batches, actual_batches in zip(expected, actual):
+        assertEqual(len(actual_batches), len(expected_batches))
+        for expected_batch, actual_batch in zip(expected_batches, actual_batches):
+            for key in ("userid", "label"):
+                assertTrue(torch.equal(expected_batch[key], actual_batch[key]))
@@ -10,9 +10,9 @@ from typing import Any, Dict
 import pkg_resources
 import pytest
 import torch
-from flsim.common.pytest_helper import assertEqual
+from flsim.common.pytest_helper import assertEqual, assertTrue
 from flsim.data.csv_dataset import FLCSVDataset
-from flsim.data.data_sharder import ColumnSharderConfig
+from flsim.data.data_sharder import ColumnSharderConfig, SequentialSharderConfig
 from flsim.data.dataset_data_loader import FLDatasetDataLoaderWithBatch
 from hydra.utils import instantiate
 
@@ -67,3 +67,40 @@ class TestDatasetDataLoaderWithBatch:
             len(list(data_loader.fl_test_set())),
             self.total_data_count / self.test_batch_size,
         )
+
+    def test_batches_match_rows(self) -> None:
+        rows = [
+            {"user": torch.tensor(i % 3), "features": torch.rand(2, 2)}
+            for i in range(11)
+        ]
+        for sharder_config in (
+            # users of scattered rows, and users of consecutive rows
+            ColumnSharderConfig(sharding_col="user"),
+            SequentialSharderConfig(examples_per_shard=4),
+        ):
+            _assert_batches_match_rows(rows, sharder_config)
+
+    def test_batches_match_rows_of_different_shapes(self) -> None:
+        # the rows of a user share a shape, which differs between users, so
+        # rows cannot be stacked into columns but batches can
+        rows = [
+            {"user": torch.tensor(i % 3), "features": torch.rand(i % 3 + 1)}
+            for i in range(11)
+        ]
+        _assert_batches_match_rows(rows, ColumnSharderConfig(sharding_col="user"))
+
+
+def _assert_batches_match_rows(rows, sharder_config) -> None:
+    sharder = instantiate(sharder_config)
+    data_loader = FLDatasetDataLoaderWithBatch(rows, rows, rows, sharder, 2)
+    users = data_loader.fl_train_set()
+    expected_users = instantiate(sharder_config).shard_rows(rows)
+    assertEqual(len(users), len(expected_users))
+    for batches, (_, user_rows) in zip(users, expected_users):
+        assertEqual(len(batches), (len(user_rows) + 1) // 2)
+        for i, batch in enumerate(batches):
+            for key in ("user", "features"):
+                expected = torch.stack(
+                    [row[key] for row in user_rows[2 * i : 2 * i + 2]]
+                )
+                assertTrue(torch.equal(batch[key], expected))
@@ -7,8 +7,9 @@
 
 import abc
 import copy
-from typing import Any, Dict, List, Optional, Tuple
+from typing import Any, Dict, List, Optional, Sequence, Tuple
 
+import torch
 from flsim.common.timeline import Timeline
 from flsim.interfaces.batch_metrics import IFLBatchMetrics
 from flsim.interfaces.metrics_reporter import (
@@ -20,21 +21,78 @@ from flsim.interfaces.metrics_reporter import (
 from torch.utils.tensorboard import SummaryWriter
 
 
+class ClassificationAccumulator:
+    """Running counts of a classifier's predictions, updated batch by batch:
+    for each ``k`` in ``top_k``, the number of examples whose target is among
+    the ``k`` highest scored classes, and the confusion counts of targets
+    (rows) against the highest scored class (columns).
+
+    Counts stay on the device of the predictions, so updating them does not
+    wait for the device.
+    """
+
+    def __init__(self, top_k: Sequence[int] = (1,)):
+        self.top_k = tuple(top_k)
+        self.reset()
+
+    def reset(self) -> None:
+        self.num_examples = 0
+        self.top_k_correct: Optional[torch.Tensor] = None
+        self.confusion: Optional[torch.Tensor] = None
+
+    def update(self, predictions: torch.Tensor, targets: torch.Tensor) -> None:
+        predictions = predictions.detach()
+        targets = targets.detach().reshape(-1).long()
+        num_classes = predictions.shape[1]
+        ranked = predictions.topk(min(max(self.top_k), num_classes), dim=1).indices
+        # a target is at most once among the ranked classes, so the running
+        # count of hits tells whether it is within the first k of them
+        hits = ranked.eq(targets.unsqueeze(1)).cumsum(dim=1)
+        correct = hits[:, [min(k, ranked.shape[1]) - 1 for k in self.top_k]].sum(0)
+        confusion = torch.bincount(
+            targets * num_classes + ranked[:, 0], minlength=num_classes**2
+        ).reshape(num_classes, num_classes)
+        if self.top_k_correct is None:
+            self.top_k_correct, self.confusion = correct, confusion
+        else:
+            self.top_k_correct += correct
+            self.confusion += confusion
+        self.num_examples += targets.numel()
+
+    def accuracy(self, k: int = 1) -> float:
+        """Percentage of examples whose target is among the ``k`` highest
+        scored classes.
+        """
+        if self.num_examples == 0:
+            return 0.0
+        correct = self.top_k_correct[self.top_k.index(k)].item()
+        return 100.0 * correct / self.num_examples
+
+
 class FLMetricsReporter(IFLMetricsReporter, abc.ABC):
-    """MetricsReporter with Tensorboard support."""
+    """MetricsReporter with Tensorboard support.
+
+    The loss and number of examples of the batches are summed as they are
+    added; scores should be accumulated the same way in
+    ``update_accumulators``. The metrics of every batch, including its
+    predictions and model inputs, are only kept in lists when
+    ``store_batch_metrics`` is set.
+    """
 
-    def __init__(self, channels: List[Channel], log_dir: Optional[str] = None):
+    def __init__(
+        self,
+        channels: List[Channel],
+        log_dir: Optional[str] = None,
+        store_batch_metrics: bool = False,
+    ):
         self.channels = channels
         self.log_dir = log_dir
         if Channel.TENSORBOARD in channels:
             self.set_summary_writer(log_dir)
         if Channel.STDOUT in channels:
             self.print = print
-        self.losses = []
-        self.num_examples_list = []
-        self.predictions_list = []
-        self.targets_list = []
-        self.model_inputs_list = []
+        self.store_batch_metrics = store_batch_metrics
+        self._clear_batch_metrics()
         self.latest_scores = {}
         self.best_eval_metrics = None
 
@@ -42,11 +100,23 @@ class FLMetricsReporter(IFLMetricsReporter, abc.ABC):
         self.writer = SummaryWriter(log_dir=log_dir)
 
     def add_batch_metrics(self, metrics: IFLBatchMetrics) -> None:
-        self.losses.append(metrics.loss.item())
-        self.num_examples_list.append(metrics.num_examples)
-        self.predictions_list.append(metrics.predictions)
-        self.targets_list.append(metrics.targets)
-        self.model_inputs_list.append(metrics.model_inputs)
+        loss = metrics.loss.item()
+        self.loss_sum += loss
+        self.num_batches += 1
+        self.num_examples += metrics.num_examples
+        self.update_accumulators(metrics)
+        if self.store_batch_metrics:
+            self.losses.append(loss)
+            self.num_examples_list.append(metrics.num_examples)
+            self.predictions_list.append(metrics.predictions)
+            self.targets_list.append(metrics.targets)
+            self.model_inputs_list.append(metrics.model_inputs)
+
+    def update_accumulators(self, metrics: IFLBatchMetrics) -> None:
+        """Override to update the running state that ``compute_scores``
+        reads (e.g. correct predictions) with the metrics of one batch.
+        """
+        pass
 
     def aggregate(self, one_user_metrics):
         pass
@@ -87,8 +157,8 @@ class FLMetricsReporter(IFLMetricsReporter, abc.ABC):
         eval_metrics = None
 
         training_stage_in_str = TrainingStage(stage).name.title()
-        if len(self.losses) > 0:
-            mean_loss = sum(self.losses) / len(self.losses)
+        if self.num_batches > 0:
+            mean_loss = self.loss_sum / self.num_batches
 
             if Channel.STDOUT in self.channels:
                 self.print(f"{timeline}, Loss/{training_stage_in_str}: {mean_loss}")
@@ -146,6 +216,12 @@ class FLMetricsReporter(IFLMetricsReporter, abc.ABC):
         return eval_metrics
 
     def reset(self):
+        self._clear_batch_metrics()
+
+    def _clear_batch_metrics(self) -> None:
+        self.loss_sum = 0.0
+        self.num_batches = 0
+        self.num_examples = 0
         self.losses = []
         self.num_examples_list = []
         self.predictions_list = []
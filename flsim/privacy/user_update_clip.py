@@ -27,6 +27,7 @@ from flsim.privacy.common import (
     PrivacySetting,
 )
 from flsim.utils.fl.common import FLModelParamUtils
+from flsim.utils.fl.param_arena import ParamArena
 from torch import nn
 
 
@@ -65,11 +66,23 @@ class IUserClipper(abc.ABC):
         return self._cached_model_diff
 
     def _calc_norm_and_clip_factor(self, model: nn.Module) -> Tuple[float, float]:
-        per_user_update_norm = calc_norm(model.parameters())
+        arena = ParamArena.of(model)
+        per_user_update_norm = calc_norm(
+            [arena.params] if arena is not None else model.parameters()
+        )
         clip_factor = calc_clip_factor(self.max_norm, per_user_update_norm)
         self.unclipped_num += 1 if math.isclose(clip_factor, 1.0) else 0
         return per_user_update_norm, clip_factor
 
+    def _scale(self, model_diff: nn.Module, clip_factor: float) -> None:
+        arena = ParamArena.of(model_diff)
+        with torch.no_grad():
+            if arena is not None:
+                arena.params.mul_(clip_factor)
+            else:
+                for parameter in model_diff.parameters():
+                    parameter.copy_(parameter * clip_factor)
+
     @abc.abstractmethod
     def reset_clipper_stats(self):
         pass
@@ -99,9 +112,7 @@ class UserUpdateClipper(IUserClipper):
         is in-place (modifies ``model_diff`` in this method)
         """
         per_user_update_norm, clip_factor = self._calc_norm_and_clip_factor(model_diff)
-        with torch.no_grad():
-            for parameter in model_diff.parameters():
-                parameter.copy_(parameter * clip_factor)
+        self._scale(model_diff, clip_factor)
         return per_user_update_norm
 
     def update_clipper_stats(self):
@@ -161,9 +172,7 @@ class AdaptiveClipper(IUserClipper):
         # pyre-fixme[8]: Attribute has type `float`; used as `Tensor`.
         self.noisy_unclipped_num += unclipped_num_noise
 
-        with torch.no_grad():
-            for parameter in model_diff.parameters():
-                parameter.copy_(parameter * clip_factor)
+        self._scale(model_diff, clip_factor)
 
         return per_user_update_norm
 
@@ -0,0 +1,67 @@
+#!/usr/bin/env python3
+# Copyright (c) Meta Platforms, Inc. and affiliates.
+# All rights reserved.
+#
+# This source code is licensed under the BSD-style license found in the
+# LICENSE file in the root directory of this source tree.
+
+from hydra.core.config_store import ConfigStore
+
+from .capture_policy import (
+    AllClientsCapturePolicyConfig,
+    EveryNthRoundCapturePolicyConfig,
+    GlobalOnlyCapturePolicyConfig,
+    RandomFractionCapturePolicyConfig,
+    UpdateNormOutlierCapturePolicyConfig,
+)
+from .file_provenance_store import LocalFileProvenanceStoreConfig
+from .mysql_provenance_store import MySQLProvenanceStoreConfig
+from .sqlite_provenance_store import SQLiteProvenanceStoreConfig
+
+ConfigStore.instance().store(
+    name="base_mysql_provenance_store",
+    node=MySQLProvenanceStoreConfig,
+    group="provenance_store",
+)
+
+ConfigStore.instance().store(
+    name="base_sqlite_provenance_store",
+    node=SQLiteProvenanceStoreConfig,
+    group="provenance_store",
+)
+
+ConfigStore.instance().store(
+    name="base_local_file_provenance_store",
+    node=LocalFileProvenanceStoreConfig,
+    group="provenance_store",
+)
+
+ConfigStore.instance().store(
+    name="base_all_clients_capture_policy",
+    node=AllClientsCapturePolicyConfig,
+    group="provenance_capture",
+)
+
+ConfigStore.instance().store(
+    name="base_every_nth_round_capture_policy",
+    node=EveryNthRoundCapturePolicyConfig,
+    group="provenance_capture",
+)
+
+ConfigStore.instance().store(
+    name="base_random_fraction_capture_policy",
+    node=RandomFractionCapturePolicyConfig,
+    group="provenance_capture",
+)
+
+ConfigStore.instance().store(
+    name="base_update_norm_outlier_capture_policy",
+    node=UpdateNormOutlierCapturePolicyConfig,
+    group="provenance_capture",
+)
+
+ConfigStore.instance().store(
+    name="base_global_only_capture_policy",
+    node=GlobalOnlyCapturePolicyConfig,
+    group="provenance_capture",
+)
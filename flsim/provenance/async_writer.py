@@ -0,0 +1,167 @@
+#!/usr/bin/env python3
+# Copyright (c) Meta Platforms, Inc. and affiliates.
+# All rights reserved.
+#
+# This source code is licensed under the BSD-style license found in the
+# LICENSE file in the root directory of this source tree.
+
+"""
+Background writer for data provenance records.
+
+The trainer snapshots each client model to CPU memory and hands the snapshot to
+an ``AsyncProvenanceWriter``; the snapshot is not kept anywhere else.
+Serialization and database writes then happen on a background thread in
+multi-row batches, so the training thread only pays for the snapshot itself.
+The queue between the two is bounded: if the writer falls behind, ``submit``
+blocks until there is room again.
+"""
+
+from __future__ import annotations
+
+import queue
+import threading
+from dataclasses import dataclass
+from typing import Callable, Dict, List, Optional
+
+import torch
+from flsim.common.logger import Logger
+from flsim.interfaces.model import IFLModel
+
+
+# `client_id` of the records holding the global model broadcast in a round
+GLOBAL_MODEL_CLIENT_ID = "global"
+
+
+def snapshot_state_dict(model: IFLModel) -> Dict[str, torch.Tensor]:
+    """Takes a detached CPU copy of ``model``'s state_dict so that the writer
+    never observes tensors that training is still mutating.
+    """
+    return {
+        name: tensor.detach().to("cpu", copy=True)
+        for name, tensor in model.fl_get_module().state_dict().items()
+    }
+
+
+@dataclass
+class ProvenanceRecord:
+    """A CPU snapshot of one client model (or of the round's global model) for
+    one training round, or only a fingerprint of the model if ``state_dict`` is
+    None. ``weight`` is the aggregation weight of a client model, if known.
+    """
+
+    client_id: str
+    global_epoch_num: int
+    global_round_num: int
+    state_dict: Optional[Dict[str, torch.Tensor]]
+    fingerprint: Optional[str] = None
+    weight: Optional[float] = None
+
+    @property
+    def is_global(self) -> bool:
+        return self.client_id == GLOBAL_MODEL_CLIENT_ID
+
+    @classmethod
+    def from_model(
+        cls,
+        model: IFLModel,
+        client_id: str,
+        global_epoch_num: int,
+        global_round_num: int,
+        weight: Optional[float] = None,
+    ) -> ProvenanceRecord:
+        """Snapshots ``model``, see ``snapshot_state_dict``."""
+        return cls(
+            client_id=client_id,
+            global_epoch_num=global_epoch_num,
+            global_round_num=global_round_num,
+            state_dict=snapshot_state_dict(model),
+            weight=weight,
+        )
+
+
+class AsyncProvenanceWriter:
+    """Writes ``ProvenanceRecord``s on a background thread.
+
+    Args:
+        write_batch: Persists a list of records. Always called from the writer
+            thread, with at most ``batch_size`` records.
+        max_queue_size: Number of pending records after which ``submit`` blocks.
+        batch_size: Maximum number of records handed to one ``write_batch`` call.
+    """
+
+    logger = Logger.get_logger(__name__)
+
+    _STOP = object()
+
+    def __init__(
+        self,
+        write_batch: Callable[[List[ProvenanceRecord]], None],
+        max_queue_size: int = 64,
+        batch_size: int = 16,
+    ):
+        assert max_queue_size > 0, "max_queue_size must be positive"
+        assert batch_size > 0, "batch_size must be positive"
+        self._write_batch = write_batch
+        self._batch_size = batch_size
+        self._queue = queue.Queue(maxsize=max_queue_size)
+        self._error: Optional[BaseException] = None
+        self._thread = threading.Thread(
+            target=self._run, name="flsim-provenance-writer", daemon=True
+        )
+        self._thread.start()
+
+    @property
+    def is_alive(self) -> bool:
+        return self._thread.is_alive()
+
+    def submit(self, record: ProvenanceRecord) -> None:
+        """Queues ``record`` for writing, blocking while the queue is full."""
+        self._raise_if_failed()
+        assert self.is_alive, "Cannot submit to a closed provenance writer"
+        self._queue.put(record)
+
+    def flush(self) -> None:
+        """Blocks until every record submitted so far has been written."""
+        self._queue.join()
+        self._raise_if_failed()
+
+    def close(self) -> None:
+        """Writes any pending records and stops the writer thread. Raises
+        (once) if a write failed.
+        """
+        if self.is_alive:
+            self._queue.put(self._STOP)
+            self._thread.join()
+        error, self._error = self._error, None
+        if error is not None:
+            raise RuntimeError("Provenance writer failed") from error
+
+    def _raise_if_failed(self) -> None:
+        # the error is kept until `close`: records queued after a failed write
+        # are not written, so every later submit/flush must fail as well
+        if self._error is not None:
+            raise RuntimeError("Provenance writer failed") from self._error
+
+    def _run(self) -> None:
+        stop = False
+        while not stop:
+            batch = [self._queue.get()]
+            # Drain whatever else is already queued, up to one batch
+            while len(batch) < self._batch_size:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            records = [r for r in batch if r is not self._STOP]
+            stop = len(records) != len(batch)
+            try:
+                if records and self._error is None:
+                    self._write_batch(records)
+            except Exception as e:
+                # Keep draining the queue so producers never deadlock; the error
+                # is re-raised on the training thread at the next submit/flush.
+                self.logger.error(f"Failed to write provenance batch: {e}")
+                self._error = e
+            finally:
+                for _ in batch:
+                    self._queue.task_done()
@@ -0,0 +1,95 @@
+#!/usr/bin/env python3
+# Copyright (c) Meta Platforms, Inc. and affiliates.
+# All rights reserved.
+#
+# This source code is licensed under the BSD-style license found in the
+# LICENSE file in the root directory of this source tree.
+
+"""Benchmark stats of the example runs, kept in a table next to the models of
+a SQL provenance store, so that they are written with the store's connection
+settings.
+"""
+
+from __future__ import annotations
+
+import csv
+import os
+from typing import List, Tuple
+
+from flsim.provenance.provenance_store import ProvenanceStore
+from flsim.provenance.sql_provenance_store import SQLProvenanceStore
+
+BENCHMARK_COLUMNS = (
+    "global_num_epoch",
+    "client_num_epoch",
+    "num_users",
+    "users_per_round",
+    "tracking_data_provenance",
+    "training_time",
+    "model_storage_size",
+)
+
+
+def _sql_store(store: ProvenanceStore) -> SQLProvenanceStore:
+    if not isinstance(store, SQLProvenanceStore):
+        raise TypeError(
+            "benchmark stats need a SQL provenance store, "
+            f"not {type(store).__name__}"
+        )
+    return store
+
+
+def insert_benchmark_stats(
+    store: ProvenanceStore,
+    table: str,
+    global_num_epoch: int,
+    client_num_epoch: int,
+    num_users: int,
+    users_per_round: int,
+    tracking_data_provenance: bool,
+    training_time: float,
+    model_storage_size: int,
+) -> None:
+    """Appends the stats of one run to ``table``, which is created if needed."""
+    store = _sql_store(store)
+    q = store.QUOTE
+    store._execute(
+        f"CREATE TABLE IF NOT EXISTS {q}{table}{q} ("
+        "global_num_epoch INTEGER, client_num_epoch INTEGER, num_users INTEGER, "
+        "users_per_round INTEGER, tracking_data_provenance BOOLEAN, "
+        "training_time REAL, model_storage_size BIGINT)"
+    )
+    store._execute(
+        f"INSERT INTO {q}{table}{q}({', '.join(BENCHMARK_COLUMNS)}) "
+        f"VALUES({store._params(len(BENCHMARK_COLUMNS))})",
+        (
+            global_num_epoch,
+            client_num_epoch,
+            num_users,
+            users_per_round,
+            tracking_data_provenance,
+            training_time,
+            model_storage_size,
+        ),
+    )
+
+
+def get_benchmark_stats(store: ProvenanceStore, table: str) -> List[Tuple]:
+    """The stats of all the runs in ``table``, one tuple of
+    ``BENCHMARK_COLUMNS`` per run.
+    """
+    store = _sql_store(store)
+    q = store.QUOTE
+    return store._fetchall(f"SELECT {', '.join(BENCHMARK_COLUMNS)} FROM {q}{table}{q}")
+
+
+def write_benchmark_stats_csv(
+    store: ProvenanceStore, table: str, csv_path: str
+) -> None:
+    """Writes the stats of all the runs in ``table`` to ``csv_path``."""
+    stats = get_benchmark_stats(store, table)
+    dir_path = os.path.dirname(csv_path)
+    if dir_path:
+        os.makedirs(dir_path, exist_ok=True)
+    with open(csv_path, "w", newline="") as csv_file:
+        csv.writer(csv_file).writerows(stats)
@@ -0,0 +1,409 @@
+#!/usr/bin/env python3
+# Copyright (c) Meta Platforms, Inc. and affiliates.
+# All rights reserved.
+#
+# This source code is licensed under the BSD-style license found in the
+# LICENSE file in the root directory of this source tree.
+
+"""
+Capture policies decide which models of a round are handed to the provenance
+writer, trading audit fidelity against the time training spends taking
+snapshots. They are selected through ``SyncTrainerConfig.provenance_capture``:
+
+    - ``AllClientsCapturePolicy``: every client of every round (the default).
+    - ``EveryNthRoundCapturePolicy``: every client of one round out of N.
+    - ``RandomFractionCapturePolicy``: a random fraction of each round's clients.
+    - ``UpdateNormOutlierCapturePolicy``: clients whose update norm is an
+      outlier in their round's cohort.
+    - ``GlobalOnlyCapturePolicy``: the global model of every round, plus a
+      fingerprint of every client model and optionally a Merkle root per round.
+
+Every policy stores the global model of the rounds it captures, which client
+models are stored as deltas against. Client models reach policies as CPU
+snapshots that clients only take when ``captures_client_model`` is true for
+them, and that are dropped once they are handed to the writer, or as
+fingerprints of their updated model when ``fingerprints_client_models`` is
+true, hashed by the policy's ``fingerprint_hasher`` if it has one.
+"""
+
+from __future__ import annotations
+
+import abc
+import math
+import time
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+import torch
+from flsim.common.timeline import Timeline
+from flsim.interfaces.model import IFLModel
+from flsim.provenance.async_writer import (
+    AsyncProvenanceWriter,
+    GLOBAL_MODEL_CLIENT_ID,
+    ProvenanceRecord,
+)
+from flsim.provenance.fingerprint import (
+    FingerprintHasher,
+    MerkleTree,
+    MERKLE_ROOT_CLIENT_ID,
+)
+from flsim.utils.config_utils import fullclassname, init_self_cfg
+from omegaconf import MISSING
+
+
+# (client name, CPU snapshot of the client's updated model)
+ClientSnapshot = Tuple[str, Dict[str, torch.Tensor]]
+# (client name, fingerprint of the client's updated model)
+ClientFingerprint = Tuple[str, str]
+
+
+@dataclass
+class CaptureStats:
+    """What a capture policy cost the training thread."""
+
+    rounds_captured: int = 0
+    models_captured: int = 0
+    fingerprints_captured: int = 0
+    models_skipped: int = 0
+    # time the training thread spent selecting, snapshotting and hashing models;
+    # client snapshots and fingerprints are taken by the clients and not
+    # counted here
+    seconds: float = 0.0
+
+    def as_dict(self) -> Dict[str, Any]:
+        return dict(self.__dict__)
+
+
+class ProvenanceCapturePolicy(abc.ABC):
+    def __init__(self, **kwargs):
+        init_self_cfg(
+            self,
+            component_class=__class__,  # pyre-fixme[10]: Name `__class__` is used but not defined.
+            config_class=ProvenanceCapturePolicyConfig,
+            **kwargs,
+        )
+        self.stats = CaptureStats()
+        # snapshot of the global model the current round started from, None if
+        # the round is not captured
+        self._global_record: Optional[ProvenanceRecord] = None
+        # names of the clients of the current round, see `start_round`
+        self._round_client_ids: List[str] = []
+        # hashes client fingerprints off the training thread, if set
+        self.fingerprint_hasher: Optional[FingerprintHasher] = None
+
+    @classmethod
+    def _set_defaults_in_cfg(cls, cfg):
+        pass
+
+    def captures_round(self, timeline: Timeline) -> bool:
+        return True
+
+    def captures_client_models(self) -> bool:
+        """Whether clients of the current round need to snapshot their models."""
+        # client models are only stored in rounds whose global model was stored
+        return self._global_record is not None
+
+    def start_round(self, client_ids: List[str]) -> None:
+        """Called with the names of the clients of a round before they train."""
+        self._round_client_ids = list(client_ids)
+
+    def captures_client_model(self, client_id: str) -> bool:
+        """Whether a client of the current round needs to snapshot its model."""
+        return self.captures_client_models()
+
+    def fingerprints_client_models(self) -> bool:
+        """Whether clients of the current round need to fingerprint their models."""
+        return False
+
+    @abc.abstractmethod
+    def select_clients(
+        self, client_models: List[ClientSnapshot]
+    ) -> List[ClientSnapshot]:
+        """Returns the client models of the round that are stored in full."""
+        pass
+
+    def capture_global_model(
+        self, writer: AsyncProvenanceWriter, model: IFLModel, timeline: Timeline
+    ) -> None:
+        """Called with the global model before the clients of a round train."""
+        start = time.perf_counter()
+        self._global_record = None
+        if self.captures_round(timeline):
+            self._global_record = ProvenanceRecord.from_model(
+                model, GLOBAL_MODEL_CLIENT_ID, timeline.epoch, timeline.round
+            )
+            writer.submit(self._global_record)
+            self.stats.rounds_captured += 1
+        self.stats.seconds += time.perf_counter() - start
+
+    def capture_client_models(
+        self,
+        writer: AsyncProvenanceWriter,
+        client_models: List[ClientSnapshot],
+        timeline: Timeline,
+        weights: Optional[Dict[str, float]] = None,
+    ) -> None:
+        """Called with the (name, snapshot) of each client once a round trained,
+        and the weight each client's update was aggregated with.
+        """
+        start = time.perf_counter()
+        weights = weights or {}
+        selected = []
+        if self.captures_client_models():
+            selected = self.select_clients(client_models)
+        for name, state_dict in selected:
+            writer.submit(
+                ProvenanceRecord(
+                    client_id=name,
+                    global_epoch_num=timeline.epoch,
+                    global_round_num=timeline.round,
+                    # already a snapshot, owned by the writer from now on
+                    state_dict=state_dict,
+                    weight=weights.get(name),
+                )
+            )
+        self.stats.models_captured += len(selected)
+        if self.captures_client_models():
+            # clients that were not asked for a snapshot are skipped too
+            num_clients = max(len(self._round_client_ids), len(client_models))
+            self.stats.models_skipped += num_clients - len(selected)
+        self.stats.seconds += time.perf_counter() - start
+
+    def capture_client_fingerprints(
+        self,
+        writer: AsyncProvenanceWriter,
+        client_fingerprints: List[ClientFingerprint],
+        timeline: Timeline,
+        weights: Optional[Dict[str, float]] = None,
+    ) -> None:
+        """Called with the (name, fingerprint) of each client once a round
+        trained, in rounds where ``fingerprints_client_models`` is true.
+        """
+        start = time.perf_counter()
+        weights = weights or {}
+        for name, fingerprint in client_fingerprints:
+            writer.submit(
+                ProvenanceRecord(
+                    client_id=name,
+                    global_epoch_num=timeline.epoch,
+                    global_round_num=timeline.round,
+                    state_dict=None,
+                    fingerprint=fingerprint,
+                    weight=weights.get(name),
+                )
+            )
+        self.stats.fingerprints_captured += len(client_fingerprints)
+        self.stats.seconds += time.perf_counter() - start
+
+    def close(self) -> None:
+        if self.fingerprint_hasher is not None:
+            self.fingerprint_hasher.close()
+
+
+class AllClientsCapturePolicy(ProvenanceCapturePolicy):
+    def __init__(self, **kwargs):
+        init_self_cfg(
+            self,
+            component_class=__class__,  # pyre-fixme[10]: Name `__class__` is used but not defined.
+            config_class=AllClientsCapturePolicyConfig,
+            **kwargs,
+        )
+        super().__init__(**kwargs)
+
+    def select_clients(
+        self, client_models: List[ClientSnapshot]
+    ) -> List[ClientSnapshot]:
+        return client_models
+
+
+class EveryNthRoundCapturePolicy(AllClientsCapturePolicy):
+    def __init__(self, **kwargs):
+        init_self_cfg(
+            self,
+            component_class=__class__,  # pyre-fixme[10]: Name `__class__` is used but not defined.
+            config_class=EveryNthRoundCapturePolicyConfig,
+            **kwargs,
+        )
+        super().__init__(**kwargs)
+        assert self.cfg.round_interval >= 1, "round_interval must be at least 1"
+
+    def captures_round(self, timeline: Timeline) -> bool:
+        # pyre-fixme[16]: `EveryNthRoundCapturePolicy` has no attribute `cfg`.
+        return timeline.global_round_num() % self.cfg.round_interval == 0
+
+
+class RandomFractionCapturePolicy(ProvenanceCapturePolicy):
+    """Stores a random fraction of each round's clients, drawn in ``start_round``
+    before they train so that the other clients do not snapshot their models.
+    """
+
+    def __init__(self, **kwargs):
+        init_self_cfg(
+            self,
+            component_class=__class__,  # pyre-fixme[10]: Name `__class__` is used but not defined.
+            config_class=RandomFractionCapturePolicyConfig,
+            **kwargs,
+        )
+        super().__init__(**kwargs)
+        assert 0 < self.cfg.fraction <= 1, "fraction must be in (0, 1]"
+        self.rng = torch.Generator()
+        if self.cfg.seed is not None:
+            self.rng = self.rng.manual_seed(self.cfg.seed)
+        else:
+            self.rng.seed()
+        self._selected_ids: Set[str] = set()
+
+    def start_round(self, client_ids: List[str]) -> None:
+        super().start_round(client_ids)
+        # pyre-fixme[16]: `RandomFractionCapturePolicy` has no attribute `cfg`.
+        num_selected = math.ceil(self.cfg.fraction * len(client_ids))
+        indices = torch.randperm(len(client_ids), generator=self.rng)
+        self._selected_ids = {client_ids[i] for i in indices[:num_selected].tolist()}
+
+    def captures_client_model(self, client_id: str) -> bool:
+        return (
+            super().captures_client_model(client_id)
+            and client_id in self._selected_ids
+        )
+
+    def select_clients(
+        self, client_models: List[ClientSnapshot]
+    ) -> List[ClientSnapshot]:
+        return [(n, sd) for n, sd in client_models if n in self._selected_ids]
+
+
+class UpdateNormOutlierCapturePolicy(ProvenanceCapturePolicy):
+    """Stores clients whose update norm ||client model - global model|| is more
+    than ``z_threshold`` standard deviations away from the mean of their round.
+    """
+
+    def __init__(self, **kwargs):
+        init_self_cfg(
+            self,
+            component_class=__class__,  # pyre-fixme[10]: Name `__class__` is used but not defined.
+            config_class=UpdateNormOutlierCapturePolicyConfig,
+            **kwargs,
+        )
+        super().__init__(**kwargs)
+
+    def update_norm(self, state_dict: Dict[str, torch.Tensor]) -> torch.Tensor:
+        base = self._global_record.state_dict
+        squares = [
+            (tensor - base[name]).float().pow(2).sum()
+            for name, tensor in state_dict.items()
+            if tensor.is_floating_point()
+        ]
+        return torch.stack(squares).sum().sqrt() if squares else torch.zeros(())
+
+    def select_clients(
+        self, client_models: List[ClientSnapshot]
+    ) -> List[ClientSnapshot]:
+        if len(client_models) < 2:
+            return []
+        norms = torch.stack([self.update_norm(sd) for _, sd in client_models])
+        deviation = (norms - norms.mean()).abs()
+        # pyre-fixme[16]: `UpdateNormOutlierCapturePolicy` has no attribute `cfg`.
+        is_outlier = deviation > self.cfg.z_threshold * norms.std(unbiased=False)
+        return [client_models[i] for i in torch.nonzero(is_outlier).flatten().tolist()]
+
+
+class GlobalOnlyCapturePolicy(ProvenanceCapturePolicy):
+    """Stores the global model of every round in full, and client models only as
+    fingerprints that can later prove which model a client sent.
+
+    Clients hand a copy of their updated model to ``fingerprint_hasher``, whose
+    ``hash_threads`` threads hash it while training goes on. With
+    ``merkle_tree``, the root of a Merkle tree over the fingerprints is stored
+    too, as the fingerprint of ``MERKLE_ROOT_CLIENT_ID``.
+    """
+
+    def __init__(self, **kwargs):
+        init_self_cfg(
+            self,
+            component_class=__class__,  # pyre-fixme[10]: Name `__class__` is used but not defined.
+            config_class=GlobalOnlyCapturePolicyConfig,
+            **kwargs,
+        )
+        super().__init__(**kwargs)
+        # tree of the last captured round, if `merkle_tree` is set
+        self.merkle_tree: Optional[MerkleTree] = None
+        # pyre-fixme[16]: `GlobalOnlyCapturePolicy` has no attribute `cfg`.
+        self.fingerprint_hasher = FingerprintHasher(self.cfg.hash_threads)
+
+    def captures_client_models(self) -> bool:
+        return False
+
+    def fingerprints_client_models(self) -> bool:
+        # fingerprints are taken in every round
+        return True
+
+    def select_clients(
+        self, client_models: List[ClientSnapshot]
+    ) -> List[ClientSnapshot]:
+        return []
+
+    def capture_client_fingerprints(
+        self,
+        writer: AsyncProvenanceWriter,
+        client_fingerprints: List[ClientFingerprint],
+        timeline: Timeline,
+        weights: Optional[Dict[str, float]] = None,
+    ) -> None:
+        super().capture_client_fingerprints(
+            writer, client_fingerprints, timeline, weights
+        )
+        # pyre-fixme[16]: `GlobalOnlyCapturePolicy` has no attribute `cfg`.
+        if self.cfg.merkle_tree and client_fingerprints:
+            start = time.perf_counter()
+            self.merkle_tree = MerkleTree(dict(client_fingerprints))
+            writer.submit(
+                ProvenanceRecord(
+                    client_id=MERKLE_ROOT_CLIENT_ID,
+                    global_epoch_num=timeline.epoch,
+                    global_round_num=timeline.round,
+                    state_dict=None,
+                    fingerprint=self.merkle_tree.root,
+                )
+            )
+            self.stats.seconds += time.perf_counter() - start
+
+
+@dataclass
+class ProvenanceCapturePolicyConfig:
+    _target_: str = MISSING
+    _recursive_: bool = False
+
+
+@dataclass
+class AllClientsCapturePolicyConfig(ProvenanceCapturePolicyConfig):
+    _target_: str = fullclassname(AllClientsCapturePolicy)
+
+
+@dataclass
+class EveryNthRoundCapturePolicyConfig(ProvenanceCapturePolicyConfig):
+    _target_: str = fullclassname(EveryNthRoundCapturePolicy)
+    # rounds are counted globally, across epochs
+    round_interval: int = 10
+
+
+@dataclass
+class RandomFractionCapturePolicyConfig(ProvenanceCapturePolicyConfig):
+    _target_: str = fullclassname(RandomFractionCapturePolicy)
+    # fraction of each round's clients that are stored, rounded up
+    fraction: float = 0.1
+    seed: Optional[int] = None
+
+
+@dataclass
+class UpdateNormOutlierCapturePolicyConfig(ProvenanceCapturePolicyConfig):
+    _target_: str = fullclassname(UpdateNormOutlierCapturePolicy)
+    z_threshold: float = 2.0
+
+
+@dataclass
+class GlobalOnlyCapturePolicyConfig(ProvenanceCapturePolicyConfig):
+    _target_: str = fullclassname(GlobalOnlyCapturePolicy)
+    # also store the root of a Merkle tree over each round's fingerprints
+    merkle_tree: bool = False
+    # threads hashing client models in parallel with training
+    hash_threads: int = 4
@@ -0,0 +1,139 @@
+#!/usr/bin/env python3
+# Copyright (c) Meta Platforms, Inc. and affiliates.
+# All rights reserved.
+#
+# This source code is licensed under the BSD-style license found in the
+# LICENSE file in the root directory of this source tree.
+
+"""
+Compression codecs for provenance blobs.
+
+Every compressed blob starts with a one byte codec id, so blobs written with
+different codecs can live in the same store and are always decompressed with
+the codec they were written with. Supported codecs, by config name:
+
+    - ``none``: blobs are stored as is.
+    - ``zlib``: DEFLATE at its fastest level, from the standard library.
+    - ``lz4``: LZ4 frames, if the ``lz4`` package is installed.
+    - ``shuffle``: byte-shuffles the blob by element size before compressing
+      it with ``lz4`` if installed, else ``zlib``. Grouping the sign/exponent
+      bytes of floats together makes them compress much better.
+"""
+
+from __future__ import annotations
+
+import importlib.util
+import zlib
+from dataclasses import dataclass
+
+import numpy as np
+
+
+NONE, ZLIB, LZ4, SHUFFLE_ZLIB, SHUFFLE_LZ4 = range(5)
+ZLIB_LEVEL = 1
+
+
+def lz4_available() -> bool:
+    return importlib.util.find_spec("lz4") is not None
+
+
+def codec_id(name: str) -> int:
+    """Id written in front of blobs compressed with the codec called ``name``."""
+    if name == "none":
+        return NONE
+    if name == "zlib":
+        return ZLIB
+    if name == "lz4":
+        if not lz4_available():
+            raise ValueError("The lz4 codec requires the lz4 package")
+        return LZ4
+    if name == "shuffle":
+        return SHUFFLE_LZ4 if lz4_available() else SHUFFLE_ZLIB
+    raise ValueError(f"Unknown provenance compression codec {name}")
+
+
+def _shuffle(data: bytes, itemsize: int) -> bytes:
+    return np.frombuffer(data, dtype=np.uint8).reshape(-1, itemsize).T.tobytes()
+
+
+def _unshuffle(data: bytes, itemsize: int) -> bytes:
+    return np.frombuffer(data, dtype=np.uint8).reshape(itemsize, -1).T.tobytes()
+
+
+def compress(data: bytes, codec: int, itemsize: int = 1) -> bytes:
+    """Compresses ``data`` with ``codec``.
+
+    Args:
+        data: Raw bytes of a tensor, or a delta of two tensors.
+        codec: As returned by ``codec_id``.
+        itemsize: Element size of the tensor, used by the shuffle codecs.
+    """
+    if codec in (SHUFFLE_ZLIB, SHUFFLE_LZ4):
+        if itemsize <= 1 or len(data) % itemsize:
+            # nothing to shuffle
+            codec = ZLIB if codec == SHUFFLE_ZLIB else LZ4
+        else:
+            data = bytes([itemsize]) + _shuffle(data, itemsize)
+    if codec == NONE:
+        payload = data
+    elif codec in (ZLIB, SHUFFLE_ZLIB):
+        payload = zlib.compress(data, ZLIB_LEVEL)
+    elif codec in (LZ4, SHUFFLE_LZ4):
+        import lz4.frame
+
+        payload = lz4.frame.compress(data)
+    else:
+        raise ValueError(f"Unknown provenance compression codec id {codec}")
+    return bytes([codec]) + payload
+
+
+def decompress(blob: bytes) -> bytes:
+    """Inverse of ``compress``."""
+    codec, payload = blob[0], blob[1:]
+    if codec == NONE:
+        return payload
+    if codec in (ZLIB, SHUFFLE_ZLIB):
+        data = zlib.decompress(payload)
+    elif codec in (LZ4, SHUFFLE_LZ4):
+        import lz4.frame
+
+        data = lz4.frame.decompress(payload)
+    else:
+        raise ValueError(f"Unknown provenance compression codec id {codec}")
+    if codec in (SHUFFLE_ZLIB, SHUFFLE_LZ4):
+        data = _unshuffle(data[1:], data[0])
+    return data
+
+
+@dataclass
+class CompressionStats:
+    """What the provenance writer did with the models it was given."""
+
+    # bytes of all the tensors of all the models written
+    model_bytes: int = 0
+    # bytes of the new blobs (after dedupe and delta encoding) before compression
+    blob_bytes: int = 0
+    # bytes of the new blobs as stored
+    stored_bytes: int = 0
+    # time spent encoding and compressing models on the writer thread
+    seconds: float = 0.0
+
+    @property
+    def compression_ratio(self) -> float:
+        return self.blob_bytes / self.stored_bytes if self.stored_bytes else 1.0
+
+    @property
+    def storage_ratio(self) -> float:
+        return self.model_bytes / self.stored_bytes if self.stored_bytes else 1.0
+
+    @property
+    def throughput_mb_s(self) -> float:
+        return self.model_bytes / 1e6 / self.seconds if self.seconds else 0.0
+
+    def as_dict(self):
+        return {
+            **self.__dict__,
+            "compression_ratio": self.compression_ratio,
+            "storage_ratio": self.storage_ratio,
+            "throughput_mb_s": self.throughput_mb_s,
+        }
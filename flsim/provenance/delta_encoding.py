@@ -0,0 +1,147 @@
+#!/usr/bin/env python3
+# Copyright (c) Meta Platforms, Inc. and affiliates.
+# All rights reserved.
+#
+# This source code is licensed under the BSD-style license found in the
+# LICENSE file in the root directory of this source tree.
+
+"""
+Delta encoding of client models against the round's global model.
+
+A model is stored as a manifest (one entry per state_dict tensor) plus a set of
+content-addressed blobs, keyed by the sha256 of their bytes:
+
+    - ``raw``: the blob is the tensor's raw bytes.
+    - ``xor``: the blob is the XOR of the tensor's bytes with the bytes of the
+      ``base`` tensor. XOR (rather than subtraction) keeps the round trip
+      bit-exact, and bits that training did not touch become zeros which
+      compress to almost nothing.
+
+Hashes are computed before blobs are compressed with the store's codec (see
+``compression``), so they do not depend on the codec.
+
+A tensor that is identical to its base (or to any tensor stored before) is
+stored as a ``raw`` entry pointing at the existing blob, so it costs one
+manifest entry and no blob.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import json
+from dataclasses import dataclass
+from typing import Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+import torch
+from flsim.provenance.compression import compress, decompress, ZLIB
+from flsim.utils.tensor_serialization import tensor_from_bytes, tensor_to_bytes
+
+
+@dataclass
+class TensorEntry:
+    name: str
+    dtype: str
+    shape: List[int]
+    encoding: str
+    hash: str
+    base: Optional[str] = None
+
+
+@dataclass
+class EncodedModel:
+    """A model's manifest plus the compressed blobs it references, keyed by
+    hash, and the size of each blob before compression.
+    """
+
+    entries: List[TensorEntry]
+    blobs: Dict[str, bytes]
+    raw_sizes: Dict[str, int]
+
+    def manifest(self) -> bytes:
+        return json.dumps([e.__dict__ for e in self.entries]).encode("utf-8")
+
+
+def content_hash(blob: bytes) -> str:
+    return hashlib.sha256(blob).hexdigest()
+
+
+def _xor(a: bytes, b: bytes) -> bytes:
+    return np.bitwise_xor(
+        np.frombuffer(a, dtype=np.uint8), np.frombuffer(b, dtype=np.uint8)
+    ).tobytes()
+
+
+def encode_state_dict(
+    state_dict: Dict[str, torch.Tensor],
+    base: Optional[Dict[str, Tuple[TensorEntry, bytes]]] = None,
+    codec: int = ZLIB,
+) -> Tuple[EncodedModel, Dict[str, Tuple[TensorEntry, bytes]]]:
+    """Encodes ``state_dict``, as deltas against ``base`` where possible.
+
+    Args:
+        state_dict: Model to encode.
+        base: Raw entries and bytes of the round's global model, as returned for
+            that model by a previous call. If None, every tensor is stored raw.
+        codec: Compression codec of the blobs, see ``compression.codec_id``.
+
+    Returns:
+        The encoded model, and the raw entries and bytes of ``state_dict``
+        which can be used as ``base`` for later calls.
+    """
+    entries, blobs, raw_sizes, raw = [], {}, {}, {}
+    for name, tensor in state_dict.items():
+        data, itemsize = tensor_to_bytes(tensor), tensor.element_size()
+        dtype, shape = str(tensor.dtype), list(tensor.shape)
+        raw_entry = TensorEntry(name, dtype, shape, "raw", content_hash(data))
+        raw[name] = (raw_entry, data)
+
+        base_entry, base_data = base.get(name, (None, None)) if base else (None, None)
+        if base_entry is not None and base_entry.hash == raw_entry.hash:
+            # unchanged, the blob was stored together with the base
+            entries.append(raw_entry)
+            continue
+        if (
+            base_entry is not None
+            and base_entry.dtype == dtype
+            and base_entry.shape == shape
+        ):
+            delta = _xor(data, base_data)
+            compressed = compress(delta, codec, itemsize)
+            # if the tensor changed everywhere, a delta would only add overhead
+            if len(compressed) < len(data):
+                delta_hash = content_hash(delta)
+                entries.append(
+                    TensorEntry(
+                        name, dtype, shape, "xor", delta_hash, base=base_entry.hash
+                    )
+                )
+                blobs[delta_hash] = compressed
+                raw_sizes[delta_hash] = len(delta)
+                continue
+        entries.append(raw_entry)
+        blobs[raw_entry.hash] = compress(data, codec, itemsize)
+        raw_sizes[raw_entry.hash] = len(data)
+    return EncodedModel(entries, blobs, raw_sizes), raw
+
+
+def decode_state_dict(
+    manifest: bytes, get_blobs: Callable[[List[str]], Dict[str, bytes]]
+) -> Dict[str, torch.Tensor]:
+    """Rebuilds the exact state_dict described by ``manifest``.
+
+    Args:
+        manifest: As returned by ``EncodedModel.manifest``.
+        get_blobs: Fetches compressed blobs by hash from the store.
+    """
+    entries = [TensorEntry(**e) for e in json.loads(manifest)]
+    hashes = {e.hash for e in entries} | {e.base for e in entries if e.base}
+    blobs = {h: decompress(blob) for h, blob in get_blobs(sorted(hashes)).items()}
+    state_dict = {}
+    for e in entries:
+        data = blobs[e.hash]
+        if e.encoding == "xor":
+            data = _xor(data, blobs[e.base])
+        # copied into a writable buffer, callers may modify the tensors in place
+        state_dict[e.name] = tensor_from_bytes(bytearray(data), e.dtype, e.shape)
+    return state_dict
@@ -0,0 +1,252 @@
+#!/usr/bin/env python3
+# Copyright (c) Meta Platforms, Inc. and affiliates.
+# All rights reserved.
+#
+# This source code is licensed under the BSD-style license found in the
+# LICENSE file in the root directory of this source tree.
+
+from __future__ import annotations
+
+import glob
+import json
+import os
+import struct
+import threading
+from dataclasses import dataclass
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+from flsim.provenance.provenance_store import (
+    ProvenanceStore,
+    ProvenanceStoreConfig,
+    RoundKey,
+    StoredModel,
+)
+from flsim.utils.config_utils import fullclassname, init_self_cfg
+
+
+class LocalFileProvenanceStore(ProvenanceStore):
+    """Stores models in append-only segment files on the local file system.
+
+    Each entry is written as::
+
+        <u32 header length> <json header> <payload>
+
+    where the header's ``kind`` is either ``blob`` (payload is a tensor blob,
+    keyed by ``hash``) or ``model`` (payload is a model manifest, with its
+    client id, epoch, round and weight). Once a segment grows past ``segment_size_mb`` a
+    new one is started, so old segments are immutable and can be copied or
+    archived while training runs. Reads go through an in-memory index of entry
+    offsets that is built from the segments on first use; models are numbered
+    in the order they were appended, which serves as their ``itr_id``.
+    """
+
+    HEADER_LENGTH = struct.Struct("<I")
+
+    def __init__(self, **kwargs):
+        init_self_cfg(
+            self,
+            component_class=__class__,  # pyre-fixme[10]: Name `__class__` is used but not defined.
+            config_class=LocalFileProvenanceStoreConfig,
+            **kwargs,
+        )
+        super().__init__(**kwargs)
+        self._segment = None
+        self._segment_index = 0
+        # Key: blob hash, Value: (segment path, payload offset, payload size)
+        self._index: Optional[Dict[str, Tuple[str, int, int]]] = None
+        # (model, location of its manifest) in append order, built with `_index`
+        self._models: List[Tuple[StoredModel, Tuple[str, int, int]]] = []
+        # reads may come from the training thread while the writer appends
+        self._lock = threading.RLock()
+
+    @classmethod
+    def _set_defaults_in_cfg(cls, cfg):
+        pass
+
+    def segment_paths(self) -> List[str]:
+        """Returns the paths of all segments of this store, oldest first."""
+        # pyre-fixme[16]: `LocalFileProvenanceStore` has no attribute `cfg`.
+        pattern = os.path.join(self.cfg.directory, f"{self.cfg.table}-*.seg")
+        return sorted(glob.glob(pattern))
+
+    def read_entries(self, path: str) -> Iterator[Tuple[Dict[str, Any], int]]:
+        """Yields (header, payload offset) for every entry of a segment."""
+        with open(path, "rb") as segment:
+            while True:
+                prefix = segment.read(self.HEADER_LENGTH.size)
+                if len(prefix) < self.HEADER_LENGTH.size:
+                    # end of segment, or a partial entry left by a crash
+                    return
+                (header_length,) = self.HEADER_LENGTH.unpack(prefix)
+                header = json.loads(segment.read(header_length))
+                offset = segment.tell()
+                yield header, offset
+                segment.seek(offset + header["size"])
+
+    def _index_entry(
+        self, header: Dict[str, Any], location: Tuple[str, int, int]
+    ) -> None:
+        if header["kind"] == "blob":
+            self._index[header["hash"]] = location
+            return
+        model = StoredModel(
+            itr_id=len(self._models),
+            client_id=header["client_id"],
+            global_epoch_num=header["global_epoch_num"],
+            global_round_num=header["global_round_num"],
+            weight=header.get("weight"),
+        )
+        self._models.append((model, location))
+
+    def _load_index(self) -> Dict[str, Tuple[str, int, int]]:
+        if self._index is None:
+            self._index, self._models = {}, []
+            for path in self.segment_paths():
+                for header, offset in self.read_entries(path):
+                    self._index_entry(header, (path, offset, header["size"]))
+        return self._index
+
+    def _read_payload(self, location: Tuple[str, int, int]) -> bytes:
+        path, offset, size = location
+        # the entry may still be sitting in the write buffer
+        if self._segment is not None and self._segment.name == path:
+            self._segment.flush()
+        with open(path, "rb") as segment:
+            segment.seek(offset)
+            return segment.read(size)
+
+    def _segment_path(self, index: int) -> str:
+        return os.path.join(self.cfg.directory, f"{self.cfg.table}-{index:06d}.seg")
+
+    def _connect(self) -> None:
+        os.makedirs(self.cfg.directory, exist_ok=True)
+
+    def _create_schema(self) -> None:
+        # never append to a segment written by a previous run
+        self._segment_index = len(self.segment_paths())
+        self._load_index()
+
+    def _current_segment(self):
+        max_bytes = self.cfg.segment_size_mb * 1024 * 1024
+        if self._segment is not None and self._segment.tell() >= max_bytes:
+            self._close_segment()
+            self._segment_index += 1
+        if self._segment is None:
+            self._segment = open(self._segment_path(self._segment_index), "ab")
+        return self._segment
+
+    def _close_segment(self) -> None:
+        if self._segment is not None:
+            self._segment.close()
+            self._segment = None
+
+    def _append(self, entries: List[Tuple[Dict[str, Any], bytes]]) -> None:
+        with self._lock:
+            segment = self._current_segment()
+            self._load_index()
+            for header, payload in entries:
+                header["size"] = len(payload)
+                encoded_header = json.dumps(header).encode("utf-8")
+                segment.write(self.HEADER_LENGTH.pack(len(encoded_header)))
+                segment.write(encoded_header)
+                self._index_entry(header, (segment.name, segment.tell(), len(payload)))
+                segment.write(payload)
+            segment.flush()
+            if self.cfg.fsync:
+                os.fsync(segment.fileno())
+
+    def _drop(self) -> None:
+        with self._lock:
+            self._close_segment()
+            for path in self.segment_paths():
+                os.remove(path)
+            self._segment_index = 0
+            self._index, self._models = None, []
+
+    def _insert_blobs(self, blobs: List[Tuple[str, bytes]]) -> None:
+        index = self._load_index()
+        self._append(
+            [
+                ({"kind": "blob", "hash": blob_hash}, blob)
+                for blob_hash, blob in blobs
+                if blob_hash not in index
+            ]
+        )
+
+    def _insert_models(
+        self, rows: List[Tuple[bytes, str, int, int, Optional[float]]]
+    ) -> None:
+        self._append(
+            [
+                (
+                    {
+                        "kind": "model",
+                        "client_id": client_id,
+                        "global_epoch_num": epoch,
+                        "global_round_num": round,
+                        "weight": weight,
+                    },
+                    manifest,
+                )
+                for manifest, client_id, epoch, round, weight in rows
+            ]
+        )
+
+    def _query_models(
+        self,
+        client_id: Optional[str] = None,
+        first: Optional[RoundKey] = None,
+        last: Optional[RoundKey] = None,
+        after: Optional[Tuple[int, int, int]] = None,
+        limit: Optional[int] = None,
+        with_manifest: bool = True,
+    ) -> List[StoredModel]:
+        def key(model: StoredModel) -> Tuple[int, int, int]:
+            return (model.global_epoch_num, model.global_round_num, model.itr_id)
+
+        with self._lock:
+            self._load_index()
+            matches = sorted(
+                (
+                    (model, location)
+                    for model, location in self._models
+                    if (client_id is None or model.client_id == client_id)
+                    and (first is None or key(model)[:2] >= tuple(first))
+                    and (last is None or key(model)[:2] <= tuple(last))
+                    and (after is None or key(model) > tuple(after))
+                ),
+                key=lambda match: key(match[0]),
+            )[:limit]
+            return [
+                StoredModel(
+                    **{
+                        **model.__dict__,
+                        "manifest": self._read_payload(location)
+                        if with_manifest
+                        else None,
+                    }
+                )
+                for model, location in matches
+            ]
+
+    def _fetch_blobs(self, hashes: List[str]) -> Dict[str, bytes]:
+        with self._lock:
+            index = self._load_index()
+            return {h: self._read_payload(index[h]) for h in hashes if h in index}
+
+    def get_size(self) -> int:
+        return sum(os.path.getsize(path) for path in self.segment_paths())
+
+    def close(self) -> None:
+        self._close_segment()
+
+
+@dataclass
+class LocalFileProvenanceStoreConfig(ProvenanceStoreConfig):
+    _target_: str = fullclassname(LocalFileProvenanceStore)
+    directory: str = "model_databases/flsim_provenance"
+    # start a new segment once the current one is larger than this
+    segment_size_mb: int = 256
+    # fsync after every batch; off by default since a crash only loses the tail
+    # of the last segment
+    fsync: bool = False
@@ -0,0 +1,151 @@
+#!/usr/bin/env python3
+# Copyright (c) Meta Platforms, Inc. and affiliates.
+# All rights reserved.
+#
+# This source code is licensed under the BSD-style license found in the
+# LICENSE file in the root directory of this source tree.
+
+"""
+Cryptographic fingerprints of models, and Merkle trees over the fingerprints of
+a round.
+
+The fingerprint of a state_dict is the sha256 of, in this order:
+
+    1. ``FINGERPRINT_PREFIX``.
+    2. For each tensor, in ascending order of name:
+       the name, dtype (e.g. ``torch.float32``) and comma-separated shape, each
+       utf-8 encoded and followed by a zero byte, the number of data bytes as a
+       little-endian u64, then the tensor's data bytes in row-major order.
+
+Data bytes are hashed straight from tensor memory (after a copy to the CPU for
+tensors on other devices), and hashlib releases the GIL while hashing, so
+fingerprints of several models can be computed in parallel threads, e.g. by a
+``FingerprintHasher``.
+
+A round's Merkle tree has one leaf per client, sorted by client id. Leaves are
+``sha256(0x00 || client_id || 0x00 || fingerprint)`` and inner nodes
+``sha256(0x01 || left || right)``; an unpaired node is promoted to the next
+level unchanged. The root therefore commits to every client's identity and
+model, and a client's model can be proven to be part of a round with a proof
+of log2(clients) hashes.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import struct
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Dict, List, Optional, Tuple
+
+import torch
+
+
+FINGERPRINT_PREFIX = b"flsim-fingerprint-v1\x00"
+# `client_id` of the records holding the Merkle root of a round
+MERKLE_ROOT_CLIENT_ID = "merkle_root"
+_NBYTES = struct.Struct("<Q")
+
+
+def _data(tensor: torch.Tensor) -> memoryview:
+    tensor = tensor.detach()
+    if tensor.device.type != "cpu":
+        tensor = tensor.cpu()
+    return memoryview(tensor.contiguous().reshape(-1).view(torch.uint8).numpy())
+
+
+def fingerprint_state_dict(state_dict: Dict[str, torch.Tensor]) -> str:
+    """Hex sha256 of ``state_dict``, see the module docstring for the layout."""
+    digest = hashlib.sha256(FINGERPRINT_PREFIX)
+    for name in sorted(state_dict):
+        tensor = state_dict[name]
+        shape = ",".join(str(d) for d in tensor.shape)
+        digest.update(f"{name}\x00{tensor.dtype}\x00{shape}\x00".encode("utf-8"))
+        data = _data(tensor)
+        digest.update(_NBYTES.pack(data.nbytes))
+        digest.update(data)
+    return digest.hexdigest()
+
+
+class FingerprintHasher:
+    """Computes ``fingerprint_state_dict`` in ``num_threads`` background threads,
+    in parallel with each other and with training.
+
+    State dicts are hashed as they are when the hash runs, so callers hand over
+    tensors that nothing modifies anymore, e.g. a copy of a model that is reused.
+    """
+
+    def __init__(self, num_threads: int = 4):
+        assert num_threads >= 1, "num_threads must be at least 1"
+        self.num_threads = num_threads
+        self._pool: Optional[ThreadPoolExecutor] = None
+
+    def submit(self, state_dict: Dict[str, torch.Tensor]) -> Future:
+        """Future of the fingerprint of ``state_dict``."""
+        if self._pool is None:
+            self._pool = ThreadPoolExecutor(
+                self.num_threads, thread_name_prefix="flsim-fingerprint"
+            )
+        return self._pool.submit(fingerprint_state_dict, state_dict)
+
+    def close(self) -> None:
+        """Waits for the pending hashes and stops the threads."""
+        if self._pool is not None:
+            self._pool.shutdown()
+            self._pool = None
+
+    def __getstate__(self) -> Dict[str, Any]:
+        # objects holding a hasher stay picklable
+        return {**self.__dict__, "_pool": None}
+
+
+def _leaf(client_id: str, fingerprint: str) -> bytes:
+    return hashlib.sha256(
+        b"\x00" + client_id.encode("utf-8") + b"\x00" + bytes.fromhex(fingerprint)
+    ).digest()
+
+
+def _node(left: bytes, right: bytes) -> bytes:
+    return hashlib.sha256(b"\x01" + left + right).digest()
+
+
+class MerkleTree:
+    """Merkle tree over the (client_id, fingerprint) pairs of a round."""
+
+    def __init__(self, fingerprints: Dict[str, str]):
+        assert fingerprints, "A Merkle tree needs at least one leaf"
+        self.client_ids = sorted(fingerprints)
+        level = [_leaf(c, fingerprints[c]) for c in self.client_ids]
+        self._levels = [level]
+        while len(level) > 1:
+            level = [
+                _node(level[i], level[i + 1]) if i + 1 < len(level) else level[i]
+                for i in range(0, len(level), 2)
+            ]
+            self._levels.append(level)
+
+    @property
+    def root(self) -> str:
+        return self._levels[-1][0].hex()
+
+    def proof(self, client_id: str) -> List[Tuple[str, bool]]:
+        """Sibling hashes from ``client_id``'s leaf up to the root, each with
+        whether the sibling is on the left.
+        """
+        index = self.client_ids.index(client_id)
+        proof = []
+        for level in self._levels[:-1]:
+            sibling = index ^ 1
+            if sibling < len(level):
+                proof.append((level[sibling].hex(), sibling < index))
+            index //= 2
+        return proof
+
+    @staticmethod
+    def verify(
+        client_id: str, fingerprint: str, proof: List[Tuple[str, bool]], root: str
+    ) -> bool:
+        node = _leaf(client_id, fingerprint)
+        for sibling, is_left in proof:
+            sibling = bytes.fromhex(sibling)
+            node = _node(sibling, node) if is_left else _node(node, sibling)
+        return node.hex() == root
@@ -0,0 +1,177 @@
+#!/usr/bin/env python3
+# Copyright (c) Meta Platforms, Inc. and affiliates.
+# All rights reserved.
+#
+# This source code is licensed under the BSD-style license found in the
+# LICENSE file in the root directory of this source tree.
+
+from __future__ import annotations
+
+from dataclasses import dataclass
+from typing import Dict, List, Tuple
+
+from flsim.provenance.provenance_store import ProvenanceStoreConfig
+from flsim.provenance.sql_provenance_store import SQLProvenanceStore
+from flsim.utils.config_utils import fullclassname, init_self_cfg
+
+
+class MySQLProvenanceStore(SQLProvenanceStore):
+    """Stores models in MySQL tables. All queries go through one connection pool
+    and each batch of blobs or models is one multi-row INSERT.
+    Requires ``mysql-connector-python``.
+    """
+
+    PARAM = "%s"
+    QUOTE = "`"
+    INSERT_IGNORE = "INSERT IGNORE"
+
+    def __init__(self, **kwargs):
+        init_self_cfg(
+            self,
+            component_class=__class__,  # pyre-fixme[10]: Name `__class__` is used but not defined.
+            config_class=MySQLProvenanceStoreConfig,
+            **kwargs,
+        )
+        super().__init__(**kwargs)
+        self._pool = None
+
+    @classmethod
+    def _set_defaults_in_cfg(cls, cfg):
+        pass
+
+    def _connect(self) -> None:
+        from mysql.connector import pooling
+
+        self._pool = pooling.MySQLConnectionPool(
+            pool_name=f"flsim_provenance_{self.cfg.table}",
+            # pyre-fixme[16]: `MySQLProvenanceStore` has no attribute `cfg`.
+            pool_size=self.cfg.pool_size,
+            host=self.cfg.host,
+            port=self.cfg.port,
+            user=self.cfg.user,
+            password=self.cfg.password,
+            database=self.cfg.database,
+        )
+
+    def _get_connection(self):
+        if self._pool is None:
+            self._connect()
+        return self._pool.get_connection()
+
+    def _execute(self, query: str, params=None, many: bool = False) -> None:
+        connection = self._get_connection()
+        try:
+            cursor = connection.cursor()
+            if many:
+                # executemany() on an INSERT is sent as one multi-row statement
+                cursor.executemany(query, params)
+            else:
+                cursor.execute(query, params)
+            connection.commit()
+        finally:
+            # returns the connection to the pool
+            connection.close()
+
+    def _fetchall(self, query: str, params=None) -> List[Tuple]:
+        connection = self._get_connection()
+        try:
+            cursor = connection.cursor()
+            cursor.execute(query, params)
+            return cursor.fetchall()
+        finally:
+            connection.close()
+
+    def _create_schema(self) -> None:
+        self._execute(
+            """
+            CREATE TABLE IF NOT EXISTS `{}_tensors` (
+                hash CHAR(64) PRIMARY KEY,
+                data LONGBLOB
+            )
+            """.format(
+                self.cfg.table
+            )
+        )
+        self._execute(
+            """
+            CREATE TABLE IF NOT EXISTS `{}_clients` (
+                client_key INT AUTO_INCREMENT PRIMARY KEY,
+                client_id VARCHAR(255) UNIQUE
+            )
+            """.format(
+                self.cfg.table
+            )
+        )
+        self._execute(
+            """
+            CREATE TABLE IF NOT EXISTS `{}` (
+                itr_id INT AUTO_INCREMENT PRIMARY KEY,
+                manifest LONGBLOB,
+                client_key INT,
+                global_epoch_num INTEGER,
+                global_round_num INTEGER,
+                weight DOUBLE,
+                INDEX round_idx (global_epoch_num, global_round_num, itr_id),
+                INDEX client_idx (client_key, global_epoch_num, global_round_num)
+            )
+            """.format(
+                self.cfg.table
+            )
+        )
+
+    def _drop(self) -> None:
+        self._execute("DROP TABLE IF EXISTS `{}`".format(self.cfg.table))
+        self._execute("DROP TABLE IF EXISTS `{}_clients`".format(self.cfg.table))
+        self._execute("DROP TABLE IF EXISTS `{}_tensors`".format(self.cfg.table))
+
+    def _insert_blobs(self, blobs: List[Tuple[str, bytes]]) -> None:
+        self._execute(
+            "INSERT IGNORE INTO `{}_tensors`(hash, data) VALUES(%s, %s)".format(
+                self.cfg.table
+            ),
+            blobs,
+            many=True,
+        )
+
+    def _fetch_blobs(self, hashes: List[str]) -> Dict[str, bytes]:
+        if not hashes:
+            return {}
+        rows = self._fetchall(
+            "SELECT hash, data FROM `{}_tensors` WHERE hash IN ({})".format(
+                self.cfg.table, ", ".join(["%s"] * len(hashes))
+            ),
+            tuple(hashes),
+        )
+        return {blob_hash: bytes(data) for blob_hash, data in rows}
+
+    def get_size(self) -> int:
+        rows = self._fetchall(
+            """
+            SELECT SUM(data_length + index_length) FROM information_schema.TABLES
+            WHERE table_schema = %s AND table_name IN (%s, %s, %s)
+            """,
+            (
+                self.cfg.database,
+                self.cfg.table,
+                f"{self.cfg.table}_tensors",
+                f"{self.cfg.table}_clients",
+            ),
+        )
+        return int(rows[0][0]) if rows and rows[0][0] is not None else 0
+
+    def close(self) -> None:
+        # idle pooled connections are closed once the pool is garbage collected
+        self._pool = None
+
+
+@dataclass
+class MySQLProvenanceStoreConfig(ProvenanceStoreConfig):
+    _target_: str = fullclassname(MySQLProvenanceStore)
+    host: str = "localhost"
+    port: int = 3306
+    user: str = "root"
+    password: str = ""
+    database: str = "benchmarks"
+    # the provenance writer holds one connection; the second one serves reads
+    # issued while training is running
+    pool_size: int = 2
@@ -0,0 +1,429 @@
+#!/usr/bin/env python3
+# Copyright (c) Meta Platforms, Inc. and affiliates.
+# All rights reserved.
+#
+# This source code is licensed under the BSD-style license found in the
+# LICENSE file in the root directory of this source tree.
+
+"""
+This file defines the interface of a data provenance store, i.e. where the
+trainer persists intermediate client models for later auditing. Concrete
+backends (MySQL, SQLite, local segment files) live in their own modules and are
+selected through ``SyncTrainerConfig.provenance_store``.
+"""
+
+from __future__ import annotations
+
+import abc
+import json
+import time
+from dataclasses import dataclass
+from typing import Dict, Iterable, Iterator, List, Optional, Set, Tuple
+
+import torch
+from flsim.common.logger import Logger
+from flsim.provenance.async_writer import GLOBAL_MODEL_CLIENT_ID, ProvenanceRecord
+from flsim.provenance.compression import codec_id, CompressionStats
+from flsim.provenance.delta_encoding import decode_state_dict, encode_state_dict
+from flsim.provenance.fingerprint import MERKLE_ROOT_CLIENT_ID
+from flsim.utils.config_utils import init_self_cfg
+from omegaconf import MISSING
+
+
+# (global_epoch_num, global_round_num)
+RoundKey = Tuple[int, int]
+
+
+@dataclass
+class StoredModel:
+    """A row of the models table, in (epoch, round, insertion) order."""
+
+    itr_id: int
+    client_id: str
+    global_epoch_num: int
+    global_round_num: int
+    weight: Optional[float]
+    manifest: Optional[bytes] = None
+
+
+class ProvenanceStore(abc.ABC):
+    """Persists ``ProvenanceRecord``s.
+
+    The global model of each round is stored once, and every client model of
+    that round as a delta against it (see ``delta_encoding``). Tensors are
+    stored as content-addressed blobs, so a tensor that did not change is never
+    stored twice. Blobs are compressed with the codec set in ``compression``.
+    Backends only need to implement storage of blobs and of model manifests,
+    and a query over the manifests; the read-side API (lineage, round
+    contributions, streaming and replay) is built on top of them.
+
+    Stores are created together with the trainer but do not touch their backend
+    until ``open`` is called. ``write_models`` is only ever called from the
+    provenance writer thread, so encoding and compression never slow down
+    training. It expects the global model of a round to be written before the
+    client models of that round.
+    """
+
+    logger = Logger.get_logger(__name__)
+    # larger than any itr_id, to page past every row of a round
+    MAX_ITR_ID = 2**63 - 1
+
+    def __init__(self, **kwargs):
+        init_self_cfg(
+            self,
+            component_class=__class__,  # pyre-fixme[10]: Name `__class__` is used but not defined.
+            config_class=ProvenanceStoreConfig,
+            **kwargs,
+        )
+        # raw tensors of the latest global model, used as the base for deltas
+        self._round_base = None
+        self._round_base_key = None
+        # hashes of the blobs already written by this store
+        self._stored_hashes: Set[str] = set()
+        # pyre-fixme[16]: `ProvenanceStore` has no attribute `cfg`.
+        self._codec = codec_id(self.cfg.compression)
+        self.stats = CompressionStats()
+
+    @classmethod
+    def _set_defaults_in_cfg(cls, cfg):
+        pass
+
+    def open(self) -> None:
+        """Connects to the backend and creates the storage for models.
+        Previously stored models are dropped if ``clear_on_start`` is set.
+        """
+        self._connect()
+        # pyre-fixme[16]: `ProvenanceStore` has no attribute `cfg`.
+        if self.cfg.clear_on_start:
+            self.clear()
+        self._create_schema()
+
+    def write_models(self, records: List[ProvenanceRecord]) -> None:
+        """Persists a batch of records in as few round trips as possible."""
+        model_rows, blobs = [], {}
+        start = time.perf_counter()
+        for r in records:
+            if r.state_dict is None:
+                manifest = json.dumps({"fingerprint": r.fingerprint}).encode("utf-8")
+                model_rows.append(
+                    (
+                        manifest,
+                        r.client_id,
+                        r.global_epoch_num,
+                        r.global_round_num,
+                        r.weight,
+                    )
+                )
+                continue
+            key = (r.global_epoch_num, r.global_round_num)
+            base = self._round_base if self._round_base_key == key else None
+            encoded, raw = encode_state_dict(
+                r.state_dict, base=None if r.is_global else base, codec=self._codec
+            )
+            if r.is_global:
+                self._round_base, self._round_base_key = raw, key
+            self.stats.model_bytes += sum(len(data) for _, data in raw.values())
+            for blob_hash, blob in encoded.blobs.items():
+                if blob_hash not in self._stored_hashes and blob_hash not in blobs:
+                    blobs[blob_hash] = blob
+                    self.stats.blob_bytes += encoded.raw_sizes[blob_hash]
+                    self.stats.stored_bytes += len(blob)
+            model_rows.append(
+                (
+                    encoded.manifest(),
+                    r.client_id,
+                    r.global_epoch_num,
+                    r.global_round_num,
+                    r.weight,
+                )
+            )
+        self.stats.seconds += time.perf_counter() - start
+        # blobs go first so that a stored manifest never points at missing data
+        if blobs:
+            self._insert_blobs(list(blobs.items()))
+            self._stored_hashes.update(blobs)
+        self._insert_models(model_rows)
+
+    def get_model(
+        self, client_id: str, global_epoch_num: int, global_round_num: int
+    ) -> Optional[Dict[str, torch.Tensor]]:
+        """Rebuilds the exact state_dict stored for ``client_id`` in the given
+        round, or returns None if there is none. Use ``GLOBAL_MODEL_CLIENT_ID``
+        to get the global model broadcast in that round.
+        """
+        manifest = self._fetch_manifest(client_id, global_epoch_num, global_round_num)
+        if manifest is None or self._is_fingerprint(manifest):
+            return None
+        return decode_state_dict(manifest, self._fetch_blobs)
+
+    def get_fingerprint(
+        self, client_id: str, global_epoch_num: int, global_round_num: int
+    ) -> Optional[str]:
+        """Returns the fingerprint stored for ``client_id`` in the given round,
+        or None if its full model (or nothing) was stored.
+        """
+        manifest = self._fetch_manifest(client_id, global_epoch_num, global_round_num)
+        if manifest is None or not self._is_fingerprint(manifest):
+            return None
+        return json.loads(manifest)["fingerprint"]
+
+    def get_lineage(self, client_id: str) -> List[RoundKey]:
+        """Returns the (epoch, round) of every round ``client_id`` has a stored
+        model or fingerprint for, in training order.
+        """
+        return [
+            (row.global_epoch_num, row.global_round_num)
+            for row in self._query_models(client_id=client_id, with_manifest=False)
+        ]
+
+    def get_round_contributions(
+        self, global_epoch_num: int, global_round_num: int
+    ) -> Dict[str, Dict[str, torch.Tensor]]:
+        """Returns the models of all clients stored for the given round, keyed
+        by client id. Clients with only a fingerprint are left out.
+        """
+        key = (global_epoch_num, global_round_num)
+        return {
+            row.client_id: self._decode(row)
+            for row in self._query_models(first=key, last=key)
+            if not self._is_round_metadata(row)
+            and not self._is_fingerprint(row.manifest)
+        }
+
+    def iter_models(
+        self,
+        first: Optional[RoundKey] = None,
+        last: Optional[RoundKey] = None,
+        page_size: int = 64,
+    ) -> Iterator[ProvenanceRecord]:
+        """Streams the records stored for rounds ``first`` to ``last`` (both
+        inclusive, as (epoch, round)), in training order. Manifests are fetched
+        ``page_size`` at a time and models are decoded one at a time, so memory
+        stays bounded however many rounds are read.
+        """
+        after = None
+        while True:
+            rows = self._query_models(
+                first=first, last=last, after=after, limit=page_size
+            )
+            for row in rows:
+                fingerprint = None
+                if self._is_fingerprint(row.manifest):
+                    fingerprint = json.loads(row.manifest)["fingerprint"]
+                yield ProvenanceRecord(
+                    client_id=row.client_id,
+                    global_epoch_num=row.global_epoch_num,
+                    global_round_num=row.global_round_num,
+                    state_dict=None if fingerprint else self._decode(row),
+                    fingerprint=fingerprint,
+                    weight=row.weight,
+                )
+            if len(rows) < page_size:
+                return
+            tail = rows[-1]
+            after = (tail.global_epoch_num, tail.global_round_num, tail.itr_id)
+
+    def replay_round(
+        self,
+        global_epoch_num: int,
+        global_round_num: int,
+        server_lr: float = 1.0,
+        weighted: bool = True,
+        parameter_names: Optional[Iterable[str]] = None,
+    ) -> Dict[str, torch.Tensor]:
+        """Recomputes the global model produced by a FedAvg round from the
+        stored global model and client models of that round.
+
+        Args:
+            server_lr: Learning rate of the server optimizer (1.0 for FedAvg).
+            weighted: Whether client updates were averaged with the weights
+                stored with them, as with ``AggregationType.WEIGHTED_AVERAGE``.
+            parameter_names: Tensors that are aggregated. Defaults to every
+                floating point tensor; pass the names of the module's parameters
+                for models with buffers (e.g. batch norm statistics), which the
+                server does not aggregate.
+
+        Raises:
+            ValueError: If the global model of the round, or the full model of
+                any of its clients, was not stored.
+        """
+        key = (global_epoch_num, global_round_num)
+        rows = self._query_models(first=key, last=key)
+        global_rows = [r for r in rows if r.client_id == GLOBAL_MODEL_CLIENT_ID]
+        client_rows = [r for r in rows if not self._is_round_metadata(r)]
+        if not global_rows or not client_rows:
+            raise ValueError(f"Round {key} has no stored global or client models")
+        fingerprinted = [
+            r.client_id for r in client_rows if self._is_fingerprint(r.manifest)
+        ]
+        if fingerprinted:
+            raise ValueError(
+                f"Cannot replay round {key}, only fingerprints were stored for "
+                f"{fingerprinted}"
+            )
+
+        global_model = self._decode(global_rows[-1])
+        names = (
+            list(parameter_names)
+            if parameter_names is not None
+            else [n for n, t in global_model.items() if t.is_floating_point()]
+        )
+        # accumulate in float64 so that the order of clients hardly matters
+        sum_deltas = {
+            n: torch.zeros_like(global_model[n], dtype=torch.float64) for n in names
+        }
+        sum_weights = 0.0
+        # one client model in memory at a time
+        for row in client_rows:
+            weight = row.weight if weighted and row.weight is not None else 1.0
+            client_model = self._decode(row)
+            for n in names:
+                sum_deltas[n] += weight * (
+                    global_model[n].double() - client_model[n].double()
+                )
+            sum_weights += weight
+
+        replayed = dict(global_model)
+        for n in names:
+            step = server_lr * sum_deltas[n] / sum_weights
+            replayed[n] = (global_model[n].double() - step).to(global_model[n].dtype)
+        return replayed
+
+    def verify_round(
+        self,
+        global_epoch_num: int,
+        global_round_num: int,
+        atol: float = 1e-5,
+        **replay_kwargs,
+    ) -> bool:
+        """Replays a round (see ``replay_round``) and checks the result against
+        the next stored global model, which must be the one broadcast in the
+        round right after it (e.g. not with ``EveryNthRoundCapturePolicy``).
+        """
+        replayed = self.replay_round(
+            global_epoch_num, global_round_num, **replay_kwargs
+        )
+        next_rows = self._query_models(
+            client_id=GLOBAL_MODEL_CLIENT_ID,
+            # strictly after every row of the replayed round
+            after=(global_epoch_num, global_round_num, self.MAX_ITR_ID),
+            limit=1,
+        )
+        if not next_rows:
+            raise ValueError(
+                f"No global model stored after round "
+                f"{(global_epoch_num, global_round_num)}"
+            )
+        expected = self._decode(next_rows[0])
+        return all(
+            torch.allclose(replayed[n].double(), t.double(), atol=atol)
+            if t.is_floating_point()
+            else torch.equal(replayed[n], t)
+            for n, t in expected.items()
+        )
+
+    def _fetch_manifest(
+        self, client_id: str, global_epoch_num: int, global_round_num: int
+    ) -> Optional[bytes]:
+        key = (global_epoch_num, global_round_num)
+        rows = self._query_models(client_id=client_id, first=key, last=key)
+        # the latest row wins if a model was written twice
+        return rows[-1].manifest if rows else None
+
+    def _decode(self, row: StoredModel) -> Dict[str, torch.Tensor]:
+        return decode_state_dict(row.manifest, self._fetch_blobs)
+
+    @staticmethod
+    def _is_round_metadata(row: StoredModel) -> bool:
+        return row.client_id in (GLOBAL_MODEL_CLIENT_ID, MERKLE_ROOT_CLIENT_ID)
+
+    @staticmethod
+    def _is_fingerprint(manifest: bytes) -> bool:
+        # full models have a list of tensor entries as manifest
+        return manifest.lstrip()[:1] == b"{"
+
+    def clear(self) -> None:
+        """Drops all models stored so far."""
+        self._drop()
+        self._round_base = None
+        self._round_base_key = None
+        self._stored_hashes.clear()
+
+    @abc.abstractmethod
+    def _connect(self) -> None:
+        pass
+
+    @abc.abstractmethod
+    def _create_schema(self) -> None:
+        pass
+
+    @abc.abstractmethod
+    def _drop(self) -> None:
+        pass
+
+    @abc.abstractmethod
+    def _insert_blobs(self, blobs: List[Tuple[str, bytes]]) -> None:
+        """Stores (hash, blob) pairs, ignoring hashes that are already stored."""
+        pass
+
+    @abc.abstractmethod
+    def _insert_models(
+        self, rows: List[Tuple[bytes, str, int, int, Optional[float]]]
+    ) -> None:
+        """Stores (manifest, client_id, global_epoch_num, global_round_num,
+        weight) rows.
+        """
+        pass
+
+    @abc.abstractmethod
+    def _query_models(
+        self,
+        client_id: Optional[str] = None,
+        first: Optional[RoundKey] = None,
+        last: Optional[RoundKey] = None,
+        after: Optional[Tuple[int, int, int]] = None,
+        limit: Optional[int] = None,
+        with_manifest: bool = True,
+    ) -> List[StoredModel]:
+        """Returns the stored models ordered by (epoch, round, itr_id).
+
+        Args:
+            client_id: Only models of this client.
+            first, last: Only models of rounds in [first, last].
+            after: Only models after this (epoch, round, itr_id), for paging.
+            limit: At most this many models.
+            with_manifest: Whether to fetch manifests, or only the keys.
+        """
+        pass
+
+    @abc.abstractmethod
+    def _fetch_blobs(self, hashes: List[str]) -> Dict[str, bytes]:
+        pass
+
+    @abc.abstractmethod
+    def get_size(self) -> int:
+        """Returns the size of the stored models in bytes."""
+        pass
+
+    def close(self) -> None:
+        """Releases any connection or file handle held by the store."""
+        pass
+
+
+@dataclass
+class ProvenanceStoreConfig:
+    _target_: str = MISSING
+    _recursive_: bool = False
+    # table (or file prefix) that holds the intermediate models; tensor blobs are
+    # kept in `<table>_tensors`
+    table: str = "models"
+    # drop previously stored models when training starts
+    clear_on_start: bool = True
+    # max number of models waiting to be written before training blocks on the
+    # provenance writer
+    max_queue_size: int = 64
+    # max number of models written per batch
+    batch_size: int = 16
+    # compression codec of the tensor blobs: none, zlib, lz4 or shuffle (see
+    # flsim.provenance.compression)
+    compression: str = "zlib"
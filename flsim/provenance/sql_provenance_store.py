@@ -0,0 +1,153 @@
+#!/usr/bin/env python3
+# Copyright (c) Meta Platforms, Inc. and affiliates.
+# All rights reserved.
+#
+# This source code is licensed under the BSD-style license found in the
+# LICENSE file in the root directory of this source tree.
+
+from __future__ import annotations
+
+import abc
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from flsim.provenance.provenance_store import ProvenanceStore, RoundKey, StoredModel
+
+
+class SQLProvenanceStore(ProvenanceStore):
+    """Model queries shared by the SQL backends.
+
+    Besides ``<table>_tensors``, SQL stores keep two tables:
+
+        - ``<table>_clients(client_key, client_id)`` maps every client id to an
+          integer key, so model rows and their indexes stay small however long
+          client ids are.
+        - ``<table>(itr_id, manifest, client_key, global_epoch_num,
+          global_round_num, weight)`` holds one row per stored model, indexed on
+          (global_epoch_num, global_round_num, itr_id) for round scans and on
+          (client_key, global_epoch_num, global_round_num) for lineages.
+
+    Backends implement the schema and how queries are run; ``PARAM``, ``QUOTE``
+    and ``INSERT_IGNORE`` adapt the queries built here to their SQL dialect.
+    """
+
+    PARAM = "?"
+    QUOTE = '"'
+    INSERT_IGNORE = "INSERT OR IGNORE"
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        # Key: client id, Value: client_key in `<table>_clients`
+        self._client_keys: Dict[str, int] = {}
+
+    @abc.abstractmethod
+    def _execute(self, query: str, params=None, many: bool = False) -> None:
+        pass
+
+    @abc.abstractmethod
+    def _fetchall(self, query: str, params=None) -> List[Tuple]:
+        pass
+
+    def _table(self, suffix: str = "") -> str:
+        # pyre-fixme[16]: `SQLProvenanceStore` has no attribute `cfg`.
+        return f"{self.QUOTE}{self.cfg.table}{suffix}{self.QUOTE}"
+
+    def _params(self, count: int) -> str:
+        return ", ".join([self.PARAM] * count)
+
+    def _fetch_client_keys(self, client_ids: Iterable[str]) -> None:
+        client_ids = [c for c in set(client_ids) if c not in self._client_keys]
+        if not client_ids:
+            return
+        rows = self._fetchall(
+            f"SELECT client_id, client_key FROM {self._table('_clients')} "
+            f"WHERE client_id IN ({self._params(len(client_ids))})",
+            tuple(client_ids),
+        )
+        self._client_keys.update(rows)
+
+    def _insert_models(
+        self, rows: List[Tuple[bytes, str, int, int, Optional[float]]]
+    ) -> None:
+        client_ids = {client_id for _, client_id, _, _, _ in rows}
+        new_ids = [(c,) for c in client_ids if c not in self._client_keys]
+        if new_ids:
+            self._execute(
+                f"{self.INSERT_IGNORE} INTO {self._table('_clients')}(client_id) "
+                f"VALUES({self.PARAM})",
+                new_ids,
+                many=True,
+            )
+        self._fetch_client_keys(client_ids)
+        self._execute(
+            f"INSERT INTO {self._table()}(manifest, client_key, global_epoch_num, "
+            f"global_round_num, weight) VALUES({self._params(5)})",
+            [
+                (manifest, self._client_keys[client_id], epoch, round, weight)
+                for manifest, client_id, epoch, round, weight in rows
+            ],
+            many=True,
+        )
+
+    def _query_models(
+        self,
+        client_id: Optional[str] = None,
+        first: Optional[RoundKey] = None,
+        last: Optional[RoundKey] = None,
+        after: Optional[Tuple[int, int, int]] = None,
+        limit: Optional[int] = None,
+        with_manifest: bool = True,
+    ) -> List[StoredModel]:
+        conditions, params = [], []
+        if client_id is not None:
+            self._fetch_client_keys([client_id])
+            if client_id not in self._client_keys:
+                return []
+            conditions.append(f"m.client_key = {self.PARAM}")
+            params.append(self._client_keys[client_id])
+        # row value comparisons are spelled out so that they can use the indexes
+        p = self.PARAM
+        if first is not None:
+            conditions.append(
+                f"(m.global_epoch_num > {p} OR "
+                f"(m.global_epoch_num = {p} AND m.global_round_num >= {p}))"
+            )
+            params.extend([first[0], first[0], first[1]])
+        if last is not None:
+            conditions.append(
+                f"(m.global_epoch_num < {p} OR "
+                f"(m.global_epoch_num = {p} AND m.global_round_num <= {p}))"
+            )
+            params.extend([last[0], last[0], last[1]])
+        if after is not None:
+            conditions.append(
+                f"(m.global_epoch_num > {p} OR (m.global_epoch_num = {p} AND "
+                f"(m.global_round_num > {p} OR "
+                f"(m.global_round_num = {p} AND m.itr_id > {p}))))"
+            )
+            params.extend([after[0], after[0], after[1], after[1], after[2]])
+        query = (
+            "SELECT m.itr_id, c.client_id, m.global_epoch_num, m.global_round_num, "
+            f"m.weight{', m.manifest' if with_manifest else ''} "
+            f"FROM {self._table()} m JOIN {self._table('_clients')} c "
+            "ON c.client_key = m.client_key"
+        )
+        if conditions:
+            query += " WHERE " + " AND ".join(conditions)
+        query += " ORDER BY m.global_epoch_num, m.global_round_num, m.itr_id"
+        if limit is not None:
+            query += f" LIMIT {int(limit)}"
+        return [
+            StoredModel(
+                itr_id=row[0],
+                client_id=row[1],
+                global_epoch_num=row[2],
+                global_round_num=row[3],
+                weight=row[4],
+                manifest=bytes(row[5]) if with_manifest else None,
+            )
+            for row in self._fetchall(query, tuple(params))
+        ]
+
+    def clear(self) -> None:
+        super().clear()
+        self._client_keys.clear()
@@ -0,0 +1,176 @@
+#!/usr/bin/env python3
+# Copyright (c) Meta Platforms, Inc. and affiliates.
+# All rights reserved.
+#
+# This source code is licensed under the BSD-style license found in the
+# LICENSE file in the root directory of this source tree.
+
+from __future__ import annotations
+
+import os
+import sqlite3
+import threading
+from dataclasses import dataclass
+from typing import Dict, List, Tuple
+
+from flsim.provenance.provenance_store import ProvenanceStoreConfig
+from flsim.provenance.sql_provenance_store import SQLProvenanceStore
+from flsim.utils.config_utils import fullclassname, init_self_cfg
+
+
+class SQLiteProvenanceStore(SQLProvenanceStore):
+    """Stores models in a SQLite database file.
+
+    The store keeps one connection open for its whole lifetime and puts the
+    database in WAL mode, so each batch is a single append-only transaction and
+    readers in other processes are never blocked by the trainer.
+    """
+
+    MAX_QUERY_PARAMS = 500
+
+    def __init__(self, **kwargs):
+        init_self_cfg(
+            self,
+            component_class=__class__,  # pyre-fixme[10]: Name `__class__` is used but not defined.
+            config_class=SQLiteProvenanceStoreConfig,
+            **kwargs,
+        )
+        super().__init__(**kwargs)
+        self._connection = None
+        # the connection is opened on the training thread and written to from the
+        # provenance writer thread
+        self._lock = threading.Lock()
+
+    @classmethod
+    def _set_defaults_in_cfg(cls, cfg):
+        pass
+
+    def _connect(self) -> None:
+        # pyre-fixme[16]: `SQLiteProvenanceStore` has no attribute `cfg`.
+        dir_path = os.path.dirname(self.cfg.db_path)
+        if dir_path:
+            os.makedirs(dir_path, exist_ok=True)
+        self._connection = sqlite3.connect(self.cfg.db_path, check_same_thread=False)
+        self._connection.execute("PRAGMA journal_mode=WAL")
+        self._connection.execute(f"PRAGMA synchronous={self.cfg.synchronous}")
+
+    def _execute(self, query: str, params=(), many: bool = False) -> None:
+        if self._connection is None:
+            self._connect()
+        with self._lock, self._connection:
+            if many:
+                self._connection.executemany(query, params)
+            else:
+                self._connection.execute(query, params)
+
+    def _fetchall(self, query: str, params=()) -> List[Tuple]:
+        if self._connection is None:
+            self._connect()
+        with self._lock:
+            return self._connection.execute(query, params).fetchall()
+
+    def _create_schema(self) -> None:
+        self._execute(
+            """
+            CREATE TABLE IF NOT EXISTS "{}_tensors" (
+                hash TEXT PRIMARY KEY,
+                data BLOB
+            )
+            """.format(
+                self.cfg.table
+            )
+        )
+        self._execute(
+            """
+            CREATE TABLE IF NOT EXISTS "{}_clients" (
+                client_key INTEGER PRIMARY KEY AUTOINCREMENT,
+                client_id TEXT UNIQUE
+            )
+            """.format(
+                self.cfg.table
+            )
+        )
+        self._execute(
+            """
+            CREATE TABLE IF NOT EXISTS "{}" (
+                itr_id INTEGER PRIMARY KEY AUTOINCREMENT,
+                manifest BLOB,
+                client_key INTEGER,
+                global_epoch_num INTEGER,
+                global_round_num INTEGER,
+                weight REAL
+            )
+            """.format(
+                self.cfg.table
+            )
+        )
+        self._execute(
+            """
+            CREATE INDEX IF NOT EXISTS "{0}_round" ON "{0}"(
+                global_epoch_num, global_round_num, itr_id
+            )
+            """.format(
+                self.cfg.table
+            )
+        )
+        self._execute(
+            """
+            CREATE INDEX IF NOT EXISTS "{0}_client" ON "{0}"(
+                client_key, global_epoch_num, global_round_num
+            )
+            """.format(
+                self.cfg.table
+            )
+        )
+
+    def _drop(self) -> None:
+        # indexes are dropped with their table
+        self._execute('DROP TABLE IF EXISTS "{}"'.format(self.cfg.table))
+        self._execute('DROP TABLE IF EXISTS "{}_clients"'.format(self.cfg.table))
+        self._execute('DROP TABLE IF EXISTS "{}_tensors"'.format(self.cfg.table))
+
+    def _insert_blobs(self, blobs: List[Tuple[str, bytes]]) -> None:
+        self._execute(
+            'INSERT OR IGNORE INTO "{}_tensors"(hash, data) VALUES(?, ?)'.format(
+                self.cfg.table
+            ),
+            blobs,
+            many=True,
+        )
+
+    def _fetch_blobs(self, hashes: List[str]) -> Dict[str, bytes]:
+        blobs = {}
+        # stay below SQLite's limit on the number of host parameters
+        for i in range(0, len(hashes), self.MAX_QUERY_PARAMS):
+            chunk = hashes[i : i + self.MAX_QUERY_PARAMS]
+            rows = self._fetchall(
+                'SELECT hash, data FROM "{}_tensors" WHERE hash IN ({})'.format(
+                    self.cfg.table, ", ".join(["?"] * len(chunk))
+                ),
+                tuple(chunk),
+            )
+            blobs.update(rows)
+        return blobs
+
+    def get_size(self) -> int:
+        # the WAL file holds committed pages that were not checkpointed yet
+        return sum(
+            os.path.getsize(path)
+            for path in (self.cfg.db_path, f"{self.cfg.db_path}-wal")
+            if os.path.exists(path)
+        )
+
+    def close(self) -> None:
+        if self._connection is not None:
+            with self._lock:
+                self._connection.close()
+            self._connection = None
+
+
+@dataclass
+class SQLiteProvenanceStoreConfig(ProvenanceStoreConfig):
+    _target_: str = fullclassname(SQLiteProvenanceStore)
+    db_path: str = "model_databases/flsim_provenance.db"
+    # NORMAL is durable in WAL mode except on power loss, and avoids an fsync
+    # per transaction
+    synchronous: str = "NORMAL"
@@ -0,0 +1,103 @@
+#!/usr/bin/env python3
+# Copyright (c) Meta Platforms, Inc. and affiliates.
+# All rights reserved.
+#
+# This source code is licensed under the BSD-style license found in the
+# LICENSE file in the root directory of this source tree.
+
+import threading
+
+import pytest
+import torch
+from flsim.common.pytest_helper import (
+    assertEqual,
+    assertFalse,
+    assertLessEqual,
+    assertTrue,
+)
+from flsim.provenance.async_writer import AsyncProvenanceWriter, ProvenanceRecord
+from flsim.utils import test_utils as utils
+
+
+def _record(i: int) -> ProvenanceRecord:
+    return ProvenanceRecord(
+        client_id=f"client_{i}",
+        global_epoch_num=1,
+        global_round_num=i,
+        state_dict={"w": torch.tensor([float(i)])},
+    )
+
+
+class TestAsyncProvenanceWriter:
+    def test_snapshot_is_detached_copy(self) -> None:
+        model = utils.SampleNet(utils.TwoFC())
+        record = ProvenanceRecord.from_model(model, "client_0", 1, 1)
+        for name, param in model.fl_get_module().state_dict().items():
+            assertTrue(torch.equal(record.state_dict[name], param))
+            assertFalse(record.state_dict[name].data_ptr() == param.data_ptr())
+
+    def test_flush_writes_all_records_in_batches(self) -> None:
+        batches = []
+        writer = AsyncProvenanceWriter(batches.append, max_queue_size=4, batch_size=3)
+        for i in range(10):
+            writer.submit(_record(i))
+        writer.flush()
+        written = [r.global_round_num for batch in batches for r in batch]
+        assertEqual(written, list(range(10)))
+        for batch in batches:
+            assertLessEqual(len(batch), 3)
+        writer.close()
+        assertFalse(writer.is_alive)
+
+    def test_submit_blocks_when_queue_is_full(self) -> None:
+        release = threading.Event()
+        writer = AsyncProvenanceWriter(
+            lambda batch: release.wait(), max_queue_size=1, batch_size=1
+        )
+        # first record is taken by the (blocked) writer, second fills the queue
+        writer.submit(_record(0))
+        writer.submit(_record(1))
+        producer = threading.Thread(target=writer.submit, args=(_record(2),))
+        producer.start()
+        producer.join(timeout=0.2)
+        assertTrue(producer.is_alive())
+        release.set()
+        producer.join()
+        writer.close()
+
+    def test_write_errors_surface_on_training_thread(self) -> None:
+        def fail(batch):
+            raise ValueError("db is down")
+
+        writer = AsyncProvenanceWriter(fail)
+        writer.submit(_record(0))
+        with pytest.raises(RuntimeError):
+            writer.flush()
+        with pytest.raises(RuntimeError):
+            writer.close()
+
+    def test_records_after_a_failed_write_are_not_lost_silently(self) -> None:
+        written = []
+        release = threading.Event()
+
+        def write_batch(batch):
+            release.wait()
+            if any(r.global_round_num == 2 for r in batch):
+                raise ValueError("db is down")
+            written.extend(r.global_round_num for r in batch)
+
+        writer = AsyncProvenanceWriter(write_batch, batch_size=1)
+        for i in range(5):
+            writer.submit(_record(i))
+        release.set()
+        # records 3 and 4 were queued before the failure was seen, they are
+        # not written and the error is raised until the writer is closed
+        for _ in range(2):
+            with pytest.raises(RuntimeError):
+                writer.flush()
+        with pytest.raises(RuntimeError):
+            writer.submit(_record(5))
+        with pytest.raises(RuntimeError):
+            writer.close()
+        assertEqual(written, [0, 1])
+        writer.close()
@@ -0,0 +1,147 @@
+#!/usr/bin/env python3
+# Copyright (c) Meta Platforms, Inc. and affiliates.
+# All rights reserved.
+#
+# This source code is licensed under the BSD-style license found in the
+# LICENSE file in the root directory of this source tree.
+
+import copy
+
+import torch
+from flsim.common.pytest_helper import assertEqual, assertNotEqual, assertTrue
+from flsim.common.timeline import Timeline
+from flsim.provenance.async_writer import GLOBAL_MODEL_CLIENT_ID, snapshot_state_dict
+from flsim.provenance.capture_policy import (
+    AllClientsCapturePolicyConfig,
+    EveryNthRoundCapturePolicyConfig,
+    GlobalOnlyCapturePolicyConfig,
+    RandomFractionCapturePolicyConfig,
+    UpdateNormOutlierCapturePolicyConfig,
+)
+from flsim.provenance.fingerprint import (
+    fingerprint_state_dict,
+    MerkleTree,
+    MERKLE_ROOT_CLIENT_ID,
+)
+from flsim.utils import test_utils as utils
+from hydra.utils import instantiate
+
+
+class RecordingWriter:
+    def __init__(self):
+        self.records = []
+        # snapshots taken by the clients of the round
+        self.num_snapshots = 0
+
+    def submit(self, record) -> None:
+        self.records.append(record)
+
+
+def _capture_round(
+    policy, round_num: int = 1, num_clients: int = 4, scales=None, writer=None
+):
+    """Runs one round where client i moved its weights by ``scales[i]``."""
+    global_model = utils.SampleNet(utils.TwoFC())
+    scales = scales or [1e-2] * num_clients
+    models = []
+    for scale in scales:
+        model = copy.deepcopy(global_model)
+        with torch.no_grad():
+            for p in model.fl_get_module().parameters():
+                p.add_(scale)
+        models.append(model)
+    writer = writer or RecordingWriter()
+    timeline = Timeline(epoch=1, round=round_num, rounds_per_epoch=10)
+    policy.capture_global_model(writer, global_model, timeline)
+    names = [f"client_{i}" for i in range(len(models))]
+    weights = {name: float(i + 1) for i, name in enumerate(names)}
+    policy.start_round(names)
+    # clients only take snapshots and fingerprints the policy asks for
+    client_models = [
+        (name, snapshot_state_dict(m))
+        for name, m in zip(names, models)
+        if policy.captures_client_model(name)
+    ]
+    writer.num_snapshots += len(client_models)
+    policy.capture_client_models(writer, client_models, timeline, weights)
+    if policy.fingerprints_client_models():
+        fingerprints = [
+            (f"client_{i}", fingerprint_state_dict(m.fl_get_module().state_dict()))
+            for i, m in enumerate(models)
+        ]
+        policy.capture_client_fingerprints(writer, fingerprints, timeline, weights)
+    return writer.records
+
+
+class TestCapturePolicy:
+    def test_all_clients(self) -> None:
+        policy = instantiate(AllClientsCapturePolicyConfig())
+        records = _capture_round(policy)
+        assertEqual(
+            [r.client_id for r in records],
+            [GLOBAL_MODEL_CLIENT_ID] + [f"client_{i}" for i in range(4)],
+        )
+        assertEqual(policy.stats.models_captured, 4)
+        assertEqual([r.weight for r in records[1:]], [1.0, 2.0, 3.0, 4.0])
+
+    def test_every_nth_round(self) -> None:
+        policy = instantiate(EveryNthRoundCapturePolicyConfig(round_interval=2))
+        assertEqual(len(_capture_round(policy, round_num=1)), 0)
+        assertTrue(not policy.captures_client_models())
+        assertEqual(len(_capture_round(policy, round_num=2)), 5)
+        assertTrue(policy.captures_client_models())
+        assertEqual(policy.stats.rounds_captured, 1)
+
+    def test_random_fraction(self) -> None:
+        selected = []
+        for _ in range(2):
+            policy = instantiate(
+                RandomFractionCapturePolicyConfig(fraction=0.5, seed=0)
+            )
+            records = _capture_round(policy)
+            assertEqual(records[0].client_id, GLOBAL_MODEL_CLIENT_ID)
+            selected.append([r.client_id for r in records[1:]])
+        assertEqual(len(selected[0]), 2)
+        # seeded selection is reproducible
+        assertEqual(selected[0], selected[1])
+
+    def test_random_fraction_skips_snapshots(self) -> None:
+        policy = instantiate(RandomFractionCapturePolicyConfig(fraction=0.25, seed=0))
+        writer = RecordingWriter()
+        records = _capture_round(policy, num_clients=8, writer=writer)
+        # only the selected clients snapshot their model
+        assertEqual(writer.num_snapshots, 2)
+        assertEqual(len(records), 3)
+        assertEqual(policy.stats.models_captured, 2)
+        assertEqual(policy.stats.models_skipped, 6)
+
+    def test_update_norm_outliers(self) -> None:
+        policy = instantiate(UpdateNormOutlierCapturePolicyConfig(z_threshold=1.5))
+        records = _capture_round(policy, scales=[1e-2, 1e-2, 1.0, 1e-2, 1e-2])
+        assertEqual(
+            [r.client_id for r in records], [GLOBAL_MODEL_CLIENT_ID, "client_2"]
+        )
+
+    def test_global_only(self) -> None:
+        policy = instantiate(GlobalOnlyCapturePolicyConfig())
+        assertTrue(not policy.captures_client_models())
+        records = _capture_round(policy, scales=[1e-2, 1e-2, 1.0])
+        assertTrue(records[0].state_dict is not None)
+        fingerprints = [r.fingerprint for r in records[1:]]
+        assertTrue(all(r.state_dict is None for r in records[1:]))
+        # identical models have identical fingerprints
+        assertEqual(fingerprints[0], fingerprints[1])
+        assertNotEqual(fingerprints[0], fingerprints[2])
+        assertEqual(policy.stats.fingerprints_captured, 3)
+
+    def test_global_only_merkle_root(self) -> None:
+        policy = instantiate(GlobalOnlyCapturePolicyConfig(merkle_tree=True))
+        records = _capture_round(policy, num_clients=5)
+        root = records[-1]
+        assertEqual(root.client_id, MERKLE_ROOT_CLIENT_ID)
+        assertEqual(root.fingerprint, policy.merkle_tree.root)
+        for r in records[1:-1]:
+            proof = policy.merkle_tree.proof(r.client_id)
+            assertTrue(
+                MerkleTree.verify(r.client_id, r.fingerprint, proof, root.fingerprint)
+            )
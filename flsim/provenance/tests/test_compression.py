@@ -0,0 +1,50 @@
+#!/usr/bin/env python3
+# Copyright (c) Meta Platforms, Inc. and affiliates.
+# All rights reserved.
+#
+# This source code is licensed under the BSD-style license found in the
+# LICENSE file in the root directory of this source tree.
+
+import pytest
+import torch
+from flsim.common.pytest_helper import assertEqual, assertLess
+from flsim.provenance.compression import (
+    codec_id,
+    compress,
+    decompress,
+    lz4_available,
+    NONE,
+    SHUFFLE_ZLIB,
+    ZLIB,
+)
+from flsim.utils.tensor_serialization import tensor_to_bytes
+
+
+class TestCompression:
+    def _data(self) -> bytes:
+        torch.manual_seed(0)
+        # small values share their exponent bytes, like model weights
+        return tensor_to_bytes(torch.randn(1024) * 1e-2)
+
+    @pytest.mark.parametrize(
+        "codec",
+        ["none", "zlib", "shuffle"] + (["lz4"] if lz4_available() else []),
+    )
+    def test_round_trip(self, codec) -> None:
+        data = self._data()
+        for itemsize in [1, 3, 4]:
+            assertEqual(decompress(compress(data, codec_id(codec), itemsize)), data)
+        assertEqual(decompress(compress(b"", codec_id(codec), 4)), b"")
+
+    def test_shuffle_compresses_floats_better(self) -> None:
+        data = self._data()
+        shuffled = compress(data, SHUFFLE_ZLIB, itemsize=4)
+        assertLess(len(shuffled), len(compress(data, ZLIB, itemsize=4)))
+        assertEqual(len(compress(data, NONE)), len(data) + 1)
+
+    def test_unknown_codec(self) -> None:
+        with pytest.raises(ValueError):
+            codec_id("snappy")
+        if not lz4_available():
+            with pytest.raises(ValueError):
+                codec_id("lz4")
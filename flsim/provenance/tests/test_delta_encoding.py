@@ -0,0 +1,54 @@
+#!/usr/bin/env python3
+# Copyright (c) Meta Platforms, Inc. and affiliates.
+# All rights reserved.
+#
+# This source code is licensed under the BSD-style license found in the
+# LICENSE file in the root directory of this source tree.
+
+import torch
+from flsim.common.pytest_helper import assertEqual, assertTrue
+from flsim.provenance.delta_encoding import decode_state_dict, encode_state_dict
+
+
+class TestDeltaEncoding:
+    def _state_dict(self):
+        torch.manual_seed(0)
+        return {
+            "weight": torch.randn(16, 8),
+            "half": torch.randn(4).half(),
+            "steps": torch.tensor(7, dtype=torch.int64),
+            "mask": torch.rand(5) > 0.5,
+            "empty": torch.zeros(0, 3),
+        }
+
+    def test_round_trip_is_exact(self) -> None:
+        base_sd = self._state_dict()
+        base_encoded, base = encode_state_dict(base_sd)
+        client_sd = {k: v.clone() for k, v in base_sd.items()}
+        client_sd["weight"][0] += 0.5
+        client_sd["steps"] += 1
+        encoded, _ = encode_state_dict(client_sd, base=base)
+
+        blobs = {**base_encoded.blobs, **encoded.blobs}
+        for original, model in [(base_sd, base_encoded), (client_sd, encoded)]:
+            decoded = decode_state_dict(
+                model.manifest(), lambda hashes: {h: blobs[h] for h in hashes}
+            )
+            for name, tensor in original.items():
+                assertEqual(decoded[name].dtype, tensor.dtype)
+                assertEqual(decoded[name].shape, tensor.shape)
+                assertTrue(torch.equal(decoded[name], tensor))
+
+    def test_unchanged_tensors_reference_base(self) -> None:
+        base_sd = self._state_dict()
+        base_encoded, base = encode_state_dict(base_sd)
+        client_sd = {k: v.clone() for k, v in base_sd.items()}
+        client_sd["weight"][0, 0] += 1.0
+        encoded, _ = encode_state_dict(client_sd, base=base)
+
+        entries = {e.name: e for e in encoded.entries}
+        assertEqual(entries["weight"].encoding, "xor")
+        assertEqual(entries["weight"].base, base["weight"][0].hash)
+        # only the delta of `weight` is a new blob
+        assertEqual(list(encoded.blobs), [entries["weight"].hash])
+        assertTrue(len(encoded.blobs[entries["weight"].hash]) < 16 * 8 * 4)
@@ -0,0 +1,87 @@
+#!/usr/bin/env python3
+# Copyright (c) Meta Platforms, Inc. and affiliates.
+# All rights reserved.
+#
+# This source code is licensed under the BSD-style license found in the
+# LICENSE file in the root directory of this source tree.
+
+import hashlib
+import pickle
+import struct
+
+import torch
+from flsim.common.pytest_helper import (
+    assertEqual,
+    assertFalse,
+    assertNotEqual,
+    assertTrue,
+)
+from flsim.provenance.fingerprint import (
+    fingerprint_state_dict,
+    FINGERPRINT_PREFIX,
+    FingerprintHasher,
+    MerkleTree,
+)
+
+
+class TestFingerprint:
+    def test_documented_layout(self) -> None:
+        tensor = torch.arange(6, dtype=torch.float32).reshape(2, 3)
+        expected = hashlib.sha256(
+            FINGERPRINT_PREFIX
+            + b"w\x00torch.float32\x002,3\x00"
+            + struct.pack("<Q", 24)
+            + tensor.numpy().tobytes()
+        ).hexdigest()
+        assertEqual(fingerprint_state_dict({"w": tensor}), expected)
+
+    def test_stable_order_and_sensitivity(self) -> None:
+        a, b = torch.randn(3, 2), torch.randn(4)
+        fingerprint = fingerprint_state_dict({"a": a, "b": b})
+        # insertion order does not matter
+        assertEqual(fingerprint_state_dict({"b": b, "a": a}), fingerprint)
+        # non-contiguous tensors hash like their contiguous copy
+        assertEqual(
+            fingerprint_state_dict({"a": a.t().contiguous().t(), "b": b}), fingerprint
+        )
+        # values, names and shapes are all committed to
+        changed = a.clone()
+        changed[0, 0] += 1
+        assertNotEqual(fingerprint_state_dict({"a": changed, "b": b}), fingerprint)
+        assertNotEqual(fingerprint_state_dict({"c": a, "b": b}), fingerprint)
+        assertNotEqual(
+            fingerprint_state_dict({"a": a.reshape(2, 3), "b": b}), fingerprint
+        )
+
+    def test_hasher(self) -> None:
+        state_dicts = [{"a": torch.randn(3, 2), "b": torch.randn(4)} for _ in range(5)]
+        hasher = FingerprintHasher(num_threads=2)
+        futures = [hasher.submit(state_dict) for state_dict in state_dicts]
+        assertEqual(
+            [future.result() for future in futures],
+            [fingerprint_state_dict(state_dict) for state_dict in state_dicts],
+        )
+        # holders of a hasher can be pickled, the copy starts its own threads
+        copy = pickle.loads(pickle.dumps(hasher))
+        hasher.close()
+        assertEqual(
+            copy.submit(state_dicts[0]).result(), fingerprint_state_dict(state_dicts[0])
+        )
+        copy.close()
+
+    def test_merkle_proofs(self) -> None:
+        for num_clients in [1, 2, 5, 8]:
+            fingerprints = {
+                f"client_{i}": hashlib.sha256(bytes([i])).hexdigest()
+                for i in range(num_clients)
+            }
+            tree = MerkleTree(fingerprints)
+            for client_id, fingerprint in fingerprints.items():
+                proof = tree.proof(client_id)
+                assertTrue(MerkleTree.verify(client_id, fingerprint, proof, tree.root))
+                # a different model does not verify against the same root
+                other = hashlib.sha256(b"other").hexdigest()
+                assertFalse(MerkleTree.verify(client_id, other, proof, tree.root))
+        # the root commits to every client
+        fingerprints["client_0"] = hashlib.sha256(b"other").hexdigest()
+        assertNotEqual(MerkleTree(fingerprints).root, tree.root)
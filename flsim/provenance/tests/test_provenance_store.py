@@ -0,0 +1,270 @@
+#!/usr/bin/env python3
+# Copyright (c) Meta Platforms, Inc. and affiliates.
+# All rights reserved.
+#
+# This source code is licensed under the BSD-style license found in the
+# LICENSE file in the root directory of this source tree.
+
+import os
+import sqlite3
+
+import pytest
+import torch
+from flsim.common.pytest_helper import (
+    assertEqual,
+    assertGreater,
+    assertIsInstance,
+    assertIsNotNone,
+    assertLess,
+    assertTrue,
+)
+from flsim.provenance.async_writer import GLOBAL_MODEL_CLIENT_ID, ProvenanceRecord
+from flsim.provenance.benchmark_stats import (
+    get_benchmark_stats,
+    insert_benchmark_stats,
+    write_benchmark_stats_csv,
+)
+from flsim.provenance.file_provenance_store import (
+    LocalFileProvenanceStore,
+    LocalFileProvenanceStoreConfig,
+)
+from flsim.provenance.fingerprint import fingerprint_state_dict
+from flsim.provenance.sqlite_provenance_store import (
+    SQLiteProvenanceStore,
+    SQLiteProvenanceStoreConfig,
+)
+from flsim.utils import test_utils as utils
+from hydra.utils import instantiate
+
+
+def _store_config(backend: str, tmp_path, **kwargs):
+    if backend == "sqlite":
+        return SQLiteProvenanceStoreConfig(
+            db_path=os.path.join(tmp_path, "provenance.db"), **kwargs
+        )
+    return LocalFileProvenanceStoreConfig(directory=str(tmp_path), **kwargs)
+
+
+def _round_records(
+    num_clients: int, round_num: int, perturb: bool = True, module=None
+):
+    """Global model of a round plus client models that each changed one tensor."""
+    global_model = utils.SampleNet(module or utils.TwoFC())
+    records = [
+        ProvenanceRecord.from_model(global_model, GLOBAL_MODEL_CLIENT_ID, 1, round_num)
+    ]
+    for i in range(num_clients):
+        record = ProvenanceRecord.from_model(global_model, f"client_{i}", 1, round_num)
+        if perturb:
+            name = next(iter(record.state_dict))
+            record.state_dict[name] += 1e-3 * (i + 1)
+        records.append(record)
+    return records
+
+
+def _assert_state_dict_equal(actual, expected) -> None:
+    assertEqual(list(actual), list(expected))
+    for name, tensor in expected.items():
+        assertEqual(actual[name].dtype, tensor.dtype)
+        assertTrue(torch.equal(actual[name], tensor))
+
+
+class TestProvenanceStore:
+    @pytest.mark.parametrize(
+        "backend, expected_type",
+        [("sqlite", SQLiteProvenanceStore), ("file", LocalFileProvenanceStore)],
+    )
+    def test_models_are_rebuilt_exactly(self, backend, expected_type, tmp_path) -> None:
+        store = instantiate(_store_config(backend, tmp_path))
+        assertIsInstance(store, expected_type)
+        store.open()
+        records = _round_records(num_clients=3, round_num=1)
+        store.write_models(records[:2])
+        store.write_models(records[2:])
+
+        for record in records:
+            _assert_state_dict_equal(
+                store.get_model(record.client_id, 1, 1), record.state_dict
+            )
+        assertTrue(store.get_model("client_0", 1, 2) is None)
+        assertGreater(store.get_size(), 0)
+        store.close()
+
+    @pytest.mark.parametrize("backend", ["sqlite", "file"])
+    def test_fingerprints(self, backend, tmp_path) -> None:
+        store = instantiate(_store_config(backend, tmp_path))
+        store.open()
+        model = utils.SampleNet(utils.TwoFC())
+        global_record = ProvenanceRecord.from_model(model, GLOBAL_MODEL_CLIENT_ID, 1, 1)
+        client_record = ProvenanceRecord(
+            client_id="client_0",
+            global_epoch_num=1,
+            global_round_num=1,
+            state_dict=None,
+            fingerprint=fingerprint_state_dict(model.fl_get_module().state_dict()),
+        )
+        store.write_models([global_record, client_record])
+        assertEqual(store.get_fingerprint("client_0", 1, 1), client_record.fingerprint)
+        assertTrue(store.get_model("client_0", 1, 1) is None)
+        assertTrue(store.get_fingerprint(GLOBAL_MODEL_CLIENT_ID, 1, 1) is None)
+        store.close()
+
+    @pytest.mark.parametrize("backend", ["sqlite", "file"])
+    def test_unchanged_tensors_are_stored_once(self, backend, tmp_path) -> None:
+        store = instantiate(_store_config(backend, tmp_path))
+        store.open()
+        records = _round_records(num_clients=5, round_num=1, perturb=False)
+        store.write_models(records)
+        # only the global model's tensors are stored
+        assertEqual(len(store._stored_hashes), len(records[0].state_dict))
+        store.close()
+
+    @pytest.mark.parametrize("compression", ["none", "zlib", "shuffle"])
+    def test_compression(self, compression, tmp_path) -> None:
+        store = instantiate(_store_config("file", tmp_path, compression=compression))
+        store.open()
+        records = _round_records(
+            num_clients=2, round_num=1, module=torch.nn.Linear(64, 32)
+        )
+        store.write_models(records)
+        for record in records:
+            _assert_state_dict_equal(
+                store.get_model(record.client_id, 1, 1), record.state_dict
+            )
+        model_bytes = sum(
+            t.numel() * t.element_size() for t in records[0].state_dict.values()
+        )
+        assertEqual(store.stats.model_bytes, len(records) * model_bytes)
+        if compression == "none":
+            # only the codec id is added to each blob
+            assertLess(store.stats.compression_ratio, 1.0)
+        else:
+            assertGreater(store.stats.compression_ratio, 1.0)
+        assertGreater(store.stats.storage_ratio, 1.0)
+        store.close()
+
+    def test_clients_are_stored_as_deltas(self, tmp_path) -> None:
+        # the segment-file store's size is exact, unlike SQLite's page count
+        store = instantiate(_store_config("file", tmp_path))
+        store.open()
+        records = _round_records(num_clients=1, round_num=1)
+        store.write_models(records[:1])
+        global_size = store.get_size()
+        store.write_models(records[1:])
+        # the client changed a single tensor by a tiny amount
+        assertLess(store.get_size() - global_size, global_size)
+        store.close()
+
+    def test_clear_on_start(self, tmp_path) -> None:
+        db_path = os.path.join(tmp_path, "provenance.db")
+        for _ in range(2):
+            store = instantiate(SQLiteProvenanceStoreConfig(db_path=db_path))
+            store.open()
+            store.write_models(_round_records(num_clients=2, round_num=1))
+            store.close()
+        connection = sqlite3.connect(db_path)
+        (count,) = connection.execute("SELECT COUNT(*) FROM models").fetchone()
+        connection.close()
+        assertEqual(count, 3)
+
+    def test_new_run_starts_new_segment(self, tmp_path) -> None:
+        config = LocalFileProvenanceStoreConfig(
+            directory=str(tmp_path), clear_on_start=False
+        )
+        for round_num in range(1, 3):
+            store = instantiate(config)
+            store.open()
+            store.write_models(_round_records(num_clients=1, round_num=round_num))
+            store.close()
+        assertEqual(len(store.segment_paths()), 2)
+        # models of both runs are readable from a fresh store
+        store = instantiate(config)
+        for round_num in range(1, 3):
+            assertIsNotNone(store.get_model("client_0", 1, round_num))
+
+    @pytest.mark.parametrize("backend", ["sqlite", "file"])
+    def test_queries(self, backend, tmp_path) -> None:
+        store = instantiate(_store_config(backend, tmp_path))
+        store.open()
+        for round_num in range(1, 4):
+            # client_1 only takes part in odd rounds
+            records = _round_records(num_clients=2, round_num=round_num)
+            if round_num % 2 == 0:
+                records = records[:2]
+            store.write_models(records)
+
+        assertEqual(store.get_lineage("client_0"), [(1, 1), (1, 2), (1, 3)])
+        assertEqual(store.get_lineage("client_1"), [(1, 1), (1, 3)])
+        assertEqual(store.get_lineage("unknown"), [])
+        contributions = store.get_round_contributions(1, 2)
+        assertEqual(list(contributions), ["client_0"])
+        _assert_state_dict_equal(
+            contributions["client_0"], store.get_model("client_0", 1, 2)
+        )
+        # pages end in the middle of rounds
+        streamed = list(store.iter_models(first=(1, 2), last=(1, 3), page_size=2))
+        assertEqual(
+            [(r.client_id, r.global_round_num) for r in streamed],
+            [
+                (GLOBAL_MODEL_CLIENT_ID, 2),
+                ("client_0", 2),
+                (GLOBAL_MODEL_CLIENT_ID, 3),
+                ("client_0", 3),
+                ("client_1", 3),
+            ],
+        )
+        for record in streamed:
+            _assert_state_dict_equal(
+                record.state_dict,
+                store.get_model(
+                    record.client_id, record.global_epoch_num, record.global_round_num
+                ),
+            )
+        store.close()
+
+    @pytest.mark.parametrize("backend", ["sqlite", "file"])
+    def test_replay_round(self, backend, tmp_path) -> None:
+        store = instantiate(_store_config(backend, tmp_path))
+        store.open()
+        records = _round_records(num_clients=3, round_num=1)
+        global_model = records[0].state_dict
+        for i, record in enumerate(records[1:]):
+            record.weight = float(i + 1)
+        # FedAvg: global - weighted mean of (global - client)
+        total_weight = sum(r.weight for r in records[1:])
+        next_global = {
+            name: tensor
+            - sum(r.weight * (tensor - r.state_dict[name]) for r in records[1:])
+            / total_weight
+            for name, tensor in global_model.items()
+        }
+        store.write_models(records)
+        store.write_models(
+            [ProvenanceRecord(GLOBAL_MODEL_CLIENT_ID, 1, 2, next_global)]
+        )
+
+        replayed = store.replay_round(1, 1)
+        for name, tensor in next_global.items():
+            assertTrue(torch.allclose(replayed[name], tensor, atol=1e-6))
+        assertTrue(store.verify_round(1, 1))
+        # an unweighted average leads to another model
+        assertTrue(not store.verify_round(1, 1, weighted=False))
+        with pytest.raises(ValueError):
+            store.replay_round(1, 2)
+        store.close()
+
+    def test_benchmark_stats(self, tmp_path) -> None:
+        store = instantiate(_store_config("sqlite", tmp_path))
+        for training_time in (1.5, 2.5):
+            insert_benchmark_stats(store, "runs", 2, 1, 10, 5, True, training_time, 3)
+        assertEqual(
+            get_benchmark_stats(store, "runs"),
+            [(2, 1, 10, 5, 1, 1.5, 3), (2, 1, 10, 5, 1, 2.5, 3)],
+        )
+        csv_path = os.path.join(tmp_path, "stats", "runs.csv")
+        write_benchmark_stats_csv(store, "runs", csv_path)
+        with open(csv_path) as csv_file:
+            assertEqual(len(csv_file.readlines()), 2)
+        store.close()
+        with pytest.raises(TypeError):
+            get_benchmark_stats(instantiate(_store_config("file", tmp_path)), "runs")
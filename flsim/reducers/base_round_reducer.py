@@ -21,7 +21,7 @@ import logging
 from dataclasses import dataclass
 from enum import IntEnum
 from itertools import chain
-from typing import Optional, Tuple
+from typing import Dict, Optional, Tuple
 
 import torch
 from flsim.channels.base_channel import IdentityChannel
@@ -164,9 +164,12 @@ class RoundReducer(IFLRoundReducer):
 
     def collect_update(self, delta: IFLModel, weight: float) -> None:
         # 0. Receive delta from client through channel
-        delta = self.receive_through_channel(delta)
+        message = self.channel.client_to_server(Message(delta))
         # 1. reduce the delta into local state
-        self.update_reduced_module(delta.fl_get_module(), weight)
+        if message.sparse_state_dict is not None and self.accepts_sparse_updates:
+            self.update_reduced_module_sparse(message.sparse_state_dict, weight)
+        else:
+            self.update_reduced_module(message.model.fl_get_module(), weight)
 
     def _reduce_all(self, op: OperationType = OperationType.SUM_AND_BROADCAST):
         """
@@ -238,10 +241,18 @@ class RoundReducer(IFLRoundReducer):
         device = next(self.reduced_module.parameters()).device
         self.sum_weights = torch.zeros(1, device=device, dtype=self.dtype)
 
-    def update_reduced_module(self, delta_module: nn.Module, weight: float) -> None:
+    def adjust_weight(self, weight: float) -> float:
+        """
+        Weight a client delta is reduced with, by both ``update_reduced_module``
+        and ``update_reduced_module_sparse``.
+        """
         # TODO num_samples is used as the default weight, this needs revisit
         if not self.is_weighted:
             weight = 1.0
+        return weight
+
+    def update_reduced_module(self, delta_module: nn.Module, weight: float) -> None:
+        weight = self.adjust_weight(weight)
         FLModelParamUtils.linear_comb_models(
             self.reduced_module,
             1.0,
@@ -259,6 +270,44 @@ class RoundReducer(IFLRoundReducer):
                 sum(p.abs().sum() for p in self.reduced_module.parameters()),
             )
 
+    def update_reduced_module_sparse(
+        self,
+        sparse_state_dict: Dict[str, Tuple[torch.Tensor, torch.Tensor]],
+        weight: float,
+    ) -> None:
+        """
+        Same as ``update_reduced_module`` for a delta given as the flat indices
+        and values of its non-zero entries (see ``Message.sparse_state_dict``),
+        in time proportional to their number (see
+        ``FLModelParamUtils.add_sparse_state_dict``).
+        """
+        weight = self.adjust_weight(weight)
+        FLModelParamUtils.add_sparse_state_dict(
+            self.reduced_module,
+            sparse_state_dict,
+            weight,
+            # pyre-fixme[16]: `RoundReducer` has no attribute `cfg`.
+            only_federated_params=self.cfg.only_federated_params,
+        )
+        self.sum_weights += weight
+
+    @property
+    def accepts_sparse_updates(self) -> bool:
+        """
+        Whether sparse deltas sent by the channel are reduced with
+        ``update_reduced_module_sparse`` instead of ``update_reduced_module``.
+        Subclasses that override ``update_reduced_module`` do not, as the sparse
+        path would skip their override; they can override ``adjust_weight``
+        to change the weight of deltas instead.
+        """
+        return not self._overrides_update_reduced_module(RoundReducer)
+
+    def _overrides_update_reduced_module(self, cls: type) -> bool:
+        """
+        Whether ``update_reduced_module`` is overridden below ``cls``.
+        """
+        return type(self).update_reduced_module is not cls.update_reduced_module
+
     @property
     def is_weighted(self):
         return self.cfg.reduction_type in (
@@ -87,6 +87,13 @@ class DPRoundReducer(RoundReducer):
             self.user_update_clipper.clip(delta_module)
         super().update_reduced_module(delta_module, weight)
 
+    @property
+    def accepts_sparse_updates(self) -> bool:
+        # deltas are clipped as a whole
+        return not self.privacy_on and not self._overrides_update_reduced_module(
+            DPRoundReducer
+        )
+
     def reduce(self) -> Tuple[nn.Module, float]:
         if not self.privacy_on:
             return super().reduce()
@@ -16,6 +16,7 @@ import pytest
 import torch.distributed as dist
 import torch.multiprocessing as mp
 from flsim.channels.message import Message
+from flsim.channels.sparse_mask_channel import SparseMaskChannelConfig
 from flsim.clients.base_client import Client, ClientConfig
 from flsim.common.pytest_helper import (
     assertAlmostEqual,
@@ -237,6 +238,69 @@ class TestRoundReducer(TestRoundReducerBase):
         )
         assertEqual(mismatched, "", mismatched)
 
+    @pytest.mark.parametrize("flatten", [False, True])
+    def test_collect_sparse_update(self, flatten: bool) -> None:
+        """
+        Sparse updates from the channel are reduced like their dense version.
+        """
+        global_model = utils.SampleNet(utils.TwoFC())
+        if flatten:
+            FLModelParamUtils.flatten_params(global_model.fl_get_module())
+        reducers = [
+            RoundReducer(
+                **OmegaConf.structured(RoundReducerConfig()),
+                global_model=global_model,
+                channel=instantiate(
+                    SparseMaskChannelConfig(
+                        proportion_of_zero_weights=0.6,
+                        sparsity_method="topk",
+                        sparse_updates=sparse_updates,
+                    )
+                ),
+            )
+            for sparse_updates in (False, True)
+        ]
+        for weight in (1.0, 3.0):
+            delta = utils.SampleNet(utils.TwoFC())
+            for rr in reducers:
+                rr.collect_update(FLModelParamUtils.clone(delta), weight)
+        (dense_model, dense_weight), (sparse_model, sparse_weight) = (
+            rr.current_results for rr in reducers
+        )
+        assertEqual(dense_weight, sparse_weight)
+        mismatched = FLModelParamUtils.get_mismatched_param(
+            [dense_model, sparse_model], 1e-6
+        )
+        assertEqual(mismatched, "", mismatched)
+
+    def test_sparse_updates_keep_overrides(self) -> None:
+        """
+        Reducers that override ``update_reduced_module`` reduce sparse updates
+        with their override.
+        """
+
+        class ScaledRoundReducer(RoundReducer):
+            def update_reduced_module(self, delta_module, weight: float) -> None:
+                super().update_reduced_module(delta_module, 2 * weight)
+
+        channel = instantiate(
+            SparseMaskChannelConfig(
+                proportion_of_zero_weights=0.6,
+                sparsity_method="topk",
+                sparse_updates=True,
+            )
+        )
+        rr = ScaledRoundReducer(
+            **OmegaConf.structured(
+                RoundReducerConfig(reduction_type=ReductionType.WEIGHTED_SUM)
+            ),
+            global_model=utils.SampleNet(utils.TwoFC()),
+            channel=channel,
+        )
+        assertFalse(rr.accepts_sparse_updates)
+        rr.collect_update(utils.SampleNet(utils.TwoFC()), 3.0)
+        assertEqual(rr.current_results[1], 6.0)
+
     def test_reduction_types_sum(self) -> None:
         model = utils.SampleNet(utils.TwoFC())
         rr = self.get_round_reducer(model, reduction_type=ReductionType.SUM)
@@ -659,6 +723,37 @@ class TestWeightedDPRoundReducer(TestRoundReducerBase):
             ref_module_after_noise, expected_param_values
         )
 
+    def test_sparse_updates_clamp_weights(self) -> None:
+        """
+        Sparse updates are reduced with clamped weights, like dense ones.
+        """
+        global_model = utils.SampleNet(utils.TwoFC())
+        reducers = []
+        for sparse_updates in (False, True):
+            reducer = self._get_reducer(global_model, clipping_value=float("inf"))
+            reducer.channel = instantiate(
+                SparseMaskChannelConfig(
+                    proportion_of_zero_weights=0.6,
+                    sparsity_method="topk",
+                    sparse_updates=sparse_updates,
+                )
+            )
+            reducers.append(reducer)
+        assertTrue(reducers[1].accepts_sparse_updates)
+        delta = utils.SampleNet(utils.TwoFC())
+        for rr in reducers:
+            # above max_weight
+            rr.collect_update(FLModelParamUtils.clone(delta), 100.0)
+        (dense_model, dense_weight), (sparse_model, sparse_weight) = (
+            rr.current_results for rr in reducers
+        )
+        assertEqual(dense_weight, 10.0)
+        assertEqual(sparse_weight, dense_weight)
+        mismatched = FLModelParamUtils.get_mismatched_param(
+            [dense_model, sparse_model], 1e-6
+        )
+        assertEqual(mismatched, "", mismatched)
+
     def test_clipped_models_weighted_sum(self) -> None:
         """
         Test when models get clipped with weighted sum
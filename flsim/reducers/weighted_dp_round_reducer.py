@@ -17,7 +17,6 @@ from flsim.reducers.dp_round_reducer import DPRoundReducer, DPRoundReducerConfig
 from flsim.utils.config_utils import fullclassname, init_self_cfg
 from flsim.utils.fl.common import FLModelParamUtils
 from omegaconf import MISSING
-from torch import nn
 
 
 class EstimatorType(IntEnum):
@@ -98,9 +97,8 @@ class WeightedDPRoundReducer(DPRoundReducer):
             weight = max(min(weight, self.max_weight), self.min_weight)
         return weight
 
-    def update_reduced_module(self, delta_module: nn.Module, weight: float) -> None:
-        weight = self.clamp_weight(weight)
-        super().update_reduced_module(delta_module, weight)
+    def adjust_weight(self, weight: float) -> float:
+        return super().adjust_weight(self.clamp_weight(weight))
 
     def check_total_weight(self, total_weight: float):
         r"""
@@ -6,6 +6,7 @@
 # LICENSE file in the root directory of this source tree.
 
 from enum import IntEnum
+from typing import Dict, Tuple
 
 import torch
 import torch.nn as nn
@@ -77,6 +78,29 @@ class Aggregator:
         FLModelParamUtils.add_model(delta, self._buffer_module, self._buffer_module)
         self._sum_weights += weight
 
+    def add_sparse_update(
+        self,
+        sparse_delta: Dict[str, Tuple[torch.Tensor, torch.Tensor]],
+        weight: float,
+    ):
+        """Update buffer module by adding a weighted model delta given as the flat
+        indices and values of its non-zero entries, in time proportional to their
+        number. Equivalent to `apply_weight_to_update` followed by `add_update`.
+
+        Args:
+            sparse_delta: (indices, values) pairs of the model delta, see
+                `Message.sparse_state_dict`.
+            weight: Aggregation weight to apply to this model delta.
+        """
+        weight = weight if self._is_weighted else 1.0
+        FLModelParamUtils.add_sparse_state_dict(
+            self._buffer_module,
+            sparse_delta,
+            weight,
+            only_federated_params=self.only_federated_params,
+        )
+        self._sum_weights += weight
+
     def apply_weight_to_update(self, delta: nn.Module, weight: float):
         """Add the weights (parameters) of a model delta to the buffer module.
 
@@ -93,9 +93,7 @@ class SyncFedShuffleServer(SyncServer):
             isinstance(self._active_user_selector, ImportanceSamplingActiveUserSelector)
             and len(self.samples_per_user) == 0
         ):
-            self.samples_per_user = [
-                user.num_train_examples() for user in data_provider.train_users()
-            ]
+            self.samples_per_user = data_provider.train_user_sample_counts()
 
         selected_clients = self._active_user_selector.get_user_indices(
             num_total_users=num_total_users,
@@ -194,6 +194,12 @@ class SyncServer(ISyncServer):
 
     def receive_update_from_client(self, message: Message):
         message = self._channel.client_to_server(message)
+        if message.sparse_state_dict is not None:
+            # only the entries kept by the channel are aggregated
+            self._aggregator.add_sparse_update(
+                message.sparse_state_dict, weight=message.weight
+            )
+            return
 
         self._aggregator.apply_weight_to_update(
             delta=message.model.fl_get_module(), weight=message.weight
@@ -292,6 +298,7 @@ class SyncPQServer(SyncServer):
                     self._channel.cfg.max_num_centroids,
                     self._channel.cfg.num_k_means_iter,
                     self._channel.cfg.verbose,
+                    num_threads=self._channel.cfg.num_threads,
                 )
                 centroids, _ = pq.encode(param.data.cpu())
                 seed_centroids[name] = centroids
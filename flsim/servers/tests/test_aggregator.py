@@ -9,6 +9,7 @@
 from tempfile import mkstemp
 
 import pytest
+import torch
 import torch.distributed as dist
 import torch.multiprocessing as mp
 from flsim.common.pytest_helper import (
@@ -182,6 +183,31 @@ class TestAggregator:
 
         assertEqual(ag.sum_weights.item(), expected_value)
 
+    @pytest.mark.parametrize(
+        "agg_type,expected_value",
+        [
+            (AggregationType.AVERAGE, 1.0),
+            (AggregationType.WEIGHTED_AVERAGE, 1.0),
+            (AggregationType.WEIGHTED_SUM, 55.0),
+            (AggregationType.SUM, 10.0),
+        ],
+    )
+    def test_add_sparse_update(self, agg_type, expected_value):
+        model = create_model_with_value(0)
+        ag = Aggregator(module=model, aggregation_type=agg_type)
+
+        ag.zero_weights()
+        for i in range(10):
+            sparse_delta = {
+                name: (torch.arange(param.numel()), param.reshape(-1))
+                for name, param in create_model_with_value(1.0).state_dict().items()
+            }
+            ag.add_sparse_update(sparse_delta, weight=i + 1)
+
+        model = ag.aggregate()
+        error_msg = model_parameters_equal_to_value(model, expected_value)
+        assertEmpty(error_msg, msg=error_msg)
+
     @pytest.mark.parametrize(
         "agg_type,dist_op",
         [
@@ -0,0 +1,295 @@
+#!/usr/bin/env python3
+# Copyright (c) Meta Platforms, Inc. and affiliates.
+# All rights reserved.
+#
+# This source code is licensed under the BSD-style license found in the
+# LICENSE file in the root directory of this source tree.
+
+"""
+Execution backends for the clients of a synchronous round, selected through
+``SyncTrainerConfig.client_update_backend``:
+
+    - ``serial``: clients train one after the other on the trainer thread.
+    - ``thread``: clients train in a pool of threads. Torch kernels release the
+      GIL, so clients train concurrently in the trainer's process.
+    - ``process``: clients train in a persistent pool of forked processes. The
+      global model and datasets go through shared memory, and each worker has
+      its own random generators. Channel stats collected in a worker are
+      replayed in the trainer's channel.
+
+Whatever the backend, results are consumed in client order: updates reach the
+server and batch metrics reach the metrics reporter in exactly the order of
+the serial loop, so aggregation does not depend on which client finishes first.
+Each worker runs torch ops on ``threads_per_worker`` intra-op threads (by
+default, the cores divided among the workers) so that workers do not
+oversubscribe the CPU.
+
+With ``cohort_size`` K > 1, clients train on the trainer thread K at a time,
+with their parameters stacked and their gradients computed together, see
+``flsim.clients.cohort``. Clients that cannot be trained in a cohort train on
+their own, still in client order.
+
+Training itself is bit for bit identical to the serial loop as long as clients
+do not share random generators across workers, and kernels whose reduction
+order depends on the thread count get as many threads as in the serial loop.
+Threads share torch's and Python's global generators. So with dropout or
+``shuffle_batch_order``, use the ``process`` backend with a client
+``random_seed`` for reproducible runs.
+"""
+
+from __future__ import annotations
+
+import collections
+import os
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+
+import torch
+import torch.multiprocessing
+from flsim.channels.communication_stats import ChannelStatsCollector
+from flsim.channels.message import Message
+from flsim.clients.base_client import Client
+from flsim.clients.cohort import can_train_in_cohort, train_cohort
+from flsim.interfaces.metrics_reporter import IFLBatchMetrics, IFLMetricsReporter
+from flsim.interfaces.model import IFLModel
+
+
+BACKENDS = ("serial", "thread", "process")
+# client fields that stay with the trainer's client object when a client trained
+# in another process, since workers only read them, or only use them while they
+# train (`ref_model` is the round's global model, not worth sending back)
+_SHARED_CLIENT_FIELDS = (
+    "dataset",
+    "channel",
+    "timeout_simulator",
+    "cuda_state_manager",
+    "model_pool",
+    "ref_model",
+)
+
+
+class RecordingMetricsReporter:
+    """Stands in for the trainer's metrics reporter while a client trains in a
+    worker, so that batch metrics can be replayed in client order.
+    """
+
+    def __init__(self):
+        self.batch_metrics: List[IFLBatchMetrics] = []
+
+    def add_batch_metrics(self, metrics: IFLBatchMetrics) -> None:
+        self.batch_metrics.append(metrics)
+
+
+class RecordingChannelStatsCollector(ChannelStatsCollector):
+    """Stands in for the stats collector of a client's channel while the client
+    trains in another process, so that message sizes can be replayed in the
+    trainer's channel.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.message_sizes: List[Tuple[float, bool]] = []
+
+    def collect_channel_stats(
+        self, message_size_bytes: float, client_to_server: bool = True
+    ):
+        self.message_sizes.append((message_size_bytes, client_to_server))
+
+
+def _generate_local_update(
+    client: Client, message: Message, record_metrics: bool, ship_state: bool
+) -> Tuple[
+    IFLModel,
+    float,
+    Optional[List[IFLBatchMetrics]],
+    Optional[Dict],
+    Optional[List[Tuple[float, bool]]],
+]:
+    reporter = RecordingMetricsReporter() if record_metrics else None
+    channel_stats = None
+    if ship_state and client.channel.stats_collector is not None:
+        # the channel is the worker's copy, stats collected here would be lost
+        channel_stats = RecordingChannelStatsCollector()
+        client.channel.stats_collector = channel_stats
+    # pyre-ignore[6]: only `add_batch_metrics` is called on client reporters
+    delta, weight = client.generate_local_update(message, metrics_reporter=reporter)
+    state = None
+    if ship_state:
+        state = {
+            k: v for k, v in vars(client).items() if k not in _SHARED_CLIENT_FIELDS
+        }
+    return (
+        delta,
+        weight,
+        reporter.batch_metrics if reporter else None,
+        state,
+        channel_stats.message_sizes if channel_stats else None,
+    )
+
+
+def _init_worker(num_threads: int) -> None:
+    torch.set_num_threads(num_threads)
+
+
+class ClientUpdateExecutor:
+    """Runs ``Client.generate_local_update`` for the clients of a round.
+
+    Args:
+        backend: One of ``BACKENDS``.
+        num_workers: Clients training at the same time.
+        threads_per_worker: Intra-op threads of each worker. Defaults to the
+            number of cores divided by ``num_workers``.
+        cohort_size: Clients trained together by the ``serial`` backend.
+    """
+
+    def __init__(
+        self,
+        backend: str = "serial",
+        num_workers: int = 1,
+        threads_per_worker: Optional[int] = None,
+        cohort_size: int = 1,
+    ):
+        if backend not in BACKENDS:
+            raise ValueError(f"Unknown client update backend {backend}")
+        assert num_workers >= 1, "num_workers must be at least 1"
+        assert cohort_size >= 1, "cohort_size must be at least 1"
+        self.backend = backend if num_workers > 1 else "serial"
+        if cohort_size > 1 and self.backend != "serial":
+            raise ValueError("Cohort training requires the serial backend")
+        self.cohort_size = cohort_size
+        self.num_workers = num_workers
+        self.threads_per_worker = threads_per_worker or max(
+            1, (os.cpu_count() or 1) // num_workers
+        )
+        self._pool: Optional[Executor] = None
+
+    def _get_pool(self) -> Executor:
+        if self._pool is None:
+            if self.backend == "thread":
+                self._pool = ThreadPoolExecutor(
+                    self.num_workers,
+                    thread_name_prefix="flsim-client",
+                    initializer=_init_worker,
+                    initargs=(self.threads_per_worker,),
+                )
+            else:
+                # fork so that workers start from the trainer's memory; tensors
+                # sent to them are moved to shared memory by torch's pickler
+                self._pool = ProcessPoolExecutor(
+                    self.num_workers,
+                    mp_context=torch.multiprocessing.get_context("fork"),
+                    initializer=_init_worker,
+                    initargs=(self.threads_per_worker,),
+                )
+        return self._pool
+
+    def generate_local_updates(
+        self,
+        clients: Iterable[Client],
+        message: Message,
+        metrics_reporter: Optional[IFLMetricsReporter] = None,
+    ) -> Iterator[Tuple[Client, IFLModel, float]]:
+        """Yields (client, delta, weight) for each client, in client order.
+
+        Batch metrics of a client are added to ``metrics_reporter`` before its
+        update is yielded, and at most ``2 * num_workers`` updates are pending
+        at any time.
+        """
+        if self.cohort_size > 1:
+            yield from self._generate_cohort_updates(clients, message, metrics_reporter)
+            return
+        if self.backend == "serial":
+            for client in clients:
+                delta, weight = client.generate_local_update(
+                    message=message, metrics_reporter=metrics_reporter
+                )
+                yield client, delta, weight
+            return
+
+        pool = self._get_pool()
+        record_metrics = metrics_reporter is not None
+        ship_state = self.backend == "process"
+        pending = collections.deque()
+        num_threads = torch.get_num_threads()
+        if self.backend == "thread":
+            # intra-op threads are per calling thread, keep the total bounded
+            torch.set_num_threads(self.threads_per_worker)
+        try:
+            for client in clients:
+                pending.append(
+                    (
+                        client,
+                        pool.submit(
+                            _generate_local_update,
+                            client,
+                            message,
+                            record_metrics,
+                            ship_state,
+                        ),
+                    )
+                )
+                if len(pending) >= 2 * self.num_workers:
+                    yield self._collect(*pending.popleft(), metrics_reporter)
+            while pending:
+                yield self._collect(*pending.popleft(), metrics_reporter)
+        finally:
+            for _, future in pending:
+                future.cancel()
+            torch.set_num_threads(num_threads)
+
+    def _generate_cohort_updates(
+        self,
+        clients: Iterable[Client],
+        message: Message,
+        metrics_reporter: Optional[IFLMetricsReporter],
+    ) -> Iterator[Tuple[Client, IFLModel, float]]:
+        cohort = []
+
+        def flush():
+            if len(cohort) == 1:
+                updates = [cohort[0].generate_local_update(message, metrics_reporter)]
+            else:
+                updates = train_cohort(cohort, message, metrics_reporter)
+            for client, (delta, weight) in zip(cohort, updates):
+                yield client, delta, weight
+            cohort.clear()
+
+        for client in clients:
+            if can_train_in_cohort(client, message.model):
+                cohort.append(client)
+                if len(cohort) == self.cohort_size:
+                    yield from flush()
+                continue
+            # keeps client order: the pending cohort trains first
+            if cohort:
+                yield from flush()
+            delta, weight = client.generate_local_update(message, metrics_reporter)
+            yield client, delta, weight
+        if cohort:
+            yield from flush()
+
+    @staticmethod
+    def _collect(
+        client: Client, future, metrics_reporter: Optional[IFLMetricsReporter]
+    ) -> Tuple[Client, IFLModel, float]:
+        delta, weight, batch_metrics, state, channel_stats = future.result()
+        if state is not None:
+            # the trainer's client object reflects the training done in the worker
+            client.__dict__.update(state)
+        for message_size_bytes, client_to_server in channel_stats or []:
+            client.channel.stats_collector.collect_channel_stats(
+                message_size_bytes, client_to_server=client_to_server
+            )
+        for metrics in batch_metrics or []:
+            # pyre-ignore[16]: `metrics_reporter` is set when metrics are recorded
+            metrics_reporter.add_batch_metrics(metrics)
+        return client, delta, weight
+
+    def close(self) -> None:
+        if self._pool is not None:
+            self._pool.shutdown()
+            self._pool = None
+
+    def __getstate__(self) -> Dict[str, Any]:
+        # trainers holding an executor stay picklable
+        return {**self.__dict__, "_pool": None}
@@ -81,9 +81,14 @@ class PrivateSyncTrainer(SyncTrainer):
         """This function is used to create clients in a round. Thus, it
         is called UPR * num_rounds times per training run. Here, we use
         <code>OmegaConf.structured</code> instead of <code>hydra.instantiate</code>
-        to minimize the overhead of hydra object creation.
+        to minimize the overhead of hydra object creation. Clients are reused
+        from ``self.clients`` like in ``SyncTrainer``, keeping their privacy
+        budget across rounds.
         """
-        self.clients[dataset_id] = DPClient(
+        client = self.clients.get(dataset_id)
+        if client is not None:
+            return client
+        client = DPClient(
             # pyre-ignore [16]: `PrivateSyncTrainer` has no attribute `cfg`
             **OmegaConf.structured(self.cfg.client),
             dataset=datasets[dataset_id],
@@ -92,7 +97,9 @@ class PrivateSyncTrainer(SyncTrainer):
             store_last_updated_model=self.cfg.report_client_metrics,
             channel=self.channel,
         )
-        return self.clients[dataset_id]
+        client.model_pool = self.client_model_pool
+        self.clients[dataset_id] = client
+        return client
 
     def calc_post_aggregation_train_metrics(
         self,
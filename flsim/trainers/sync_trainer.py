@@ -7,12 +7,10 @@
 
 from __future__ import annotations
 from datetime import datetime
-import gzip
 import io
 import json
 import sys
 import threading
-import hashlib
 #import tenseal as ts
 
 import logging
@@ -21,26 +19,32 @@ import random
 from dataclasses import dataclass
 from time import time
 from typing import Any, Dict, Iterable, List, Optional, Tuple
-from flsim import mysql_database_helper
-from flsim import database_helper
 
 import torch
-from flsim.database_helper import delete_table, insert_model
-from flsim.mysql_database_helper import delete_table, insert_model
 from flsim.channels.message import Message
 from flsim.clients.base_client import Client
+from flsim.clients.client_cache import ClientCache
 from flsim.clients.dp_client import DPClient, DPClientConfig
 from flsim.common.timeline import Timeline
 from flsim.data.data_provider import IFLDataProvider
 from flsim.interfaces.metrics_reporter import IFLMetricsReporter, Metric, TrainingStage
 from flsim.interfaces.model import IFLModel
+from flsim.provenance.async_writer import AsyncProvenanceWriter
+from flsim.provenance.capture_policy import (
+    AllClientsCapturePolicyConfig,
+    ProvenanceCapturePolicyConfig,
+)
+from flsim.provenance.provenance_store import ProvenanceStoreConfig
+from flsim.provenance.sqlite_provenance_store import SQLiteProvenanceStoreConfig
 from flsim.servers.sync_dp_servers import SyncDPSGDServer
 from flsim.servers.sync_secagg_servers import SyncSecAggServer
 from flsim.servers.sync_servers import FedAvgOptimizerConfig, SyncServerConfig
+from flsim.trainers.client_update_executor import ClientUpdateExecutor
 from flsim.trainers.trainer_base import FLTrainer, FLTrainerConfig
 from flsim.utils.config_utils import fullclassname, init_self_cfg, is_target
 from flsim.utils.distributed.fl_distributed import FLDistributedUtils
 from flsim.utils.fl.common import FLModelParamUtils
+from flsim.utils.fl.model_pool import ModelPool
 from flsim.utils.fl.stats import RandomVariableStatsTracker
 from hydra.utils import instantiate
 from omegaconf import OmegaConf
@@ -69,16 +73,39 @@ class SyncTrainer(FLTrainer):
         )
 
         super().__init__(model=model, cuda_enabled=cuda_enabled, **kwargs)
+        if self.cfg.flat_params:
+            # before the server and clients clone the global model, so that all
+            # of their copies are flattened alike
+            FLModelParamUtils.flatten_params(model.fl_get_module())
         self.server = instantiate(
             # pyre-ignore[16]
             self.cfg.server,
             global_model=model,
             channel=self.channel,
         )
-        # Dictionary that maps a dataset ID to the associated client object:
+        # Where intermediate client models are persisted when training with
+        # `store_intermediate_models`; no connection is made until training starts
+        self.provenance_store = instantiate(self.cfg.provenance_store)
+        self.provenance_capture = instantiate(self.cfg.provenance_capture)
+        # LRU cache that maps a dataset ID to the associated client object:
         # Key: dataset_id
         # Value: client object
-        self.clients = {}
+        self.clients = ClientCache(self.cfg.client_cache_size)
+        # scratch copies of the global model that clients train, reused across
+        # clients and rounds when `pool_client_models` is set
+        self.client_model_pool: Optional[ModelPool] = (
+            ModelPool() if self.cfg.pool_client_models else None
+        )
+        # Runs the local updates of a round's clients, possibly concurrently
+        assert not (
+            cuda_enabled and self.cfg.client_update_backend == "process"
+        ), "The process client update backend does not support CUDA"
+        self.client_update_executor = ClientUpdateExecutor(
+            backend=self.cfg.client_update_backend,
+            num_workers=self.cfg.num_client_workers,
+            threads_per_worker=self.cfg.client_worker_threads,
+            cohort_size=self.cfg.client_cohort_size,
+        )
         self._last_report_round_after_aggregation = 0
 
     @classmethod
@@ -88,6 +115,10 @@ class SyncTrainer(FLTrainer):
         """
         if OmegaConf.is_missing(cfg.server, "_target_"):
             cfg.server = SyncServerConfig(optimizer=FedAvgOptimizerConfig())
+        if OmegaConf.is_missing(cfg.provenance_store, "_target_"):
+            cfg.provenance_store = SQLiteProvenanceStoreConfig()
+        if OmegaConf.is_missing(cfg.provenance_capture, "_target_"):
+            cfg.provenance_capture = AllClientsCapturePolicyConfig()
 
     def global_model(self) -> IFLModel:
         """Returns global model.
@@ -129,10 +160,14 @@ class SyncTrainer(FLTrainer):
                 client index.
             datasets: Data provider object to output training clients.
         Returns:
-            Client object associated with `dataset_id`. In addition, also modify
-                `self.clients` dictionary by adding a key-value pair of
-                (dataset ID, client object).
+            Client object associated with `dataset_id`, reused from `self.clients`
+                if it is still cached. Otherwise a new client is created, with the
+                state spilled when a previous client for `dataset_id` was evicted,
+                and added to `self.clients`.
         """
+        client = self.clients.get(dataset_id)
+        if client is not None:
+            return client
         if self.is_sample_level_dp:
             # Differentially private client (sample-level)
             client = DPClient(
@@ -155,8 +190,9 @@ class SyncTrainer(FLTrainer):
                 channel=self.channel,
                 cuda_manager=self._cuda_state_manager,
             )
+        client.model_pool = self.client_model_pool
         self.clients[dataset_id] = client
-        return self.clients[dataset_id]
+        return client
 
     def train(
         self,
@@ -195,12 +231,6 @@ class SyncTrainer(FLTrainer):
             all users in a given epoch.
         """
         # Set up synchronization utilities for distributed training
-        # database_helper.delete_table('model_databases/flsim_single_node_models.db', 'cifar10_models')
-        print("Clearing model database")
-        mysql_database_helper.delete_table('localhost', 'michgu', 'test', 'benchmarks', 'models')
-        mysql_database_helper.delete_table('localhost', 'michgu', 'test', 'benchmarks', 'encrypted_models')
-        mysql_database_helper.delete_table('localhost', 'michgu', 'test', 'benchmarks', 'hashed_models')
-       
         FLDistributedUtils.setup_distributed_training(
             distributed_world_size, use_cuda=self.cuda_enabled
         )  # TODO do not call distributed utils here, this is upstream responsibility
@@ -227,6 +257,11 @@ class SyncTrainer(FLTrainer):
         # torch.multinomial requires int instead of float; cast it as int
         users_per_round_on_worker = int(users_per_round / distributed_world_size)
         self._validate_users_per_round(users_per_round_on_worker, num_users_on_worker)
+        if self.cfg.client_cache_size is None and not self.cfg.report_client_metrics:
+            # keep the clients of one round, overselected ones included
+            self.clients.capacity = math.ceil(
+                users_per_round_on_worker / self.cfg.dropout_rate
+            )
 
         self.logger.info("Start training")
         if self.logger.isEnabledFor(logging.DEBUG):
@@ -239,6 +274,9 @@ class SyncTrainer(FLTrainer):
             )
 
         # Main training loop
+        provenance_writer = (
+            self._create_provenance_writer() if store_intermediate_models else None
+        )
         num_int_epochs = math.ceil(self.cfg.epochs)
         for epoch in tqdm(
             range(1, num_int_epochs + 1), desc="Epoch", unit="epoch", position=0
@@ -280,6 +318,34 @@ class SyncTrainer(FLTrainer):
                     # Training on selected clients for this round; also calculate training
                     # metrics on `agg_metric_clients`
                     self.logger.info(f"# clients/round on worker {rank}: {len(clients)}.")
+                    if provenance_writer is not None:
+                        # Client models of this round are stored as deltas against
+                        # the global model they started from
+                        self.provenance_capture.capture_global_model(
+                            provenance_writer, self.global_model(), timeline
+                        )
+                        # clients only copy their updated model if it is captured,
+                        # and only hash it if its fingerprint is
+                        self.provenance_capture.start_round(
+                            [str(client._name) for client in clients]
+                        )
+                        fingerprint = (
+                            self.provenance_capture.fingerprints_client_models()
+                        )
+                        # process workers hash in place, in parallel already
+                        fingerprint_hasher = (
+                            self.provenance_capture.fingerprint_hasher
+                            if self.client_update_executor.backend != "process"
+                            else None
+                        )
+                        for client in clients:
+                            client.snapshot_updated_model = (
+                                self.provenance_capture.captures_client_model(
+                                    str(client._name)
+                                )
+                            )
+                            client.fingerprint_updated_model = fingerprint
+                            client.fingerprint_hasher = fingerprint_hasher
                     self._train_one_round(
                         timeline=timeline,
                         clients=clients,
@@ -290,36 +356,35 @@ class SyncTrainer(FLTrainer):
                         else None,
                     )
 
-                    if store_intermediate_models:
-                        # INSERT ITERATIVE MODEL INTO DB HERE
-                        for client in clients:
-                            model = client.last_updated_model
-                            if model is not None:
-                                # multithreading
-                                # thread1 = threading.Thread(target=mysql_database_helper.insert_model, 
-                                #      args=('localhost', 'michgu', 'test', 'benchmarks', 'models', model.fl_get_module().state_dict(), str(client._name), epoch, round))
-                                # thread1.start()
-                                
-                                # multithreading with crypto
-                                # buffer = io.BytesIO()
-                                # torch.save(model.fl_get_module().state_dict(), buffer)
-                                # buffer.seek(0)
-                                # data = buffer.read()
-                                # model_hash = hashlib.sha256(data).hexdigest()
-                                # thread2 = threading.Thread(target=mysql_database_helper.insert_model_crypto, 
-                                #     args=('localhost', 'michgu', 'test', 'benchmarks', 'hashes', model_hash, str(client._name), epoch, round))
-                                # thread2.start()
-
-                                # crypto
-                                # buffer = io.BytesIO()
-                                # torch.save(model.fl_get_module().state_dict(), buffer)
-                                # buffer.seek(0)
-                                # data = buffer.read()
-                                # model_hash = hashlib.sha256(data).hexdigest()
-                                # mysql_database_helper.insert_model_crypto('localhost', 'michgu', 'test','benchmarks', 'models', model_hash, str(client._name), epoch, round)
-
-                                # vanilla
-                                mysql_database_helper.insert_model('localhost', 'michgu', 'test','benchmarks', 'models', model.fl_get_module().state_dict(), str(client._name), epoch, round)
+                    if provenance_writer is not None:
+                        # Snapshots were taken on the training thread; serialization
+                        # and the database write happen on the writer thread, and
+                        # the snapshots are released once written
+                        snapshots = [
+                            (str(client._name), client.pop_updated_snapshot())
+                            for client in clients
+                        ]
+                        fingerprints = [
+                            (str(client._name), client.pop_updated_fingerprint())
+                            for client in clients
+                        ]
+                        weights = {
+                            str(client._name): client.last_update_weight
+                            for client in clients
+                        }
+                        self.provenance_capture.capture_client_models(
+                            provenance_writer,
+                            [(n, sd) for n, sd in snapshots if sd is not None],
+                            timeline,
+                            weights=weights,
+                        )
+                        if fingerprint:
+                            self.provenance_capture.capture_client_fingerprints(
+                                provenance_writer,
+                                [(n, f) for n, f in fingerprints if f is not None],
+                                timeline,
+                                weights=weights,
+                            )
                     if self.logger.isEnabledFor(logging.DEBUG):
                         norm = FLModelParamUtils.debug_model_norm(
                             self.global_model().fl_get_module()
@@ -360,32 +425,9 @@ class SyncTrainer(FLTrainer):
                 ):
                     break
 
-            # encrypt global model and insert
-            # startEncrypt = datetime.now()
-            # model = self.global_model().fl_get_module().state_dict()
-            # context = ts.context(
-            #             ts.SCHEME_TYPE.CKKS,
-            #             poly_modulus_degree=8192,
-            #             coeff_mod_bit_sizes=[60, 40, 40, 60]
-            #         )
-            # context.global_scale = 2**40
-
-            # encrypted_model = {}
-            # for key, value in model.items():
-            #     flat_list = value.flatten().tolist()
-            #     encrypted_vector = ts.ckks_vector(context, flat_list)
-            #     serialized_vector = encrypted_vector.serialize()
-            #     encrypted_model[key] = serialized_vector
-            
-            # endEncrypt = datetime.now()
-            # encryption_time = (startEncrypt - endEncrypt).total_seconds()
-
-            # print("values size: " + str(sys.getsizeof(encrypted_model)))
-
-            # mysql_database_helper.insert_model_encrypted('localhost', 'michgu', 'test','benchmarks', 'encrypted_models', encrypted_model, encryption_time)
-            
-            # calculate amount of time encryption and insertion took
-            
+            if provenance_writer is not None:
+                provenance_writer.flush()
+
             # pyre-fixme[61]: `timeline` may not be initialized here.
             # Report evaluation metrics for client-side models
             self._report_post_epoch_client_metrics(timeline, metrics_reporter)
@@ -398,11 +440,33 @@ class SyncTrainer(FLTrainer):
             ):
                 break
 
+        self.client_update_executor.close()
+        if provenance_writer is not None:
+            self.provenance_capture.close()
+            provenance_writer.close()
+            self.provenance_store.close()
+            self.logger.info(
+                f"Provenance capture with {type(self.provenance_capture).__name__}: "
+                f"{self.provenance_capture.stats.as_dict()}, "
+                f"store: {self.provenance_store.stats.as_dict()}"
+            )
+
         if rank == 0 and best_metric is not None:
             self._save_model_and_metrics(self.global_model(), best_model_state)
 
         return self.global_model(), best_metric
 
+    def _create_provenance_writer(self) -> AsyncProvenanceWriter:
+        """Opens the provenance store and creates the background writer that
+        persists intermediate client models into it.
+        """
+        self.provenance_store.open()
+        return AsyncProvenanceWriter(
+            self.provenance_store.write_models,
+            max_queue_size=self.provenance_store.cfg.max_queue_size,
+            batch_size=self.provenance_store.cfg.batch_size,
+        )
+
     def stop_fl_training(self, *, epoch, round, num_rounds_in_epoch) -> bool:
         """Stops FL training when the necessary number of steps/epochs have been
         completed in case of fractional epochs or if clients time out.
@@ -473,13 +537,24 @@ class SyncTrainer(FLTrainer):
         server_state_message: Message,
         metrics_reporter: Optional[IFLMetricsReporter] = None,
     ) -> None:
-        """Update each client-side model from server message."""
-        for client in clients:
-            client_delta, weight = client.generate_local_update(
-                message=server_state_message,
-                metrics_reporter=metrics_reporter,
-            )
+        """Update each client-side model from server message. Clients may train
+        concurrently (see `client_update_backend`) or in cohorts (see
+        `client_cohort_size`), but their updates always reach the server in
+        client order.
+        """
+        updates = self.client_update_executor.generate_local_updates(
+            clients, server_state_message, metrics_reporter
+        )
+        for client, client_delta, weight in updates:
             self.server.receive_update_from_client(Message(client_delta, weight))
+            # the delta was trained in a pooled model, which the server is done
+            # with, unless the client keeps its optimizer (and so its params)
+            if (
+                self.client_model_pool is not None
+                # pyre-fixme[16]: `Client` has no attribute `cfg`.
+                and not client.cfg.store_models_and_optimizers
+            ):
+                self.client_model_pool.release(client_delta)
 
     def _train_one_round(
         self,
@@ -936,3 +1011,30 @@ class SyncTrainerConfig(FLTrainerConfig):
     # how many times per epoch should we report client metrics
     # numbers greater than 1 help with plotting more precise training curves
     client_metrics_reported_per_epoch: int = 1
+    # max number of client objects kept between selections; evicted clients only
+    # keep a few fields (see `ClientCache`). If None, the clients of one round
+    # are kept, or every client when `report_client_metrics` is set since client
+    # metrics are computed over all of them
+    client_cache_size: Optional[int] = None
+    # how the clients of a round train: "serial", or concurrently with "thread"
+    # or "process" (see `client_update_executor`)
+    client_update_backend: str = "serial"
+    # number of clients training at the same time with a concurrent backend
+    num_client_workers: int = 1
+    # intra-op threads per worker; defaults to the cores divided among workers
+    client_worker_threads: Optional[int] = None
+    # keep the global model and every copy of it in one contiguous buffer, so
+    # that deltas and aggregation run as single vector ops (see `ParamArena`)
+    flat_params: bool = False
+    # train clients in scratch copies of the global model that are reused across
+    # clients and rounds instead of cloning it for each client (see
+    # `ModelPool`). Servers must not keep client deltas after receiving them
+    pool_client_models: bool = False
+    # number of clients trained together with stacked parameters on the serial
+    # backend; clients that do not train with plain SGD train on their own
+    # (see `flsim.clients.cohort`)
+    client_cohort_size: int = 1
+    # where intermediate client models are stored with `store_intermediate_models`
+    provenance_store: ProvenanceStoreConfig = ProvenanceStoreConfig()
+    # which models of each round are stored with `store_intermediate_models`
+    provenance_capture: ProvenanceCapturePolicyConfig = ProvenanceCapturePolicyConfig()
@@ -21,7 +21,10 @@ from flsim.common.timeline import Timeline
 from flsim.common.timeout_simulator import GaussianTimeOutSimulatorConfig
 from flsim.interfaces.metrics_reporter import Channel, TrainingStage
 from flsim.interfaces.model import IFLModel
-from flsim.metrics_reporter.tensorboard_metrics_reporter import FLMetricsReporter
+from flsim.metrics_reporter.tensorboard_metrics_reporter import (
+    ClassificationAccumulator,
+    FLMetricsReporter,
+)
 from flsim.optimizers.async_aggregators import (
     AsyncAggregatorConfig,
     FedAdamAsyncAggregatorConfig,
@@ -71,6 +74,9 @@ class TestMetricsReporter(MetricsReporterWithMockedChannels):
     training, metrics have zeroes
     """
 
+    def __init__(self) -> None:
+        super().__init__(store_batch_metrics=True)
+
     def reset(self) -> None:
         pass
 
@@ -81,6 +87,7 @@ class ConcurrencyMetricsReporter(FLMetricsReporter):
     def __init__(self, channels: List[Channel]) -> None:
         self.concurrency_metrics = []
         self.eval_rounds = []
+        self.accumulator = ClassificationAccumulator()
         super().__init__(channels)
 
     def compare_metrics(self, eval_metrics, best_metrics):
@@ -89,28 +96,15 @@ class ConcurrencyMetricsReporter(FLMetricsReporter):
             return True
         return eval_metrics > best_metrics
 
-    def compute_scores(self) -> Dict[str, Any]:
-        # compute accuracy
-        correct = torch.Tensor([0])
-        for i in range(len(self.predictions_list)):
-            all_preds = self.predictions_list[i]
-            pred = all_preds.data.max(1, keepdim=True)[1]
-
-            assert pred.device == self.targets_list[i].device, (
-                f"Pred and targets moved to different devices: "
-                f"pred >> {pred.device} vs. targets >> {self.targets_list[i].device}"
-            )
-            if i == 0:
-                correct = correct.to(pred.device)
-
-            correct += pred.eq(self.targets_list[i].data.view_as(pred)).sum()
-
-        # total number of data
-        total = sum(len(batch_targets) for batch_targets in self.targets_list)
+    def update_accumulators(self, metrics) -> None:
+        self.accumulator.update(metrics.predictions, metrics.targets)
 
-        accuracy = 100.0 * correct.item() / total
+    def compute_scores(self) -> Dict[str, Any]:
+        return {self.ACCURACY: self.accumulator.accuracy()}
 
-        return {self.ACCURACY: accuracy}
+    def reset(self) -> None:
+        super().reset()
+        self.accumulator.reset()
 
     def create_eval_metrics(
         self, scores: Dict[str, Any], total_loss: float, **kwargs
@@ -0,0 +1,107 @@
+#!/usr/bin/env python3
+# Copyright (c) Meta Platforms, Inc. and affiliates.
+# All rights reserved.
+#
+# This source code is licensed under the BSD-style license found in the
+# LICENSE file in the root directory of this source tree.
+
+import pytest
+import torch
+from flsim.channels.base_channel import FLChannelConfig
+from flsim.channels.communication_stats import ChannelDirection
+from flsim.channels.message import Message
+from flsim.clients.base_client import Client, ClientConfig
+from flsim.common.pytest_helper import assertEqual, assertTrue
+from flsim.trainers.client_update_executor import ClientUpdateExecutor
+from flsim.utils import test_utils as utils
+from hydra.utils import instantiate
+from omegaconf import OmegaConf
+
+
+def _clients(num_clients: int, channel=None):
+    torch.manual_seed(0)
+    clients = []
+    for i in range(num_clients):
+        # clients have different amounts of data, so they finish out of order
+        dataset = [torch.rand(5, 2) for _ in range(i % 3 + 1)]
+        clients.append(
+            Client(
+                **OmegaConf.structured(ClientConfig()),
+                dataset=utils.DummyUserData(
+                    utils.DatasetFromList(dataset), utils.SampleNet(utils.TwoFC())
+                ),
+                channel=channel,
+                name=f"client_{i}",
+                store_last_updated_model=False,
+            )
+        )
+    return clients
+
+
+def _updates(executor: ClientUpdateExecutor, num_clients: int = 7, clients=None):
+    torch.manual_seed(1)
+    global_model = utils.SampleNet(utils.TwoFC())
+    updates = [
+        (client.name, delta.fl_get_module().state_dict(), weight)
+        for client, delta, weight in executor.generate_local_updates(
+            clients or _clients(num_clients), Message(global_model)
+        )
+    ]
+    executor.close()
+    return updates
+
+
+def _assert_same_updates(expected, actual) -> None:
+    # same clients, same order, same bits
+    assertEqual([u[0] for u in actual], [u[0] for u in expected])
+    assertEqual([u[2] for u in actual], [u[2] for u in expected])
+    for (_, expected_state, _), (_, actual_state, _) in zip(expected, actual):
+        for name, tensor in expected_state.items():
+            assertTrue(torch.equal(actual_state[name], tensor))
+
+
+class TestClientUpdateExecutor:
+    def test_thread_backend_matches_serial(self) -> None:
+        serial = _updates(ClientUpdateExecutor())
+        threaded = _updates(
+            ClientUpdateExecutor(
+                "thread", num_workers=3, threads_per_worker=torch.get_num_threads()
+            )
+        )
+        _assert_same_updates(serial, threaded)
+
+    def test_process_backend_matches_serial(self) -> None:
+        serial = _updates(ClientUpdateExecutor())
+        clients = _clients(7)
+        processed = _updates(
+            ClientUpdateExecutor("process", num_workers=3, threads_per_worker=1),
+            clients=clients,
+        )
+        _assert_same_updates(serial, processed)
+        # the state of clients trained in workers is restored, except for the
+        # round's global model, which is not sent back
+        for client in clients:
+            assertEqual(client.times_selected, 1)
+            assertTrue(client.ref_model is None)
+
+    def test_process_backend_channel_stats(self) -> None:
+        stats = []
+        for executor in (
+            ClientUpdateExecutor(),
+            ClientUpdateExecutor("process", num_workers=3, threads_per_worker=1),
+        ):
+            channel = instantiate(FLChannelConfig(report_communication_metrics=True))
+            _updates(executor, clients=_clients(7, channel=channel))
+            stats.append(channel.stats_collector.get_channel_stats())
+        serial, processed = stats
+        for direction, tracker in serial.items():
+            assertEqual(processed[direction].num_samples, tracker.num_samples)
+            assertEqual(processed[direction].mean(), tracker.mean())
+        assertEqual(processed[ChannelDirection.SERVER_TO_CLIENT].num_samples, 7)
+
+    def test_single_worker_is_serial(self) -> None:
+        assertEqual(ClientUpdateExecutor("thread", num_workers=1).backend, "serial")
+
+    def test_unknown_backend(self) -> None:
+        with pytest.raises(ValueError):
+            ClientUpdateExecutor("gpu")
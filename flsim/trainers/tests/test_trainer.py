@@ -8,7 +8,10 @@
 import copy
 import json
 import math
+from collections import OrderedDict
+from dataclasses import dataclass
 from typing import List
+from unittest.mock import patch
 
 import flsim.configs  # noqa
 import pkg_resources
@@ -17,11 +20,16 @@ import torch
 from flsim.active_user_selectors.simple_user_selector import (
     SequentialActiveUserSelectorConfig,
 )
+from flsim.channels.base_channel import FLChannelConfig, IdentityChannel
+from flsim.channels.message import Message
+from flsim.channels.sparse_mask_channel import SparseMaskChannelConfig
 from flsim.clients.base_client import ClientConfig
+from flsim.clients.dp_client import DPClientConfig
 from flsim.common.pytest_helper import (
     assertEmpty,
     assertEqual,
     assertIsInstance,
+    assertLessEqual,
     assertTrue,
 )
 from flsim.common.timeout_simulator import GaussianTimeOutSimulatorConfig
@@ -39,12 +47,14 @@ from flsim.optimizers.server_optimizers import (
     FedAdamOptimizerConfig,
     FedAvgWithLROptimizerConfig,
 )
+from flsim.privacy.common import ClippingSetting, PrivacySetting
 from flsim.secure_aggregation.secure_aggregator import FixedPointConfig
+from flsim.servers.aggregator import Aggregator
 from flsim.servers.sync_secagg_servers import SyncSecAggServerConfig
 from flsim.servers.sync_servers import SyncServerConfig
 from flsim.trainers.async_trainer import AsyncTrainer, AsyncTrainerConfig
 from flsim.trainers.sync_trainer import SyncTrainer, SyncTrainerConfig
-from flsim.utils.config_utils import fl_config_from_json
+from flsim.utils.config_utils import fl_config_from_json, fullclassname
 from flsim.utils.fl.common import FLModelParamUtils
 from flsim.utils.sample_model import DummyAlphabetFLModel
 from flsim.utils.test_utils import (
@@ -64,6 +74,36 @@ from hydra.experimental import compose, initialize
 from hydra.utils import instantiate
 from omegaconf import OmegaConf
 
+class CloningChannel(IdentityChannel):
+    """Hands clients a copy of the global model, which they may train in place."""
+
+    def _on_client_after_reception(self, message: Message) -> Message:
+        message.model = FLModelParamUtils.clone(message.model)
+        return message
+
+
+class HalvingChannel(IdentityChannel):
+    """Halves the global model on its way to clients, so it is copied on write."""
+
+    def _on_client_after_reception(self, message: Message) -> Message:
+        message.populate_state_dict()
+        message.model_state_dict = OrderedDict(
+            (name, tensor * 0.5) for name, tensor in message.model_state_dict.items()
+        )
+        message.update_model_()
+        return message
+
+
+@dataclass
+class CloningChannelConfig(FLChannelConfig):
+    _target_: str = fullclassname(CloningChannel)
+
+
+@dataclass
+class HalvingChannelConfig(FLChannelConfig):
+    _target_: str = fullclassname(HalvingChannel)
+
+
 CONFIG_PATH = "test_resources"
 
 SYNC_TRAINER_JSON = f"{CONFIG_PATH}/sync_trainer.json"
@@ -1255,3 +1295,108 @@ class TestTrainer:
             global_steps_reported_expected,
             f"Actual global steps: {global_steps_reported_actual}, Expected global steps:{global_steps_reported_expected}",
         )
+
+    @pytest.mark.parametrize(
+        "client_config,channel_config",
+        [
+            (ClientConfig(), CloningChannelConfig()),
+            (ClientConfig(), HalvingChannelConfig()),
+            (
+                DPClientConfig(
+                    privacy_setting=PrivacySetting(
+                        noise_multiplier=0.1,
+                        clipping=ClippingSetting(clipping_value=1.0),
+                    )
+                ),
+                HalvingChannelConfig(),
+            ),
+        ],
+    )
+    def test_client_model_pool_stays_bounded(
+        self, client_config, channel_config
+    ) -> None:
+        """
+        Clients train a pooled copy of the global model only if their channel
+        leaves it shared; deltas of other models are not taken into the pool.
+        """
+        torch.manual_seed(1)
+        global_model = DummyAlphabetFLModel()
+        data_provider, _ = DummyAlphabetDataset.create_data_provider_and_loader(
+            DummyAlphabetDataset(), 2, 2, global_model
+        )
+        users_per_round = 2
+        trainer = SyncTrainer(
+            model=global_model,
+            cuda_enabled=False,
+            **OmegaConf.structured(
+                SyncTrainerConfig(
+                    epochs=2,
+                    do_eval=False,
+                    users_per_round=users_per_round,
+                    client=client_config,
+                    channel=channel_config,
+                    server=SyncServerConfig(
+                        active_user_selector=SequentialActiveUserSelectorConfig()
+                    ),
+                    pool_client_models=True,
+                )
+            ),
+        )
+        trainer.train(
+            data_provider,
+            metrics_reporter=FakeMetricReporter(),
+            num_total_users=data_provider.num_train_users(),
+            distributed_world_size=1,
+        )
+        # 13 users, 7 rounds per epoch: nothing grows with the number of rounds
+        pool = trainer.client_model_pool
+        assertLessEqual(len(pool), users_per_round)
+        assertLessEqual(pool.allocations, users_per_round)
+
+    def test_sparse_updates(self) -> None:
+        """
+        With ``sparse_updates``, the server aggregates the (indices, values)
+        pairs sent by the channel, and trains the same model as without.
+        """
+        global_modules = []
+        for sparse_updates in (False, True):
+            torch.manual_seed(1)
+            global_model = DummyAlphabetFLModel()
+            data_provider, _ = DummyAlphabetDataset.create_data_provider_and_loader(
+                DummyAlphabetDataset(), 2, 2, global_model
+            )
+            trainer = SyncTrainer(
+                model=global_model,
+                cuda_enabled=False,
+                **OmegaConf.structured(
+                    SyncTrainerConfig(
+                        epochs=1,
+                        do_eval=False,
+                        users_per_round=2,
+                        channel=SparseMaskChannelConfig(
+                            proportion_of_zero_weights=0.6,
+                            sparsity_method="topk",
+                            sparse_updates=sparse_updates,
+                        ),
+                        server=SyncServerConfig(
+                            active_user_selector=SequentialActiveUserSelectorConfig()
+                        ),
+                    )
+                ),
+            )
+            with patch.object(
+                Aggregator,
+                "add_sparse_update",
+                autospec=True,
+                side_effect=Aggregator.add_sparse_update,
+            ) as add_sparse_update:
+                trainer.train(
+                    data_provider,
+                    metrics_reporter=FakeMetricReporter(),
+                    num_total_users=data_provider.num_train_users(),
+                    distributed_world_size=1,
+                )
+            assertEqual(add_sparse_update.called, sparse_updates)
+            global_modules.append(trainer.global_model.fl_get_module())
+        mismatched = FLModelParamUtils.get_mismatched_param(global_modules, 1e-6)
+        assertEqual(mismatched, "", mismatched)
@@ -7,17 +7,41 @@
 
 # utils for use in the examples and tutorials
 
+import hashlib
+import json
+import os
 import random
-from typing import Any, Dict, Generator, Iterable, Iterator, List, Optional, Tuple
-
+import shutil
+import tempfile
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+from functools import partial
+from typing import (
+    Any,
+    Callable,
+    Dict,
+    Generator,
+    Iterable,
+    Iterator,
+    List,
+    Optional,
+    Tuple,
+)
+
+import numpy as np
 import torch
 import torch.nn.functional as F
 from flsim.data.data_provider import IFLDataProvider, IFLUserData
 from flsim.data.data_sharder import FLDataSharder, SequentialSharder
 from flsim.interfaces.data_loader import IFLDataLoader
+from flsim.interfaces.batch_metrics import IFLBatchMetrics
 from flsim.interfaces.metrics_reporter import Channel
 from flsim.interfaces.model import IFLModel
-from flsim.metrics_reporter.tensorboard_metrics_reporter import FLMetricsReporter
+from flsim.metrics_reporter.tensorboard_metrics_reporter import (
+    ClassificationAccumulator,
+    FLMetricsReporter,
+)
 from flsim.utils.data.data_utils import batchify
 from flsim.utils.simple_batch_metrics import FLBatchMetrics
 from torch import nn
@@ -33,6 +57,28 @@ def collate_fn(batch: Tuple) -> Dict[str, Any]:
     return {"features": feature, "labels": label}
 
 
+def _batch_sizes(num_examples: int, batch_size: int, drop_last: bool) -> List[int]:
+    """Sizes of the batches `batchify` makes out of `num_examples` examples."""
+    sizes = [batch_size] * (num_examples // batch_size)
+    if num_examples % batch_size and not drop_last:
+        sizes.append(num_examples % batch_size)
+    return sizes
+
+
+@dataclass
+class UserSource:
+    """How to load the data of one user, for `LazyDataProvider`.
+
+    Attributes:
+        load: Returns the user's batches, like one item of `fl_train_set`.
+        batch_sizes: Sizes of the batches `load` returns, if known without
+            loading them.
+    """
+
+    load: Callable[[], Dict[str, Generator]]
+    batch_sizes: Optional[List[int]] = None
+
+
 class DataLoader(IFLDataLoader):
     SEED = 2137
     random.seed(SEED)
@@ -67,6 +113,15 @@ class DataLoader(IFLDataLoader):
     def fl_test_set(self, **kwargs) -> Iterable[Dict[str, Generator]]:
         yield from self._batchify(self.test_dataset, drop_last=False)
 
+    def fl_train_users(self, **kwargs) -> List[UserSource]:
+        return self._user_sources(self.train_dataset, self.drop_last)
+
+    def fl_eval_users(self, **kwargs) -> List[UserSource]:
+        return self._user_sources(self.eval_dataset, drop_last=False)
+
+    def fl_test_users(self, **kwargs) -> List[UserSource]:
+        return self._user_sources(self.test_dataset, drop_last=False)
+
     def _batchify(
         self,
         dataset: VisionDataset,
@@ -77,18 +132,46 @@ class DataLoader(IFLDataLoader):
         # pyre-fixme[16]: `VisionDataset` has no attribute `__iter__`.
         data_rows: List[Dict[str, Any]] = [self.collate_fn(batch) for batch in dataset]
         for _, (_, user_data) in enumerate(self.sharder.shard_rows(data_rows)):
-            batch = {}
-            keys = user_data[0].keys()
-            for key in keys:
-                attribute = {
-                    key: batchify(
-                        [row[key] for row in user_data],
-                        self.batch_size,
-                        drop_last,
-                    )
-                }
-                batch = {**batch, **attribute}
-            yield batch
+            yield self._batch_rows(user_data, drop_last)
+
+    def _batch_rows(
+        self, user_data: List[Dict[str, Any]], drop_last: bool
+    ) -> Dict[str, Generator]:
+        batch = {}
+        keys = user_data[0].keys()
+        for key in keys:
+            attribute = {
+                key: batchify(
+                    [row[key] for row in user_data],
+                    self.batch_size,
+                    drop_last,
+                )
+            }
+            batch = {**batch, **attribute}
+        return batch
+
+    def _user_sources(
+        self, dataset: VisionDataset, drop_last: bool
+    ) -> List[UserSource]:
+        """Shards row indices rather than rows, so no row is loaded until its
+        user is. Sharders must assign rows without reading them (i.e. any
+        sharder but `ColumnSharder`).
+        """
+        # pyre-fixme[6]: `VisionDataset` defines `__len__`
+        shards = self.sharder.shard_rows(range(len(dataset)))
+        return [
+            UserSource(
+                load=partial(self._load_user, dataset, indices, drop_last),
+                batch_sizes=_batch_sizes(len(indices), self.batch_size, drop_last),
+            )
+            for _, indices in shards
+        ]
+
+    def _load_user(
+        self, dataset: VisionDataset, indices: List[int], drop_last: bool
+    ) -> Dict[str, Generator]:
+        rows = [self.collate_fn(dataset[i]) for i in indices]
+        return self._batch_rows(rows, drop_last)
 
 
 class UserData(IFLUserData):
@@ -105,10 +188,12 @@ class UserData(IFLUserData):
 
         user_features = list(user_data["features"])
         user_labels = list(user_data["labels"])
-        total = sum(len(batch) for batch in user_labels)
+        is_eval = UserData.split_batches(
+            [len(labels) for labels in user_labels], eval_split
+        )
 
-        for features, labels in zip(user_features, user_labels):
-            if self._num_eval_examples < int(total * self._eval_split):
+        for features, labels, eval_batch in zip(user_features, user_labels, is_eval):
+            if eval_batch:
                 self._num_eval_batches += 1
                 self._num_eval_examples += UserData.get_num_examples(labels)
                 self._eval_batches.append(UserData.fl_training_batch(features, labels))
@@ -159,6 +244,19 @@ class UserData(IFLUserData):
     def get_num_examples(batch: List) -> int:
         return len(batch)
 
+    @staticmethod
+    def split_batches(batch_sizes: List[int], eval_split: float) -> List[bool]:
+        """Whether each batch goes to the eval split: the first batches, until
+        they hold `eval_split` of the examples.
+        """
+        total = sum(batch_sizes)
+        num_eval_examples = 0
+        is_eval = []
+        for size in batch_sizes:
+            is_eval.append(num_eval_examples < int(total * eval_split))
+            num_eval_examples += size if is_eval[-1] else 0
+        return is_eval
+
     @staticmethod
     def fl_training_batch(
         features: List[torch.Tensor], labels: List[float]
@@ -193,19 +291,59 @@ class LEAFDataLoader(IFLDataLoader):
     def fl_test_set(self, **kwargs) -> Iterable[Dict[str, Generator]]:
         yield from self._batchify(self.test_dataset, drop_last=False)
 
+    def fl_train_users(self, **kwargs) -> List[UserSource]:
+        return self._user_sources(self.train_dataset, self.drop_last)
+
+    def fl_eval_users(self, **kwargs) -> List[UserSource]:
+        return self._user_sources(self.eval_dataset, drop_last=False)
+
+    def fl_test_users(self, **kwargs) -> List[UserSource]:
+        return self._user_sources(self.test_dataset, drop_last=False)
+
     def _batchify(
         self, dataset: Dataset, drop_last=False
     ) -> Generator[Dict[str, Generator], None, None]:
         # pyre-fixme[16]: `Dataset` has no attribute `__iter__`.
         for one_user_inputs, one_user_labels in dataset:
-            data = list(zip(one_user_inputs, one_user_labels))
-            random.shuffle(data)
-            one_user_inputs, one_user_labels = zip(*data)
-            batch = {
-                "features": batchify(one_user_inputs, self.batch_size, drop_last),
-                "labels": batchify(one_user_labels, self.batch_size, drop_last),
-            }
-            yield batch
+            yield self._batch_user(one_user_inputs, one_user_labels, drop_last, random)
+
+    def _batch_user(
+        self, one_user_inputs, one_user_labels, drop_last: bool, rng
+    ) -> Dict[str, Generator]:
+        data = list(zip(one_user_inputs, one_user_labels))
+        rng.shuffle(data)
+        one_user_inputs, one_user_labels = zip(*data)
+        return {
+            "features": batchify(one_user_inputs, self.batch_size, drop_last),
+            "labels": batchify(one_user_labels, self.batch_size, drop_last),
+        }
+
+    def _user_sources(self, dataset: Dataset, drop_last: bool) -> List[UserSource]:
+        """Requires datasets indexed by user id, with a `user_ids()` method and
+        optionally `num_user_examples(user_id)`. A user's examples are shuffled
+        with a generator seeded by its id, so that reloading a user gives the
+        same batches.
+        """
+        num_user_examples = getattr(dataset, "num_user_examples", None)
+        # pyre-fixme[16]: `Dataset` has no attribute `user_ids`.
+        return [
+            UserSource(
+                load=partial(self._load_user, dataset, user_id, drop_last),
+                batch_sizes=None
+                if num_user_examples is None
+                else _batch_sizes(
+                    num_user_examples(user_id), self.batch_size, drop_last
+                ),
+            )
+            for user_id in dataset.user_ids()
+        ]
+
+    def _load_user(
+        self, dataset: Dataset, user_id: Any, drop_last: bool
+    ) -> Dict[str, Generator]:
+        one_user_inputs, one_user_labels = dataset[user_id]
+        rng = random.Random(f"{self.SEED}:{user_id}")
+        return self._batch_user(one_user_inputs, one_user_labels, drop_last, rng)
 
 
 class DataProvider(IFLDataProvider):
@@ -258,8 +396,302 @@ class DataProvider(IFLDataProvider):
         }
 
 
+class LazyUserData(IFLUserData):
+    """A user of a `LazyDataProvider`. Only the user's batch sizes are kept; its
+    batches are loaded when iterated, and stay resident while the user is
+    among the provider's most recently used ones.
+    """
+
+    def __init__(
+        self,
+        provider: "LazyDataProvider",
+        key: Tuple[str, int],
+        source: UserSource,
+        eval_split: float = 0.0,
+    ):
+        self._provider = provider
+        self.key = key
+        self.source = source
+        self.eval_split = eval_split
+        self._counts: Optional[Tuple[int, int, int, int]] = None
+
+    def _get_counts(self) -> Tuple[int, int, int, int]:
+        """(train examples, train batches, eval examples, eval batches)"""
+        if self._counts is None:
+            sizes = self.source.batch_sizes
+            if sizes is None:
+                data = self.materialize()
+                self._counts = (
+                    data.num_train_examples(),
+                    data.num_train_batches(),
+                    data.num_eval_examples(),
+                    data.num_eval_batches(),
+                )
+            else:
+                is_eval = UserData.split_batches(sizes, self.eval_split)
+                train = [n for n, e in zip(sizes, is_eval) if not e]
+                evals = [n for n, e in zip(sizes, is_eval) if e]
+                self._counts = (sum(train), len(train), sum(evals), len(evals))
+        return self._counts
+
+    def materialize(self) -> UserData:
+        return self._provider.materialize(self)
+
+    def num_train_examples(self) -> int:
+        return self._get_counts()[0]
+
+    def num_train_batches(self) -> int:
+        return self._get_counts()[1]
+
+    def num_eval_examples(self) -> int:
+        return self._get_counts()[2]
+
+    def num_eval_batches(self) -> int:
+        return self._get_counts()[3]
+
+    def train_data(self) -> Iterator[Dict[str, torch.Tensor]]:
+        yield from self.materialize().train_data()
+
+    def eval_data(self) -> Iterator[Dict[str, torch.Tensor]]:
+        yield from self.materialize().eval_data()
+
+
+class LazyDataProvider(DataProvider):
+    """A `DataProvider` that only shards the data up front. A user's batches are
+    built the first time they are used, and at most `max_resident_users` train
+    users keep their batches in memory (least recently used ones are dropped and
+    rebuilt when needed again). Eval and test users are kept once built, as
+    every evaluation goes through all of them.
+
+    The data loader must implement `fl_train_users`, `fl_eval_users` and
+    `fl_test_users`, which return a `UserSource` per user.
+    """
+
+    def __init__(self, data_loader, max_resident_users: int = 128):
+        assert max_resident_users > 0, "max_resident_users must be positive"
+        self.data_loader = data_loader
+        self.max_resident_users = max_resident_users
+        # Key: (split, user index), Value: batches of the user
+        self._resident: OrderedDict[Tuple[str, int], UserData] = OrderedDict()
+        # eval and test users, never dropped
+        self._pinned: Dict[Tuple[str, int], UserData] = {}
+        # clients may train concurrently, see `ClientUpdateExecutor`
+        self._lock = threading.Lock()
+        self._train_users = self._create_lazy_users(
+            "train", data_loader.fl_train_users(), eval_split=0.0
+        )
+        self._eval_users = self._create_lazy_users(
+            "eval", data_loader.fl_eval_users(), eval_split=1.0
+        )
+        self._test_users = self._create_lazy_users(
+            "test", data_loader.fl_test_users(), eval_split=1.0
+        )
+
+    def _create_lazy_users(
+        self, split: str, sources: List[UserSource], eval_split: float
+    ) -> Dict[int, IFLUserData]:
+        return {
+            user_index: LazyUserData(self, (split, user_index), source, eval_split)
+            for user_index, source in enumerate(sources)
+        }
+
+    def materialize(self, user: LazyUserData) -> UserData:
+        with self._lock:
+            if user.key in self._pinned:
+                return self._pinned[user.key]
+            data = self._resident.get(user.key)
+            if data is not None:
+                self._resident.move_to_end(user.key)
+                return data
+        data = UserData(user.source.load(), eval_split=user.eval_split)
+        with self._lock:
+            split, _ = user.key
+            if split != "train":
+                self._pinned[user.key] = data
+                return data
+            self._resident[user.key] = data
+            while len(self._resident) > self.max_resident_users:
+                self._resident.popitem(last=False)
+        return data
+
+    def num_resident_users(self) -> int:
+        return len(self._resident) + len(self._pinned)
+
+
+def build_shard_cache(data_loader, cache_dir: str, fingerprint: str) -> str:
+    """Writes the batches of every user of `data_loader` to a shard cache under
+    `cache_dir`, and returns the path of the cache. `fingerprint` must change
+    whenever the cached data would (dataset, transforms, sharding, batch size),
+    a cache that was already built for it is reused as is.
+
+    Users are loaded one at a time with the loader's `fl_*_users` sources, so
+    the data is transformed once, and the cache is built in a temporary
+    directory that is renamed into place, so concurrent builders and readers
+    never see a partial cache. Serve the cache with `MmapDataProvider`.
+    """
+    path = os.path.join(cache_dir, hashlib.sha1(fingerprint.encode()).hexdigest())
+    if os.path.exists(os.path.join(path, "meta.json")):
+        return path
+    os.makedirs(cache_dir, exist_ok=True)
+    tmp_path = tempfile.mkdtemp(prefix=".build-", dir=cache_dir)
+    sources = {
+        "train": data_loader.fl_train_users(),
+        "eval": data_loader.fl_eval_users(),
+        "test": data_loader.fl_test_users(),
+    }
+    meta = {
+        "fingerprint": fingerprint,
+        "splits": {
+            split: _write_shard_split(tmp_path, split, split_sources)
+            for split, split_sources in sources.items()
+        },
+    }
+    with open(os.path.join(tmp_path, "meta.json"), "w") as f:
+        json.dump(meta, f)
+    try:
+        os.rename(tmp_path, path)
+    except OSError:
+        # another process finished the same cache first
+        shutil.rmtree(tmp_path)
+    return path
+
+
+def _write_shard_split(
+    path: str, split: str, sources: List[UserSource]
+) -> Dict[str, Any]:
+    # rows of a user are contiguous, in batch order; the index keeps the size
+    # of every batch and the first batch of every user
+    split_meta = {"batch_sizes": [], "user_batches": [0], "features": None}
+    with open(os.path.join(path, f"{split}_features.bin"), "wb") as features, open(
+        os.path.join(path, f"{split}_labels.bin"), "wb"
+    ) as labels:
+        for source in tqdm(sources, desc=f"Caching {split} users", unit="user"):
+            user_data = source.load()
+            for batch_features, batch_labels in zip(
+                user_data["features"], user_data["labels"]
+            ):
+                batch = UserData.fl_training_batch(batch_features, batch_labels)
+                batch_array = batch["features"].numpy()
+                split_meta["features"] = {
+                    "dtype": batch_array.dtype.str,
+                    "shape": list(batch_array.shape[1:]),
+                }
+                features.write(np.ascontiguousarray(batch_array).tobytes())
+                labels.write(batch["labels"].numpy().tobytes())
+                split_meta["batch_sizes"].append(len(batch_labels))
+            split_meta["user_batches"].append(len(split_meta["batch_sizes"]))
+    return split_meta
+
+
+class MmapUserData(IFLUserData):
+    """A user of a `MmapDataProvider`: its batches are slices of the split's
+    memory-mapped features and labels, not copies.
+    """
+
+    def __init__(
+        self,
+        features: torch.Tensor,
+        labels: torch.Tensor,
+        batch_offsets: List[int],
+        eval_split: float = 0.0,
+    ):
+        self._features = features
+        self._labels = labels
+        ranges = list(zip(batch_offsets, batch_offsets[1:]))
+        is_eval = UserData.split_batches(
+            [end - start for start, end in ranges], eval_split
+        )
+        self._train_ranges = [r for r, e in zip(ranges, is_eval) if not e]
+        self._eval_ranges = [r for r, e in zip(ranges, is_eval) if e]
+
+    def num_train_examples(self) -> int:
+        return sum(end - start for start, end in self._train_ranges)
+
+    def num_train_batches(self) -> int:
+        return len(self._train_ranges)
+
+    def num_eval_examples(self) -> int:
+        return sum(end - start for start, end in self._eval_ranges)
+
+    def num_eval_batches(self) -> int:
+        return len(self._eval_ranges)
+
+    def train_data(self) -> Iterator[Dict[str, torch.Tensor]]:
+        yield from self._batches(self._train_ranges)
+
+    def eval_data(self) -> Iterator[Dict[str, torch.Tensor]]:
+        yield from self._batches(self._eval_ranges)
+
+    def _batches(
+        self, ranges: List[Tuple[int, int]]
+    ) -> Iterator[Dict[str, torch.Tensor]]:
+        for start, end in ranges:
+            yield {
+                "features": self._features[start:end],
+                "labels": self._labels[start:end],
+            }
+
+
+class MmapDataProvider(DataProvider):
+    """A `DataProvider` over a shard cache written by `build_shard_cache`.
+
+    The cache is memory-mapped copy-on-write: batches are zero-copy views of
+    the page cache, which all processes reading the same cache share, and
+    writes to a batch stay private to the process.
+    """
+
+    def __init__(self, path: str):
+        self.data_loader = None
+        self.path = path
+        with open(os.path.join(path, "meta.json")) as f:
+            self.meta = json.load(f)
+        self._train_users = self._create_mmap_users("train", eval_split=0.0)
+        self._eval_users = self._create_mmap_users("eval", eval_split=1.0)
+        self._test_users = self._create_mmap_users("test", eval_split=1.0)
+
+    def _create_mmap_users(
+        self, split: str, eval_split: float
+    ) -> Dict[int, IFLUserData]:
+        split_meta = self.meta["splits"][split]
+        batch_offsets = np.cumsum([0] + split_meta["batch_sizes"]).tolist()
+        if batch_offsets[-1] == 0:
+            return {}
+        features = torch.from_numpy(
+            np.memmap(
+                os.path.join(self.path, f"{split}_features.bin"),
+                dtype=np.dtype(split_meta["features"]["dtype"]),
+                mode="c",
+                shape=(batch_offsets[-1], *split_meta["features"]["shape"]),
+            )
+        )
+        labels = torch.from_numpy(
+            np.memmap(
+                os.path.join(self.path, f"{split}_labels.bin"),
+                dtype=np.float32,
+                mode="c",
+                shape=(batch_offsets[-1],),
+            )
+        )
+        user_batches = split_meta["user_batches"]
+        return {
+            user_index: MmapUserData(
+                features,
+                labels,
+                batch_offsets[first_batch : last_batch + 1],
+                eval_split,
+            )
+            for user_index, (first_batch, last_batch) in enumerate(
+                zip(user_batches, user_batches[1:])
+            )
+        }
+
+
 def build_data_provider(
-    local_batch_size, examples_per_user, image_size
+    local_batch_size,
+    examples_per_user,
+    image_size,
+    lazy: bool = False,
+    cache_dir: Optional[str] = None,
 ) -> DataProvider:
 
     # 1. Create training, eval, and test datasets like in non-federated learning.
@@ -291,8 +723,20 @@ def build_data_provider(
         drop_last=False,
     )
 
-    # 4. Wrap the data loader with a data provider.
-    data_provider = DataProvider(fl_data_loader)
+    # 4. Wrap the data loader with a data provider. A lazy one only loads the
+    # users that are selected, a cached one transforms the data once and maps
+    # it from `cache_dir` in later runs.
+    if cache_dir is not None:
+        fingerprint = (
+            f"cifar10|{transform}|{sharder.cfg}|{local_batch_size}|drop_last=False"
+        )
+        data_provider = MmapDataProvider(
+            build_shard_cache(fl_data_loader, cache_dir, fingerprint)
+        )
+    elif lazy:
+        data_provider = LazyDataProvider(fl_data_loader)
+    else:
+        data_provider = DataProvider(fl_data_loader)
     print(f"Clients in total: {data_provider.num_train_users()}")
     return data_provider
 
@@ -404,10 +848,12 @@ class MetricsReporter(FLMetricsReporter):
         window_size: int = 5,
         average_type: str = "sma",
         log_dir: Optional[str] = None,
+        store_batch_metrics: bool = False,
     ):
-        super().__init__(channels, log_dir)
+        super().__init__(channels, log_dir, store_batch_metrics)
         self.set_summary_writer(log_dir=log_dir)
         self._round_to_target = float(1e10)
+        self.accumulator = ClassificationAccumulator()
 
     def compare_metrics(self, eval_metrics, best_metrics):
         print(f"Current eval accuracy: {eval_metrics}%, Best so far: {best_metrics}%")
@@ -418,27 +864,15 @@ class MetricsReporter(FLMetricsReporter):
         best_accuracy = best_metrics.get(self.ACCURACY, float("-inf"))
         return current_accuracy > best_accuracy
 
-    def compute_scores(self) -> Dict[str, Any]:
-        # compute accuracy
-        correct = torch.Tensor([0])
-        for i in range(len(self.predictions_list)):
-            all_preds = self.predictions_list[i]
-            pred = all_preds.data.max(1, keepdim=True)[1]
-
-            assert pred.device == self.targets_list[i].device, (
-                f"Pred and targets moved to different devices: "
-                f"pred >> {pred.device} vs. targets >> {self.targets_list[i].device}"
-            )
-            if i == 0:
-                correct = correct.to(pred.device)
-
-            correct += pred.eq(self.targets_list[i].data.view_as(pred)).sum()
+    def update_accumulators(self, metrics: IFLBatchMetrics) -> None:
+        self.accumulator.update(metrics.predictions, metrics.targets)
 
-        # total number of data
-        total = sum(len(batch_targets) for batch_targets in self.targets_list)
+    def compute_scores(self) -> Dict[str, Any]:
+        return {self.ACCURACY: self.accumulator.accuracy()}
 
-        accuracy = 100.0 * correct.item() / total
-        return {self.ACCURACY: accuracy}
+    def reset(self):
+        super().reset()
+        self.accumulator.reset()
 
     def create_eval_metrics(
         self, scores: Dict[str, Any], total_loss: float, **kwargs
@@ -8,11 +8,13 @@
 import copy
 import logging
 import math
-from typing import List, Optional, Union
+from numbers import Number
+from typing import Dict, List, Optional, Tuple, Union
 
 import torch
 from flsim.common.logger import Logger
 from flsim.interfaces.model import IFLModel
+from flsim.utils.fl.param_arena import ParamArena
 from flsim.utils.fl.personalized_model import FLModelWithPrivateModules
 from torch import nn
 from torch.optim.optimizer import Optimizer
@@ -37,8 +39,42 @@ class FLModelParamUtils:
         else:
             model.load_state_dict(state_dict)
 
+    @classmethod
+    def flatten_params(cls, model: nn.Module) -> bool:
+        """Moves the parameters and buffers of ``model`` into one contiguous
+        buffer (see ``ParamArena``), so that model arithmetic between models
+        flattened alike runs as single vector ops. Clones of ``model`` are
+        flattened too.
+
+        Returns:
+            Whether the model could be flattened, i.e. its tensors share their
+            dtype and device.
+        """
+        return ParamArena.attach(model) is not None
+
+    @classmethod
+    def _get_arenas(
+        cls, models: List[nn.Module], only_federated_params: bool
+    ) -> Optional[List[ParamArena]]:
+        """Arenas of ``models`` if they all have a matching one covering the
+        requested state, else None.
+        """
+        arenas = []
+        for model in models:
+            if only_federated_params and isinstance(model, FLModelWithPrivateModules):
+                return None
+            arena = ParamArena.of(model)
+            if arena is None or (arenas and arena.signature != arenas[0].signature):
+                return None
+            arenas.append(arena)
+        return arenas
+
     @classmethod
     def zero_weights(cls, model: nn.Module, only_federated_params=False) -> None:
+        arenas = cls._get_arenas([model], only_federated_params)
+        if arenas is not None:
+            arenas[0].buffer.zero_()
+            return
         state_dict = cls.get_state_dict(model, only_federated_params)
         for _name, param in state_dict.items():
             param.data.fill_(0.0)
@@ -94,6 +130,19 @@ class FLModelParamUtils:
         only_federated_params: bool = False,
     ) -> None:
         """sets model_to_save = model1*wt1 + model2*wt2"""
+        arenas = cls._get_arenas([model1, model2, model_to_save], only_federated_params)
+        if arenas is not None and isinstance(wt1, Number) and isinstance(wt2, Number):
+            x, y, out = (arena.buffer for arena in arenas)
+            with torch.no_grad():
+                if x is y:
+                    torch.mul(x, wt1 + wt2, out=out)
+                elif out is y:
+                    out.mul_(wt2).add_(x, alpha=wt1)
+                else:
+                    torch.mul(x, wt1, out=out)
+                    out.add_(y, alpha=wt2)
+            return
+
         global_params = cls.get_state_dict(model_to_save, only_federated_params)
         params_model1 = cls.get_state_dict(model1, only_federated_params)
         params_model2 = cls.get_state_dict(model2, only_federated_params)
@@ -158,8 +207,18 @@ class FLModelParamUtils:
             to_models: collection of models. These will be changed in-place
             only_federated_params: copy only federated params.
         """
-        from_state_dict = cls.get_state_dict(from_model, only_federated_params)
+        unflattened = []
         for m in to_models:
+            arenas = cls._get_arenas([from_model, m], only_federated_params)
+            if arenas is None:
+                unflattened.append(m)
+                continue
+            with torch.no_grad():
+                arenas[1].buffer.copy_(arenas[0].buffer)
+        if not unflattened:
+            return
+        from_state_dict = cls.get_state_dict(from_model, only_federated_params)
+        for m in unflattened:
             cls.load_state_dict(m, from_state_dict, only_federated_params)
 
     @classmethod
@@ -168,20 +227,39 @@ class FLModelParamUtils:
     ):
         """Clones a pytorch module, and allows for a change of precision.
         TODO If needed we can also add device here.
+
+        The clone of a flattened model (see `flatten_params`) is flattened, and
+        is copied with one copy of its buffer.
         """
-        new_model = copy.deepcopy(model)
+        arena = ParamArena.of(
+            model.fl_get_module() if isinstance(model, IFLModel) else model
+        )
+        memo = {}
+        new_arena = arena.copy(memo) if arena is not None else None
+        new_model = copy.deepcopy(model, memo)
         if isinstance(new_model, IFLModel):
             if dtype == torch.float32:
                 new_model.fl_get_module().float()
             elif dtype == torch.float64:
                 new_model.fl_get_module().double()
-            return new_model
         else:
-            return (
+            new_model = (
                 new_model.float()
                 if dtype == torch.float32
                 else (new_model.double() if dtype == torch.float64 else new_model)
             )
+        if new_arena is not None:
+            new_module = (
+                new_model.fl_get_module()
+                if isinstance(new_model, IFLModel)
+                else new_model
+            )
+            # a change of precision moves the tensors to new storage
+            if new_arena.is_intact():
+                new_arena.bind(new_module)
+            else:
+                ParamArena.attach(new_module)
+        return new_model
 
     @classmethod
     def set_gradient(cls, model: nn.Module, reference_gradient: nn.Module) -> None:
@@ -434,6 +512,52 @@ class FLModelParamUtils:
             model1, 1, model2, 1, model_to_save, only_federated_params
         )
 
+    @classmethod
+    def add_sparse_state_dict(
+        cls,
+        model: nn.Module,
+        sparse_state_dict: Dict[str, Tuple[torch.Tensor, torch.Tensor]],
+        weight: float,
+        only_federated_params: bool = False,
+    ):
+        """
+        Adds ``weight`` times a state dict given as the flat indices and values
+        of its non-zero entries (see ``Message.sparse_state_dict``) to
+        ``model``, in time proportional to their number. For a flattened model
+        (see ``flatten_params``), this is a single ``index_add_`` into its
+        buffer.
+        """
+        state_dict = cls.get_state_dict(model, only_federated_params)
+        entries = [
+            (state_dict[name], indices, values)
+            for name, (indices, values) in sparse_state_dict.items()
+            if name in state_dict
+        ]
+        arenas = cls._get_arenas([model], only_federated_params)
+        with torch.no_grad():
+            if arenas is not None and entries:
+                buffer = arenas[0].buffer
+                buffer_indices = []
+                for param, indices, _ in entries:
+                    # offset of the param in the buffer
+                    offset = param.data_ptr() - buffer.data_ptr()
+                    offset //= param.element_size()
+                    buffer_indices.append(indices.to(buffer.device) + offset)
+                buffer.index_add_(
+                    0,
+                    torch.cat(buffer_indices),
+                    torch.cat([values for _, _, values in entries]).to(buffer),
+                    alpha=float(weight),
+                )
+            else:
+                for param, indices, values in entries:
+                    param.view(-1).index_add_(
+                        0,
+                        indices.to(param.device),
+                        values.to(param),
+                        alpha=float(weight),
+                    )
+
     @classmethod
     def scale_optimizer_lr(
         cls, optimizer: torch.optim.Optimizer, scaling_factor: float
@@ -0,0 +1,91 @@
+#!/usr/bin/env python3
+# Copyright (c) Meta Platforms, Inc. and affiliates.
+# All rights reserved.
+#
+# This source code is licensed under the BSD-style license found in the
+# LICENSE file in the root directory of this source tree.
+
+from __future__ import annotations
+
+import threading
+import weakref
+from typing import Any, Dict, List, Optional, Tuple
+
+from flsim.interfaces.model import IFLModel
+from flsim.utils.fl.common import FLModelParamUtils
+
+
+class ModelPool:
+    """Scratch copies of a source model, reused instead of cloning the source
+    for every client.
+
+    ``acquire`` hands out a model whose state equals the source's, taken from
+    the pool and overwritten in place when one is free, cloned otherwise.
+    ``release`` returns it once nothing refers to it anymore; models the pool
+    did not hand out are ignored, so callers may release whatever model they
+    end up with. The pool thus holds as many models as were ever in use at the
+    same time, and a round allocates no model at all once the pool is warm.
+
+    Models are reset with ``copy_`` (a single one for flattened models, see
+    ``FLModelParamUtils.flatten_params``), and their gradients are dropped.
+    Acquiring from a source model with other parameter names, shapes or dtypes
+    empties the pool. The pool is thread-safe; a pickled pool is empty, so
+    processes keep their own.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._source: Optional[IFLModel] = None
+        self._signature: Optional[List[Tuple[str, Any, Any]]] = None
+        self._free: List[IFLModel] = []
+        # models handed out and not released yet, by id; weak so that models
+        # kept by their user (e.g. with their optimizer) are not held here
+        self._issued: weakref.WeakValueDictionary = weakref.WeakValueDictionary()
+        # number of models cloned because the pool was empty
+        self.allocations = 0
+
+    @staticmethod
+    def _signature_of(model: IFLModel) -> List[Tuple[str, Any, Any]]:
+        return [
+            (name, tensor.shape, tensor.dtype)
+            for name, tensor in model.fl_get_module().state_dict().items()
+        ]
+
+    def acquire(self, model: IFLModel) -> IFLModel:
+        with self._lock:
+            if model is not self._source:
+                # a new source model (e.g. cloned by a channel) is copied into
+                # the same scratch models, unless they do not fit it
+                signature = self._signature_of(model)
+                if signature != self._signature:
+                    self._signature = signature
+                    self._free.clear()
+                self._source = model
+            scratch = self._free.pop() if self._free else None
+        if scratch is None:
+            self.allocations += 1
+            scratch = FLModelParamUtils.clone(model)
+        else:
+            module = scratch.fl_get_module()
+            module.zero_grad(set_to_none=True)
+            FLModelParamUtils.copy_models(model.fl_get_module(), [module])
+        with self._lock:
+            self._issued[id(scratch)] = scratch
+        return scratch
+
+    def release(self, model: IFLModel) -> None:
+        with self._lock:
+            if self._issued.get(id(model)) is not model:
+                return
+            del self._issued[id(model)]
+            self._free.append(model)
+
+    def __len__(self) -> int:
+        return len(self._free)
+
+    def __getstate__(self) -> Dict[str, Any]:
+        return {"allocations": self.allocations}
+
+    def __setstate__(self, state: Dict[str, Any]) -> None:
+        self.__init__()
+        self.allocations = state["allocations"]
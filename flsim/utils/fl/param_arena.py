@@ -0,0 +1,149 @@
+#!/usr/bin/env python3
+# Copyright (c) Meta Platforms, Inc. and affiliates.
+# All rights reserved.
+#
+# This source code is licensed under the BSD-style license found in the
+# LICENSE file in the root directory of this source tree.
+
+from __future__ import annotations
+
+from typing import Any, Dict, List, Optional, Tuple
+
+import torch
+from torch import nn
+
+
+_ATTRIBUTE = "_fl_param_arena"
+
+
+def _detached_arena() -> None:
+    return None
+
+
+class ParamArena:
+    """One contiguous 1-D buffer holding every tensor of a module's state_dict,
+    parameters first and then persistent buffers, in state_dict order.
+
+    Parameters and buffers stay the module's own tensors, only their storage
+    is a view into ``buffer``. The module keeps working as before (optimizers,
+    ``state_dict``, ``load_state_dict``), and ``FLModelParamUtils`` can apply
+    model arithmetic to the whole buffer with one kernel instead of one per
+    tensor.
+
+    Anything that rebinds a tensor to new storage (e.g. ``module.to(device)``,
+    ``param.data = ...``) detaches it from the arena; ``ParamArena.of`` then
+    returns None and callers fall back to per-tensor loops. Deep copies and
+    pickles of a module drop its arena, ``FLModelParamUtils.clone`` gives the
+    clone its own.
+    """
+
+    def __init__(
+        self,
+        buffer: torch.Tensor,
+        tensors: List[torch.Tensor],
+        num_param_elements: int,
+    ):
+        self.buffer = buffer
+        self.tensors = tensors
+        self.num_param_elements = num_param_elements
+        # arenas with the same signature line up element by element
+        self.signature: Tuple = (
+            buffer.dtype,
+            buffer.device,
+            tuple(t.shape for t in tensors),
+        )
+        self._data_ptrs = [t.data_ptr() for t in tensors]
+
+    @property
+    def params(self) -> torch.Tensor:
+        """All the parameters of the module, flattened."""
+        return self.buffer[: self.num_param_elements]
+
+    @classmethod
+    def attach(cls, module: nn.Module) -> Optional[ParamArena]:
+        """Moves the state of ``module`` into a new arena and returns it, or
+        None if its tensors differ in dtype or device.
+        """
+        tensors = cls._state_tensors(module)
+        if (
+            not tensors
+            or len({t.dtype for t in tensors}) > 1
+            or len({t.device for t in tensors}) > 1
+        ):
+            return None
+        buffer = torch.empty(
+            sum(t.numel() for t in tensors),
+            dtype=tensors[0].dtype,
+            device=tensors[0].device,
+        )
+        with torch.no_grad():
+            for tensor, view in zip(tensors, cls._views(buffer, tensors)):
+                view.copy_(tensor)
+                tensor.data = view
+        return cls._bind(module, buffer, tensors)
+
+    @classmethod
+    def of(cls, module: nn.Module) -> Optional[ParamArena]:
+        """The arena of ``module`` if all of its tensors still live in it."""
+        arena = getattr(module, _ATTRIBUTE, None)
+        if arena is None or not arena.is_intact():
+            return None
+        return arena
+
+    def is_intact(self) -> bool:
+        return all(
+            t.data_ptr() == ptr for t, ptr in zip(self.tensors, self._data_ptrs)
+        )
+
+    def copy(self, memo: Dict[int, Any]) -> ParamArena:
+        """Copies the arena with one copy of its buffer, and records the copies
+        of the module's tensors in ``memo``, so that ``copy.deepcopy(module,
+        memo)`` builds a module whose tensors live in the new arena. Bind the
+        result with ``bind``.
+        """
+        buffer = self.buffer.clone()
+        tensors = []
+        for tensor, view in zip(self.tensors, self._views(buffer, self.tensors)):
+            if isinstance(tensor, nn.Parameter):
+                view = type(tensor)(view, tensor.requires_grad)
+            memo[id(tensor)] = view
+            tensors.append(view)
+        return ParamArena(buffer, tensors, self.num_param_elements)
+
+    def bind(self, module: nn.Module) -> ParamArena:
+        setattr(module, _ATTRIBUTE, self)
+        return self
+
+    @classmethod
+    def _bind(
+        cls, module: nn.Module, buffer: torch.Tensor, tensors: List[torch.Tensor]
+    ) -> ParamArena:
+        num_param_elements = sum(
+            t.numel() for t in tensors if isinstance(t, nn.Parameter)
+        )
+        return cls(buffer, tensors, num_param_elements).bind(module)
+
+    @staticmethod
+    def _state_tensors(module: nn.Module) -> List[torch.Tensor]:
+        # tied tensors appear under several names, but take one slot
+        tensors = {}
+        for tensor in module.state_dict(keep_vars=True).values():
+            tensors.setdefault(id(tensor), tensor)
+        params = [t for t in tensors.values() if isinstance(t, nn.Parameter)]
+        buffers = [t for t in tensors.values() if not isinstance(t, nn.Parameter)]
+        return params + buffers
+
+    @staticmethod
+    def _views(
+        buffer: torch.Tensor, tensors: List[torch.Tensor]
+    ) -> List[torch.Tensor]:
+        views, offset = [], 0
+        for tensor in tensors:
+            views.append(buffer[offset : offset + tensor.numel()].view(tensor.shape))
+            offset += tensor.numel()
+        return views
+
+    def __reduce__(self):
+        # the buffer is only ever a view of the module's tensors, which are
+        # copied or pickled on their own
+        return (_detached_arena, ())
@@ -0,0 +1,157 @@
+#!/usr/bin/env python3
+# Copyright (c) Meta Platforms, Inc. and affiliates.
+# All rights reserved.
+#
+# This source code is licensed under the BSD-style license found in the
+# LICENSE file in the root directory of this source tree.
+
+"""
+Flat binary serialization of model state_dicts.
+
+A serialized state_dict is laid out as::
+
+    <u8 version><u32 header length><json header><padding><tensor bytes>...
+
+The header lists the name, dtype, shape, offset and size of every tensor; the
+tensor bytes follow, each aligned to ``ALIGNMENT`` bytes from the start of the
+data section. Serializing copies every tensor exactly once, straight into the
+output buffer, and deserializing maps tensors onto the input buffer with
+``torch.frombuffer`` instead of copying them.
+
+Blobs written by ``pickle.dumps`` start with the pickle protocol opcode (0x80)
+rather than a format version, so ``deserialize_state_dict`` still loads them.
+"""
+
+from __future__ import annotations
+
+import json
+import math
+import mmap
+import pickle
+import struct
+import warnings
+from typing import Dict, List, Union
+
+import torch
+
+
+FORMAT_VERSION = 1
+ALIGNMENT = 64
+HEADER_LENGTH = struct.Struct("<I")
+# first byte of every pickle written with protocol 2 or higher
+PICKLE_PROTO = 0x80
+
+Buffer = Union[bytes, bytearray, memoryview, mmap.mmap]
+
+
+def _to_torch_dtype(dtype: str) -> torch.dtype:
+    return getattr(torch, dtype.replace("torch.", ""))
+
+
+def _aligned(n: int) -> int:
+    return (n + ALIGNMENT - 1) // ALIGNMENT * ALIGNMENT
+
+
+def _as_bytes(tensor: torch.Tensor) -> torch.Tensor:
+    """Flat uint8 view of ``tensor``'s data, copying only if not contiguous."""
+    return tensor.detach().contiguous().reshape(-1).view(torch.uint8)
+
+
+def _frombuffer(
+    buffer: Buffer, dtype: torch.dtype, shape: List[int], offset: int
+) -> torch.Tensor:
+    numel = math.prod(shape)
+    if numel == 0:
+        return torch.empty(shape, dtype=dtype)
+    with warnings.catch_warnings():
+        # read-only buffers (e.g. bytes returned by a database driver) are
+        # mapped as is, see `deserialize_state_dict`
+        warnings.simplefilter("ignore", UserWarning)
+        tensor = torch.frombuffer(buffer, dtype=dtype, count=numel, offset=offset)
+    return tensor.reshape(shape)
+
+
+def tensor_to_bytes(tensor: torch.Tensor) -> bytes:
+    """Raw bytes of a single tensor, in row-major order."""
+    return _as_bytes(tensor.cpu()).numpy().tobytes()
+
+
+def tensor_from_bytes(blob: Buffer, dtype: str, shape: List[int]) -> torch.Tensor:
+    """Inverse of ``tensor_to_bytes``. The tensor shares memory with ``blob``."""
+    return _frombuffer(blob, _to_torch_dtype(dtype), shape, 0)
+
+
+def serialize_state_dict(state_dict: Dict[str, torch.Tensor]) -> bytearray:
+    """Serializes ``state_dict`` into the flat format.
+
+    The output buffer is allocated once and every tensor is copied into it
+    directly from its storage, on whatever device it lives.
+    """
+    entries, offset = [], 0
+    for name, tensor in state_dict.items():
+        if not isinstance(tensor, torch.Tensor):
+            raise TypeError(f"{name} is a {type(tensor)}, only tensors are supported")
+        nbytes = tensor.numel() * tensor.element_size()
+        entries.append(
+            {
+                "name": name,
+                "dtype": str(tensor.dtype),
+                "shape": list(tensor.shape),
+                "offset": offset,
+                "nbytes": nbytes,
+            }
+        )
+        offset = _aligned(offset + nbytes)
+    header = json.dumps(entries).encode("utf-8")
+    data_start = _aligned(1 + HEADER_LENGTH.size + len(header))
+
+    out = bytearray(data_start + offset)
+    out[0] = FORMAT_VERSION
+    HEADER_LENGTH.pack_into(out, 1, len(header))
+    out[1 + HEADER_LENGTH.size : 1 + HEADER_LENGTH.size + len(header)] = header
+    for entry, tensor in zip(entries, state_dict.values()):
+        if entry["nbytes"]:
+            torch.frombuffer(
+                out,
+                dtype=torch.uint8,
+                count=entry["nbytes"],
+                offset=data_start + entry["offset"],
+            ).copy_(_as_bytes(tensor))
+    return out
+
+
+def deserialize_state_dict(blob: Buffer) -> Dict[str, torch.Tensor]:
+    """Loads a state_dict written by ``serialize_state_dict`` or by pickle.
+
+    Tensors in the flat format share memory with ``blob``, which must outlive
+    them. If ``blob`` is read-only (e.g. ``bytes``), the tensors must not be
+    modified in place; ``module.load_state_dict`` copies them and is safe.
+    """
+    if blob[0] == PICKLE_PROTO:
+        return pickle.loads(blob)
+    if blob[0] != FORMAT_VERSION:
+        raise ValueError(f"Unknown model serialization version {blob[0]}")
+    (header_length,) = HEADER_LENGTH.unpack_from(blob, 1)
+    header_start = 1 + HEADER_LENGTH.size
+    entries = json.loads(bytes(blob[header_start : header_start + header_length]))
+    data_start = _aligned(header_start + header_length)
+    return {
+        e["name"]: _frombuffer(
+            blob,
+            _to_torch_dtype(e["dtype"]),
+            e["shape"],
+            data_start + e["offset"],
+        )
+        for e in entries
+    }
+
+
+def load_state_dict_file(path: str) -> Dict[str, torch.Tensor]:
+    """Memory-maps a file written with ``serialize_state_dict``; tensors are
+    paged in from disk on first access.
+    """
+    with open(path, "rb") as f:
+        # copy-on-write, so the returned tensors can be modified in place
+        # without touching the file
+        buffer = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_COPY)
+    return deserialize_state_dict(buffer)
@@ -497,8 +497,11 @@ class MetricsReporterWithMockedChannels(FLMetricsReporter):
     STDOUT and Tensorboard channels are mocked
     """
 
-    def __init__(self):
-        super().__init__([Channel.STDOUT, Channel.TENSORBOARD])
+    def __init__(self, store_batch_metrics: bool = False):
+        super().__init__(
+            [Channel.STDOUT, Channel.TENSORBOARD],
+            store_batch_metrics=store_batch_metrics,
+        )
 
         self.tensorboard_results: List[MockRecord] = []
         self.stdout_results: List[MockRecord] = []
@@ -0,0 +1,202 @@
+#!/usr/bin/env python3
+# Copyright (c) Meta Platforms, Inc. and affiliates.
+# All rights reserved.
+#
+# This source code is licensed under the BSD-style license found in the
+# LICENSE file in the root directory of this source tree.
+
+import torch
+from flsim.common.pytest_helper import assertAlmostEqual, assertEqual, assertTrue
+from flsim.data.data_sharder import SequentialSharder
+from flsim.interfaces.metrics_reporter import TrainingStage
+from flsim.metrics_reporter.tensorboard_metrics_reporter import (
+    ClassificationAccumulator,
+)
+from flsim.utils.example_utils import (
+    build_shard_cache,
+    DataLoader,
+    DataProvider,
+    LazyDataProvider,
+    LEAFDataLoader,
+    MetricsReporter,
+    MmapDataProvider,
+)
+from flsim.utils.simple_batch_metrics import FLBatchMetrics
+
+
+class CountingDataset:
+    """Rows (image, label) that count how many times they were loaded."""
+
+    def __init__(self, num_rows: int):
+        self.rows = [(torch.rand(1, 2, 2), i % 10) for i in range(num_rows)]
+        self.loads = 0
+
+    def __len__(self) -> int:
+        return len(self.rows)
+
+    def __getitem__(self, index: int):
+        self.loads += 1
+        return self.rows[index]
+
+    def __iter__(self):
+        for index in range(len(self)):
+            yield self[index]
+
+
+class UserDataset:
+    def __init__(self):
+        self.data = {f"user_{u}": list(range(u + 3)) for u in range(4)}
+
+    def user_ids(self):
+        return list(self.data.keys())
+
+    def num_user_examples(self, user_id: str) -> int:
+        return len(self.data[user_id])
+
+    def __getitem__(self, user_id: str):
+        inputs = [torch.full((2,), float(x)) for x in self.data[user_id]]
+        return inputs, [float(x) for x in self.data[user_id]]
+
+
+def _data_loader(dataset) -> DataLoader:
+    return DataLoader(
+        dataset,
+        dataset,
+        dataset,
+        SequentialSharder(examples_per_shard=7),
+        batch_size=3,
+        drop_last=True,
+    )
+
+
+class TestLazyDataProvider:
+    def test_matches_eager_provider(self) -> None:
+        dataset = CountingDataset(40)
+        eager = DataProvider(_data_loader(dataset))
+        dataset.loads = 0
+        lazy = LazyDataProvider(_data_loader(dataset), max_resident_users=2)
+        # sharding does not load any row
+        assertEqual(dataset.loads, 0)
+        assertEqual(lazy.num_train_users(), eager.num_train_users())
+        for user_index in lazy.train_user_ids():
+            lazy_user = lazy.get_train_user(user_index)
+            eager_user = eager.get_train_user(user_index)
+            assertEqual(lazy_user.num_train_examples(), eager_user.num_train_examples())
+            assertEqual(lazy_user.num_train_batches(), eager_user.num_train_batches())
+            for lazy_batch, eager_batch in zip(
+                lazy_user.train_data(), eager_user.train_data()
+            ):
+                assertTrue(torch.equal(lazy_batch["features"], eager_batch["features"]))
+                assertTrue(torch.equal(lazy_batch["labels"], eager_batch["labels"]))
+        for lazy_user, eager_user in zip(lazy.eval_users(), eager.eval_users()):
+            assertEqual(lazy_user.num_eval_examples(), eager_user.num_eval_examples())
+            assertEqual(lazy_user.num_train_examples(), 0)
+
+    def test_resident_users_are_bounded(self) -> None:
+        dataset = CountingDataset(40)
+        lazy = LazyDataProvider(_data_loader(dataset), max_resident_users=2)
+        for user_index in (0, 1, 0, 2):
+            list(lazy.get_train_user(user_index).train_data())
+        assertEqual(lazy.num_resident_users(), 2)
+        # user 0 was reused from memory, user 1 was evicted by user 2
+        assertEqual(dataset.loads, 3 * 7)
+        list(lazy.get_train_user(1).train_data())
+        assertEqual(dataset.loads, 4 * 7)
+
+    def test_eval_users_are_kept(self) -> None:
+        dataset = CountingDataset(40)
+        lazy = LazyDataProvider(_data_loader(dataset), max_resident_users=1)
+        for _ in range(2):
+            for user in lazy.eval_users():
+                list(user.eval_data())
+        # every eval row was loaded once, by the first evaluation
+        assertEqual(dataset.loads, 40)
+        assertEqual(lazy.num_resident_users(), len(list(lazy.eval_users())))
+
+    def test_leaf_users_reload_identically(self) -> None:
+        dataset = UserDataset()
+        loader = LEAFDataLoader(dataset, dataset, dataset, batch_size=2)
+        lazy = LazyDataProvider(loader, max_resident_users=1)
+        assertEqual(lazy.num_train_users(), 4)
+        user = lazy.get_train_user(3)
+        # counts come from `num_user_examples`, without loading the user
+        assertEqual(lazy.num_resident_users(), 0)
+        assertEqual((user.num_train_examples(), user.num_train_batches()), (6, 3))
+        first = [b["labels"] for b in user.train_data()]
+        list(lazy.get_train_user(0).train_data())
+        again = [b["labels"] for b in user.train_data()]
+        for a, b in zip(first, again):
+            assertTrue(torch.equal(a, b))
+
+
+class TestMmapDataProvider:
+    def test_matches_eager_provider(self, tmp_path) -> None:
+        dataset = CountingDataset(40)
+        eager = DataProvider(_data_loader(dataset))
+        path = build_shard_cache(_data_loader(dataset), str(tmp_path), "counting")
+        cached = MmapDataProvider(path)
+        assertEqual(cached.num_train_users(), eager.num_train_users())
+        for split in ("train_users", "eval_users", "test_users"):
+            for cached_user, eager_user in zip(
+                getattr(cached, split)(), getattr(eager, split)()
+            ):
+                assertEqual(
+                    (cached_user.num_train_batches(), cached_user.num_eval_batches()),
+                    (eager_user.num_train_batches(), eager_user.num_eval_batches()),
+                )
+                for cached_batch, eager_batch in zip(
+                    list(cached_user.train_data()) + list(cached_user.eval_data()),
+                    list(eager_user.train_data()) + list(eager_user.eval_data()),
+                ):
+                    for key in ("features", "labels"):
+                        assertTrue(torch.equal(cached_batch[key], eager_batch[key]))
+
+    def test_cache_is_reused(self, tmp_path) -> None:
+        dataset = UserDataset()
+        loader = LEAFDataLoader(dataset, dataset, dataset, batch_size=2)
+        path = build_shard_cache(loader, str(tmp_path), "leaf")
+        user = MmapDataProvider(path).get_train_user(3)
+        assertEqual((user.num_train_examples(), user.num_train_batches()), (6, 3))
+        # a second build with the same fingerprint does not load any user
+        dataset.data = {}
+        assertEqual(build_shard_cache(loader, str(tmp_path), "leaf"), path)
+        assertEqual(len(list(tmp_path.iterdir())), 1)
+
+
+class TestMetricsReporter:
+    def test_scores_are_accumulated(self, tmp_path) -> None:
+        predictions = torch.rand(10, 4)
+        targets = torch.randint(4, (10,))
+        reporter = MetricsReporter([], log_dir=str(tmp_path))
+        for start, loss in ((0, 1.0), (6, 3.0)):
+            reporter.add_batch_metrics(
+                FLBatchMetrics(
+                    loss=torch.tensor(loss),
+                    num_examples=len(targets[start : start + 6]),
+                    predictions=predictions[start : start + 6],
+                    targets=targets[start : start + 6],
+                    model_inputs=[],
+                )
+            )
+        # batches are not kept unless asked for
+        assertEqual(reporter.predictions_list, [])
+        assertEqual((reporter.num_batches, reporter.num_examples), (2, 10))
+        expected = 100.0 * (predictions.argmax(1) == targets).sum().item() / 10
+        metrics, _ = reporter.report_metrics(reset=True, stage=TrainingStage.TEST)
+        assertAlmostEqual(metrics[MetricsReporter.ACCURACY], expected)
+        assertEqual(reporter.accumulator.num_examples, 0)
+
+    def test_top_k_and_confusion(self) -> None:
+        accumulator = ClassificationAccumulator(top_k=(1, 2, 5))
+        predictions = torch.tensor([[0.1, 0.7, 0.2], [0.5, 0.2, 0.3]])
+        accumulator.update(predictions, torch.tensor([1, 2]))
+        accumulator.update(predictions[:1], torch.tensor([[0]]))
+        assertAlmostEqual(accumulator.accuracy(1), 100.0 / 3)
+        assertAlmostEqual(accumulator.accuracy(2), 200.0 / 3)
+        assertAlmostEqual(accumulator.accuracy(5), 100.0)
+        assertTrue(
+            torch.equal(
+                accumulator.confusion,
+                torch.tensor([[0, 1, 0], [0, 1, 0], [1, 0, 0]]),
+            )
+        )
@@ -18,6 +18,7 @@ from flsim.common.pytest_helper import (
     assertTrue,
 )
 from flsim.utils.fl.common import FLModelParamUtils
+from flsim.utils.fl.param_arena import ParamArena
 from flsim.utils.fl.personalized_model import FLModelWithPrivateModules
 from flsim.utils.tests.helpers.test_models import (
     FCModel,
@@ -422,3 +423,62 @@ class TestFLModelParamUtils:
         optimizer = torch.optim.SGD(model.parameters(), lr=0.02, momentum=0.9)
         with assertRaises(AssertionError):
             FLModelParamUtils.scale_optimizer_lr(optimizer, -2.0)
+
+    def test_flatten_params(self) -> None:
+        torch.manual_seed(0)
+        model = FCModel()
+        expected = {k: v.clone() for k, v in model.state_dict().items()}
+        assertTrue(FLModelParamUtils.flatten_params(model))
+        arena = ParamArena.of(model)
+        assertTrue(arena is not None)
+        # same module, same values, now views of one buffer
+        for name, param in model.state_dict().items():
+            assertTrue(torch.equal(param, expected[name]))
+        assertEqual(
+            arena.params.numel(), FLModelParamUtils.get_num_trainable_params(model)
+        )
+        model(torch.rand(2, 10)).sum().backward()
+        torch.optim.SGD(model.parameters(), lr=0.1).step()
+        assertTrue(ParamArena.of(model) is not None)
+        assertFalse(torch.equal(model.fc1.weight, expected["fc1.weight"]))
+
+    def test_flat_params_arithmetic(self) -> None:
+        torch.manual_seed(0)
+        flat = [FCModel() for _ in range(3)]
+        plain = [FLModelParamUtils.clone(m) for m in flat]
+        for m in flat:
+            FLModelParamUtils.flatten_params(m)
+
+        for models in (flat, plain):
+            FLModelParamUtils.subtract_model(models[0], models[1], models[2])
+            FLModelParamUtils.add_model(models[2], models[0], models[0])
+            FLModelParamUtils.linear_comb_models(
+                models[0], 0.5, models[1], 2.0, models[1]
+            )
+            FLModelParamUtils.multiply_model_by_weight(models[1], 0.3, models[1])
+        for f, p in zip(flat, plain):
+            assertEqual(FLModelParamUtils.get_mismatched_param([f, p], 1e-6), "")
+        FLModelParamUtils.zero_weights(flat[0])
+        assertEqual(flat[0].fc2.bias.abs().sum().item(), 0.0)
+
+    def test_flat_params_clone(self) -> None:
+        model = FCModel()
+        FLModelParamUtils.flatten_params(model)
+        clone = FLModelParamUtils.clone(model)
+        arena, clone_arena = ParamArena.of(model), ParamArena.of(clone)
+        assertTrue(clone_arena is not None)
+        assertEqual(clone_arena.signature, arena.signature)
+        assertFalse(clone_arena.buffer.data_ptr() == arena.buffer.data_ptr())
+        assertEqual(FLModelParamUtils.get_mismatched_param([model, clone]), "")
+        # precision changes get their own arena
+        double = FLModelParamUtils.clone(model, torch.float64)
+        assertEqual(ParamArena.of(double).buffer.dtype, torch.float64)
+
+    def test_detached_arena_falls_back(self) -> None:
+        model, other = FCModel(), FCModel()
+        FLModelParamUtils.flatten_params(model)
+        FLModelParamUtils.flatten_params(other)
+        model.fc1.weight.data = torch.zeros(5, 10)
+        assertTrue(ParamArena.of(model) is None)
+        FLModelParamUtils.add_model(model, other, model)
+        assertTrue(torch.equal(model.fc1.weight, other.fc1.weight))
@@ -0,0 +1,97 @@
+#!/usr/bin/env python3
+# Copyright (c) Meta Platforms, Inc. and affiliates.
+# All rights reserved.
+#
+# This source code is licensed under the BSD-style license found in the
+# LICENSE file in the root directory of this source tree.
+
+import pickle
+
+import torch
+from flsim.channels.message import Message
+from flsim.clients.base_client import Client, ClientConfig
+from flsim.common.pytest_helper import assertEqual, assertTrue
+from flsim.utils import test_utils as utils
+from flsim.utils.fl.common import FLModelParamUtils
+from flsim.utils.fl.model_pool import ModelPool
+from omegaconf import OmegaConf
+
+
+class TestModelPool:
+    def test_models_are_reused(self) -> None:
+        pool = ModelPool()
+        source = utils.SampleNet(utils.TwoFC())
+        scratch = pool.acquire(source)
+        assertTrue(scratch is not source)
+        assertEqual(pool.allocations, 1)
+
+        # the scratch model is overwritten with the source's state on reuse
+        scratch.fl_get_module().fill_all(0.0)
+        pool.release(scratch)
+        source.fl_get_module().fill_all(2.0)
+        reused = pool.acquire(source)
+        assertTrue(reused is scratch)
+        assertEqual(pool.allocations, 1)
+        assertEqual(
+            FLModelParamUtils.get_mismatched_param(
+                [source.fl_get_module(), reused.fl_get_module()]
+            ),
+            "",
+        )
+
+        # another source model of the same structure is copied into the same
+        # scratch model, one of another structure empties the pool
+        pool.release(reused)
+        other_source = utils.SampleNet(utils.TwoFC())
+        assertTrue(pool.acquire(other_source) is scratch)
+        pool.release(scratch)
+        other = pool.acquire(utils.SampleNet(utils.Linear()))
+        assertTrue(other is not scratch)
+        assertEqual(pool.allocations, 2)
+
+    def test_foreign_models_are_not_pooled(self) -> None:
+        pool = ModelPool()
+        source = utils.SampleNet(utils.TwoFC())
+        scratch = pool.acquire(source)
+        pool.release(FLModelParamUtils.clone(source))
+        pool.release(source)
+        assertEqual(len(pool), 0)
+        pool.release(scratch)
+        # a model is only taken back once
+        pool.release(scratch)
+        assertEqual(len(pool), 1)
+
+    def test_pickled_pool_is_empty(self) -> None:
+        pool = ModelPool()
+        source = utils.SampleNet(utils.TwoFC())
+        pool.release(pool.acquire(source))
+        assertEqual(len(pool), 1)
+        assertEqual(len(pickle.loads(pickle.dumps(pool))), 0)
+
+    def test_pooled_client_update(self) -> None:
+        torch.manual_seed(0)
+        global_model = utils.SampleNet(utils.TwoFC())
+        data = [torch.rand(5, 2) for _ in range(3)]
+        pool = ModelPool()
+        deltas = []
+        for model_pool in (None, pool, pool):
+            client = Client(
+                **OmegaConf.structured(ClientConfig()),
+                dataset=utils.DummyUserData(
+                    utils.DatasetFromList(data), utils.SampleNet(utils.TwoFC())
+                ),
+            )
+            client.model_pool = model_pool
+            delta, _ = client.generate_local_update(Message(global_model))
+            deltas.append(FLModelParamUtils.clone(delta))
+            if model_pool is not None:
+                model_pool.release(delta)
+        # the second pooled update reuses the model of the first one
+        assertEqual(pool.allocations, 1)
+        for delta in deltas[1:]:
+            assertEqual(
+                FLModelParamUtils.get_mismatched_param(
+                    [deltas[0].fl_get_module(), delta.fl_get_module()], 1e-6
+                ),
+                "",
+            )
@@ -0,0 +1,81 @@
+#!/usr/bin/env python3
+# Copyright (c) Meta Platforms, Inc. and affiliates.
+# All rights reserved.
+#
+# This source code is licensed under the BSD-style license found in the
+# LICENSE file in the root directory of this source tree.
+
+import os
+import pickle
+
+import torch
+from flsim.common.pytest_helper import assertEqual, assertTrue
+from flsim.utils import test_utils as utils
+from flsim.utils.tensor_serialization import (
+    ALIGNMENT,
+    deserialize_state_dict,
+    FORMAT_VERSION,
+    load_state_dict_file,
+    serialize_state_dict,
+)
+
+
+def _assert_state_dict_equal(actual, expected) -> None:
+    assertEqual(list(actual), list(expected))
+    for name, tensor in expected.items():
+        assertEqual(actual[name].dtype, tensor.dtype)
+        assertEqual(actual[name].shape, tensor.shape)
+        assertTrue(torch.equal(actual[name], tensor))
+
+
+class TestTensorSerialization:
+    def _state_dict(self):
+        torch.manual_seed(0)
+        return {
+            "weight": torch.randn(7, 3),
+            "transposed": torch.randn(3, 5).t(),
+            "half": torch.randn(3).half(),
+            "steps": torch.tensor(7, dtype=torch.int64),
+            "mask": torch.rand(5) > 0.5,
+            "empty": torch.zeros(0, 3),
+        }
+
+    def test_round_trip(self) -> None:
+        state_dict = self._state_dict()
+        blob = serialize_state_dict(state_dict)
+        assertEqual(blob[0], FORMAT_VERSION)
+        _assert_state_dict_equal(deserialize_state_dict(blob), state_dict)
+        # database drivers return read-only bytes
+        _assert_state_dict_equal(deserialize_state_dict(bytes(blob)), state_dict)
+
+    def test_model_state_dict(self) -> None:
+        model = utils.SampleNet(utils.TwoFC())
+        state_dict = model.fl_get_module().state_dict()
+        loaded = deserialize_state_dict(bytes(serialize_state_dict(state_dict)))
+        _assert_state_dict_equal(loaded, state_dict)
+        model.fl_get_module().load_state_dict(loaded)
+
+    def test_tensors_are_mapped_not_copied(self) -> None:
+        blob = serialize_state_dict(self._state_dict())
+        weight = deserialize_state_dict(blob)["weight"]
+        start = torch.frombuffer(blob, dtype=torch.uint8).data_ptr()
+        address = weight.data_ptr() - start
+        assertTrue(0 < address < len(blob))
+        assertEqual(address % ALIGNMENT, 0)
+
+    def test_pickled_models_still_load(self) -> None:
+        state_dict = self._state_dict()
+        _assert_state_dict_equal(
+            deserialize_state_dict(pickle.dumps(state_dict)), state_dict
+        )
+
+    def test_load_file(self, tmp_path) -> None:
+        state_dict = self._state_dict()
+        path = os.path.join(tmp_path, "model.bin")
+        with open(path, "wb") as f:
+            f.write(serialize_state_dict(state_dict))
+        loaded = load_state_dict_file(path)
+        _assert_state_dict_equal(loaded, state_dict)
+        loaded["weight"].zero_()
+        # the file is mapped copy-on-write
+        _assert_state_dict_equal(load_state_dict_file(path), state_dict)
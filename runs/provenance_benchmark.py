@@ -0,0 +1,68 @@
+import os
+import sys
+import json
+import argparse
+import tempfile
+import subprocess
+
+# Benchmarks data provenance on the example configs: for each dataset, trains
+# once without tracking data provenance and once per capture policy and codec
+# with it, then reports the compression ratio, the writer's throughput, the
+# time the capture policy took on the training thread and the training time
+# overhead of each combination.
+
+DATASETS = ["cifar10", "mnist", "celeba", "sent140"]
+CODECS = ["none", "zlib", "shuffle"]
+CAPTURE_POLICIES = ["all_clients", "every_nth_round", "random_fraction", "update_norm_outlier", "global_only"]
+EXAMPLES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'examples')
+
+parser = argparse.ArgumentParser()
+parser.add_argument("--datasets", nargs='+', default=DATASETS, choices=DATASETS, help="datasets to benchmark")
+parser.add_argument("--codecs", nargs='+', default=["zlib"], help="codecs to benchmark (" + ", ".join(CODECS) + "), lz4 needs the lz4 package")
+parser.add_argument("--capture-policies", nargs='+', default=["all_clients"], choices=CAPTURE_POLICIES, help="capture policies to benchmark")
+args = parser.parse_args()
+
+
+def run_example(dataset, config):
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        config_path = os.path.join(tmp_dir, "config.json")
+        stats_path = os.path.join(tmp_dir, "stats.json")
+        with open(config_path, 'w') as f:
+            json.dump(config, f)
+        command = [sys.executable, dataset + "_example.py", "--config-file", config_path, "--benchmark-output", stats_path]
+        if subprocess.run(command, cwd=EXAMPLES_DIR).returncode != 0:
+            print("Command failed, exiting.")
+            sys.exit(1)
+        with open(stats_path, 'r') as f:
+            return json.load(f)
+
+
+def load_config(dataset, feature):
+    with open(os.path.join(EXAMPLES_DIR, 'configs', dataset + "_config_" + feature + "_feature.json"), 'r') as f:
+        return json.load(f)
+
+
+results = []
+try:
+    for dataset in args.datasets:
+        baseline = run_example(dataset, load_config(dataset, "without"))
+        for policy in args.capture_policies:
+            for codec in args.codecs:
+                config = load_config(dataset, "with")
+                trainer = config['config']['trainer']
+                trainer.setdefault('provenance_store', {})['compression'] = codec
+                trainer['provenance_capture'] = {"_base_": "base_" + policy + "_capture_policy"}
+                stats = run_example(dataset, config)
+                stats['overhead'] = stats['training_time'] / baseline['training_time'] - 1
+                results.append((dataset, policy, codec, baseline['training_time'], stats))
+except KeyboardInterrupt:
+    print("Interrupted by user, exiting.")
+    sys.exit(1)
+
+print(f"{'dataset':<10}{'policy':<22}{'codec':<10}{'ratio':>8}{'storage':>10}{'MB/s':>10}{'size MB':>10}{'capture s':>10}{'train s':>10}{'base s':>10}{'overhead':>10}")
+for dataset, policy, codec, baseline_time, stats in results:
+    print(
+        f"{dataset:<10}{policy:<22}{codec:<10}{stats['compression_ratio']:>8.2f}{stats['storage_ratio']:>10.2f}"
+        f"{stats['throughput_mb_s']:>10.1f}{stats['model_storage_size'] / 1e6:>10.1f}{stats['capture_seconds']:>10.1f}"
+        f"{stats['training_time']:>10.1f}{baseline_time:>10.1f}{stats['overhead']:>10.1%}"
+    )